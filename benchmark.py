@@ -0,0 +1,238 @@
+"""
+Микробенчмарки горячих путей бота на синтетических данных (synthetic_data.py).
+Результаты сравниваются с сохраненными в bench_baseline.json; замедление
+больше допуска считается регрессией (код возврата 1).
+Время нормируется на калибровочный цикл, поэтому базовые значения,
+снятые на другой машине, тоже сравнимы (с точностью до допуска).
+Пример:
+    python benchmark.py                      # сравнить с базой
+    python benchmark.py --filter week        # только бенчмарки с 'week' в имени
+    python benchmark.py --update-baseline    # переписать базу текущими результатами
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import debugAPI
+from etu_api import ETUApiClient
+from schedule_store import ScheduleStore
+from synthetic_data import generate, group_numbers
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# имя -> функция, которая по контексту готовит вызов для замера
+BENCHMARKS: Dict[str, Callable[["BenchContext"], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class BenchContext:
+    """Клиент с загруженными синтетическими группами и расписанием текущей недели"""
+
+    def __init__(self, group_count: int, seed: int):
+        self.groups, self.schedule = generate(group_count, seed)
+        self.numbers = group_numbers(self.groups)
+        rnd = random.Random(seed)
+        # выборка групп, по которой идут запросы (как от разных пользователей)
+        self.sample = rnd.sample(self.numbers, min(200, len(self.numbers)))
+
+        self.client = ETUApiClient()
+        self.client._store_groups(self.groups)
+        self.cache_key, _ = self.client._week_request()
+        self.client._store_schedule(self.cache_key, self.client._build_store(self.cache_key, self.schedule))
+        self.store, _ = self.client.schedule_cache.lookup(self.cache_key)
+
+        self.debug_index = debugAPI.build_group_index(self.groups)
+
+
+def _cycle(items: List):
+    return itertools.cycle(items).__next__
+
+
+@benchmark("find_group_info")
+def _find_group_info(ctx: BenchContext):
+    # каждый десятый запрос — несуществующая группа
+    next_number = _cycle(ctx.sample + ["0000"] * (len(ctx.sample) // 10))
+    return lambda: ctx.client.find_group_info(next_number())
+
+
+@benchmark("remove_duplicate_lessons")
+def _remove_duplicate_lessons(ctx: BenchContext):
+    days = [
+        day['lessons']
+        for number in ctx.sample
+        for day in ctx.schedule[number]['days'].values()
+    ]
+    next_day = _cycle(days)
+    return lambda: ctx.client.remove_duplicate_lessons(next_day())
+
+
+@benchmark("format_day_schedule")
+def _format_day_schedule(ctx: BenchContext):
+    days = [
+        (lessons, ctx.client.day_names[i])
+        for number in ctx.sample
+        for i, lessons in enumerate(ctx.store.get(number)) if lessons
+    ]
+    next_day = _cycle(days)
+    return lambda: ctx.client.format_day_schedule(*next_day())
+
+
+@benchmark("get_week_schedule")
+def _get_week_schedule(ctx: BenchContext):
+    next_number = _cycle(ctx.sample)
+    return lambda: ctx.client.get_week_schedule(next_number())
+
+
+@benchmark("get_week_schedule_cold")
+def _get_week_schedule_cold(ctx: BenchContext):
+    """Без кэша отрисовки: первый запрос после обновления расписания"""
+    next_number = _cycle(ctx.sample)
+
+    def run():
+        ctx.client.render_cache.clear()
+        return ctx.client.get_week_schedule(next_number())
+    return run
+
+
+@benchmark("get_next_lesson")
+def _get_next_lesson(ctx: BenchContext):
+    next_number = _cycle(ctx.sample)
+    return lambda: ctx.client.get_next_lesson(next_number())
+
+
+@benchmark("build_store")
+def _build_store(ctx: BenchContext):
+    """Разбор полного ответа /schedule без предыдущей версии"""
+    is_even = ctx.client._is_even_week(ctx.cache_key)
+    return lambda: ScheduleStore.from_payload(ctx.cache_key, is_even, ctx.schedule)
+
+
+@benchmark("debugAPI.print_beautiful_schedule")
+def _print_beautiful_schedule(ctx: BenchContext):
+    next_number = _cycle(ctx.sample)
+
+    def run():
+        number = next_number()
+        with contextlib.redirect_stdout(io.StringIO()):
+            debugAPI.print_beautiful_schedule(ctx.schedule[number], ctx.debug_index[number])
+    return run
+
+
+def _calibration_loop():
+    """Фиксированная работа на чистом Python: мерило скорости машины"""
+    data = [(i * 7919) % 1000 for i in range(2000)]
+    index = {}
+    for value in data:
+        index[str(value)] = index.get(str(value), 0) + 1
+    return sorted(data), "|".join(sorted(index))
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    """Лучшее время одного вызова в микросекундах"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def run(names: List[str], ctx: BenchContext, repeat: int) -> Dict[str, float]:
+    results = {}
+    for name in names:
+        results[name] = measure(BENCHMARKS[name](ctx), repeat)
+    return results
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, float], calibration: float, baseline: Dict, tolerance: float) -> List[str]:
+    """Печатает таблицу и возвращает имена бенчмарков с регрессией"""
+    base_results = baseline.get("results", {})
+    # во сколько раз эта машина медленнее той, на которой снята база
+    scale = calibration / baseline["calibration_us"] if baseline.get("calibration_us") else 1.0
+
+    regressions = []
+    print(f"{'бенчмарк':<36} {'мкс/вызов':>12} {'база':>12} {'изменение':>10}")
+    for name, value in results.items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<36} {value:>12.2f} {'—':>12} {'новый':>10}")
+            continue
+        ratio = value / (base * scale)
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  ⚠ регрессия"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            mark = "  ускорение"
+        print(f"{name:<36} {value:>12.2f} {base * scale:>12.2f} {(ratio - 1) * 100:>+9.1f}%{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки бота расписания ЛЭТИ")
+    parser.add_argument("--groups", type=int, default=3000, help="число синтетических групп")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="подстрока имени бенчмарка")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        parser.error(f"нет бенчмарков с '{args.filter}' в имени")
+    if args.filter and args.update_baseline:
+        # база снимается целиком, иначе в ней смешаются замеры с разной калибровкой
+        parser.error("--update-baseline нельзя сочетать с --filter")
+
+    print(f"Генерируем данные: {args.groups} групп (seed {args.seed})...")
+    ctx = BenchContext(args.groups, args.seed)
+    calibration = measure(_calibration_loop, args.repeat)
+    results = run(names, ctx, args.repeat)
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("groups") != args.groups:
+        print(f"⚠ база снята на {baseline.get('groups')} группах, сравнение неточное")
+    regressions = compare(results, calibration, baseline, args.tolerance)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "groups": args.groups,
+                "seed": args.seed,
+                "calibration_us": calibration,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"База обновлена: {args.baseline}")
+        return
+
+    if regressions:
+        print(f"Регрессии: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
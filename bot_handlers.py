@@ -2,17 +2,32 @@
 Модуль обработчиков для Telegram бота
 """
 import logging
+import os
+from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 
+import metrics
 from etu_api import api_client  
+from message_packing import pack_messages
+from outbound import INTERACTIVE, NOTIFY, outbound
+from profiling import KINDS, profiler
+from error_reports import ErrorAggregator
+from user_store import create_user_store
 
 logger = logging.getLogger(__name__)
 
 BOT_NAME = "ЛЭТИ Бот"
 DEVELOPER_ID = 662272545
+# время ежедневной рассылки расписания на завтра (ЧЧ:ММ)
+BROADCAST_TIME = os.getenv("BROADCAST_TIME", "20:00")
+# за сколько минут до начала пары напоминать (0 — напоминания выключены)
+REMINDER_MINUTES = int(os.getenv("REMINDER_MINUTES", "15"))
 
-user_groups = {}
+# пользователь -> группа; переживает перезапуск (см. user_store.py)
+user_groups = create_user_store()
+# ошибки копятся и уходят разработчику одной сводкой раз в ERROR_DIGEST_INTERVAL секунд
+error_reports = ErrorAggregator(outbound, DEVELOPER_ID, interval=float(os.getenv("ERROR_DIGEST_INTERVAL", "300")))
 
 
 def get_beautiful_keyboard():
@@ -29,9 +44,10 @@ def get_beautiful_keyboard():
     )
 
 
+@metrics.timed
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    logger.info(f"User {user.id} (@{user.username}) sent /start")
+    logger.info("User %s (@%s) sent /start", user.id, user.username)
 
     if user.id not in user_groups:
         await ask_for_group(update, context)
@@ -43,39 +59,43 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Выберите действие в меню ниже:"
     )
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         welcome_text,
         reply_markup=get_beautiful_keyboard(),
         parse_mode="HTML"
     )
 
-    logger.info(f"Sent welcome to {user.id}")
+    logger.info("Sent welcome to %s", user.id)
 
 
+@metrics.timed
 async def ask_for_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запрашивает номер группы у пользователя"""
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         "🔢 <b>Введите номер вашей группы:</b>\n"
         "Например: <code>4353</code>, <code>2702</code>, <code>5495</code>",
         parse_mode="HTML"
     )
     # Устанавливаем состояние ожидания группы
-    if context.user_data is not None:
-        context.user_data['awaiting_group'] = True
+    user_groups.set_awaiting(update.effective_user.id, True)
 
 
+@metrics.timed
 async def handle_group_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает ввод номера группы"""
     user = update.effective_user
     group_number = update.message.text.strip()
 
-    logger.info(f"User {user.id} ввел группу: {group_number}")
+    logger.info("User %s ввел группу: %s", user.id, group_number)
 
     # Проверяем существование группы
-    group_info = api_client.find_group_info(group_number)
+    group_info = await api_client.find_group_info(group_number)
 
     if not group_info:
-        await update.message.reply_text(
+        await outbound.reply(
+            update,
             f"❌ Группа <b>{group_number}</b> не найдена.\n"
             "Пожалуйста, проверьте номер и попробуйте еще раз.",
             parse_mode="HTML"
@@ -86,10 +106,10 @@ async def handle_group_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_groups[user.id] = group_number
 
     # Сбрасываем состояние ожидания
-    if context.user_data is not None:
-        context.user_data['awaiting_group'] = False
+    user_groups.set_awaiting(user.id, False)
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         f"✅ Группа <b>{group_number}</b> сохранена!\n"
         f"📋 Факультет: {group_info['faculty']}\n"
         f"🎓 Курс: {group_info['course']}\n\n"
@@ -99,12 +119,13 @@ async def handle_group_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
 
 
+@metrics.timed
 async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик нажатий кнопок"""
     user = update.effective_user
     text = update.message.text
 
-    logger.info(f"User {user.id} pressed: {text}")
+    logger.info("User %s pressed: %s", user.id, text)
 
     # Проверяем, есть ли у пользователя группа
     if user.id not in user_groups:
@@ -145,6 +166,7 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await start_command(update, context)
         return
 
+@metrics.timed
 async def show_schedule_options(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str):
     """Показывает варианты расписания"""
     keyboard = [
@@ -155,7 +177,8 @@ async def show_schedule_options(update: Update, context: ContextTypes.DEFAULT_TY
 
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         f"📊 <b>Расписание группы {group_number}</b>\n"
         "Выберите период:",
         reply_markup=reply_markup,
@@ -163,6 +186,7 @@ async def show_schedule_options(update: Update, context: ContextTypes.DEFAULT_TY
     )
 
 
+@metrics.timed
 async def show_weekdays_selector(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str):
     """Показывает кнопки для выбора дня недели"""
     from datetime import datetime
@@ -179,7 +203,8 @@ async def show_weekdays_selector(update: Update, context: ContextTypes.DEFAULT_T
     is_even_week = current_week % 2 == 0
     week_type = "четная" if is_even_week else "нечетная"
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         f"📅 <b>Расписание группы {group_number}</b>\n"
         f"Текущая неделя: <b>{week_type}</b>\n\n"
         "Выберите день недели:",
@@ -188,119 +213,98 @@ async def show_weekdays_selector(update: Update, context: ContextTypes.DEFAULT_T
     )
 
 
+async def send_schedule_messages(update: Update, texts):
+    """Отправляет расписание минимальным числом сообщений; клавиатура — у последнего"""
+    messages = pack_messages(texts)
+    for i, message in enumerate(messages):
+        if i == len(messages) - 1:
+            await outbound.reply(update, message, reply_markup=get_beautiful_keyboard(), parse_mode="HTML")
+        else:
+            await outbound.reply(update, message, parse_mode="HTML")
+
+
+@metrics.timed
 async def show_day_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str, day_index: int):
     """Показывает расписание на выбранный день"""
-    await update.message.reply_chat_action(action="typing")
+    outbound.chat_action(update)
 
-    day_schedule = api_client.get_schedule_for_weekday(group_number, day_index)
+    day_schedule = await api_client.get_schedule_for_weekday(group_number, day_index)
 
     if not day_schedule:
-        await update.message.reply_text(
+        await outbound.reply(
+            update,
             "❌ Не удалось загрузить расписание. Попробуйте позже.",
             reply_markup=get_beautiful_keyboard()
         )
         return
 
-    if len(day_schedule) > 4000:
-        parts = [day_schedule[i:i + 4000] for i in range(0, len(day_schedule), 4000)]
-        for part in parts:
-            await update.message.reply_text(part, parse_mode="HTML")
-        await update.message.reply_text(
-            "✅ Расписание загружено!",
-            reply_markup=get_beautiful_keyboard(),
-            parse_mode="HTML"
-        )
-    else:
-        await update.message.reply_text(
-            day_schedule,
-            reply_markup=get_beautiful_keyboard(),
-            parse_mode="HTML"
-        )
-
-
-
+    await send_schedule_messages(update, [day_schedule])
 
 
+@metrics.timed
 async def show_next_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str):
     """Показывает ближайшую пару"""
-    await update.message.reply_chat_action(action="typing")
+    outbound.chat_action(update)
 
-    next_lesson = api_client.get_next_lesson(group_number)
+    next_lesson = await api_client.get_next_lesson(group_number)
 
     if not next_lesson:
-        await update.message.reply_text(
+        await outbound.reply(
+            update,
             "❌ Не удалось загрузить расписание. Попробуйте позже.",
             reply_markup=get_beautiful_keyboard()
         )
         return
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         next_lesson,
         reply_markup=get_beautiful_keyboard(),
         parse_mode="HTML"
     )
 
 
+@metrics.timed
 async def show_tomorrow_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str):
     """Показывает расписание на завтра"""
-    await update.message.reply_chat_action(action="typing")
+    outbound.chat_action(update)
 
-    tomorrow_schedule = api_client.get_tomorrow_schedule(group_number)
+    tomorrow_schedule = await api_client.get_tomorrow_schedule(group_number)
 
     if not tomorrow_schedule:
-        await update.message.reply_text(
+        await outbound.reply(
+            update,
             "❌ Не удалось загрузить расписание. Попробуйте позже.",
             reply_markup=get_beautiful_keyboard()
         )
         return
 
-    if len(tomorrow_schedule) > 4000:
-        parts = [tomorrow_schedule[i:i + 4000] for i in range(0, len(tomorrow_schedule), 4000)]
-        for part in parts:
-            await update.message.reply_text(
-                part,
-                parse_mode="HTML"
-            )
-    else:
-        await update.message.reply_text(
-            tomorrow_schedule,
-            reply_markup=get_beautiful_keyboard(),
-            parse_mode="HTML"
-        )
+    await send_schedule_messages(update, [tomorrow_schedule])
 
 
+@metrics.timed
 async def show_week_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, group_number: str):
     """Показывает расписание на неделю"""
-    await update.message.reply_chat_action(action="typing")
+    outbound.chat_action(update)
 
-    week_schedule = api_client.get_week_schedule(group_number)
+    week_schedule = await api_client.get_week_schedule(group_number)
 
     if not week_schedule:
-        await update.message.reply_text(
+        await outbound.reply(
+            update,
             "❌ Не удалось загрузить расписание. Попробуйте позже.",
             reply_markup=get_beautiful_keyboard()
         )
         return
 
-    # Отправляем каждый день отдельным сообщением
-    for day_schedule in week_schedule:
-        if len(day_schedule) > 4000:
-            parts = [day_schedule[i:i + 4000] for i in range(0, len(day_schedule), 4000)]
-            for part in parts:
-                await update.message.reply_text(part, parse_mode="HTML")
-        else:
-            await update.message.reply_text(day_schedule, parse_mode="HTML")
-
-    await update.message.reply_text(
-        "📊 <b>Расписание на неделю загружено!</b>",
-        reply_markup=get_beautiful_keyboard(),
-        parse_mode="HTML"
-    )
+    # дни склеиваются в как можно меньшее число сообщений
+    await send_schedule_messages(update, week_schedule)
 
 
+@metrics.timed
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    logger.info(f"User {user.id} requested help")
+    logger.info("User %s requested help", user.id)
 
     help_text = (
         "🆘 <b>Помощь по использованию бота</b>\n\n"
@@ -313,7 +317,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start — начать работу с ботом\n"
         "/help — показать эту справку\n"
         "/menu — показать главное меню\n"
-        "/myid — показать ваш Telegram ID\n\n"
+        "/myid — показать ваш Telegram ID\n"
+        "/subscribe — расписание на завтра каждый вечер\n"
+        "/unsubscribe — отключить рассылку\n"
+        "/remind — напоминания перед парами (вкл/выкл)\n\n"
         "<b>Работа с расписанием:</b>\n"
         "1. При первом запуске введите номер группы\n"
         "2. Выберите нужную функцию в меню\n"
@@ -321,24 +328,28 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "<i>Данные загружаются из официального API ЛЭТИ</i>"
     )
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         help_text,
         reply_markup=get_beautiful_keyboard(),
         parse_mode="HTML"
     )
 
 
+@metrics.timed
 async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    logger.info(f"User {user.id} requested menu")
+    logger.info("User %s requested menu", user.id)
     await start_command(update, context)
 
 
+@metrics.timed
 async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    logger.info(f"User {user.id} requested their ID")
+    logger.info("User %s requested their ID", user.id)
 
-    await update.message.reply_text(
+    await outbound.reply(
+        update,
         f"👤 <b>Ваш Telegram ID:</b> <code>{user.id}</code>\n"
         f"📛 <b>Имя пользователя:</b> @{user.username}\n"
         f"👋 <b>Имя:</b> {user.first_name}",
@@ -347,27 +358,175 @@ async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик ошибок"""
-    error = context.error
+@metrics.timed
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Подписка на ежедневную рассылку расписания на завтра"""
+    user = update.effective_user
+    logger.info("User %s subscribed to daily schedule", user.id)
+
+    if user.id not in user_groups:
+        await outbound.reply(
+            update,
+            "Сначала выберите группу — тогда смогу присылать ее расписание.",
+            reply_markup=get_beautiful_keyboard()
+        )
+        await ask_for_group(update, context)
+        return
 
-    logger.error(f"Ошибка при обработке сообщения: {error}")
+    user_groups.set_subscribed(user.id, True)
+    await outbound.reply(
+        update,
+        f"🔔 Каждый вечер в {BROADCAST_TIME} буду присылать расписание группы "
+        f"<b>{user_groups[user.id]}</b> на завтра.\n"
+        "Отписаться: /unsubscribe",
+        reply_markup=get_beautiful_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@metrics.timed
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отписка от ежедневной рассылки"""
+    user = update.effective_user
+    logger.info("User %s unsubscribed from daily schedule", user.id)
+
+    user_groups.set_subscribed(user.id, False)
+    await outbound.reply(
+        update,
+        "🔕 Ежедневная рассылка отключена. Подписаться снова: /subscribe",
+        reply_markup=get_beautiful_keyboard()
+    )
 
-    # Отправляем уведомление разработчику
+
+@metrics.timed
+async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Включает и выключает напоминания перед парами"""
+    user = update.effective_user
+
+    if not REMINDER_MINUTES:
+        await outbound.reply(update, "Напоминания о парах сейчас отключены.", reply_markup=get_beautiful_keyboard())
+        return
+
+    if user.id not in user_groups:
+        await ask_for_group(update, context)
+        return
+
+    reminded = not user_groups.is_reminded(user.id)
+    user_groups.set_reminded(user.id, reminded)
+    logger.info("User %s turned lesson reminders %s", user.id, 'on' if reminded else 'off')
+
+    if reminded:
+        text = (f"⏰ Напомню о каждой паре группы <b>{user_groups[user.id]}</b> "
+                f"за {REMINDER_MINUTES} мин до начала.\nВыключить: /remind")
+    else:
+        text = "🔕 Напоминания о парах выключены. Включить снова: /remind"
+    await outbound.reply(update, text, reply_markup=get_beautiful_keyboard(), parse_mode="HTML")
+
+
+@metrics.timed
+async def errors_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Только для разработчика:
+    /errors — последние ошибки по видам
+    /errors <отпечаток> — полная трассировка последней ошибки этого вида файлом
+    """
+    user = update.effective_user
+    if user.id != DEVELOPER_ID:
+        logger.warning("User %s tried /errors", user.id)
+        return
+
+    if context.args:
+        entry = error_reports.find(context.args[0])
+        if entry is None:
+            await outbound.reply(update, f"Нет ошибок с отпечатком {context.args[0]} в буфере.")
+            return
+        await outbound.send_document(
+            DEVELOPER_ID,
+            entry.details().encode("utf-8"),
+            priority=INTERACTIVE,
+            filename=f"error-{entry.fingerprint}.txt"
+        )
+        return
+
+    lines = error_reports.summary()
+    if not lines:
+        await outbound.reply(update, "✅ Ошибок с запуска не было.")
+        return
+    header = f"🧾 <b>Последние ошибки ({len(error_reports.recent)} в буфере):</b>"
+    for text in pack_messages([header] + lines):
+        await outbound.reply(update, text, parse_mode="HTML")
+
+
+async def _send_profile_report(context: ContextTypes.DEFAULT_TYPE, kind: str, seconds: float, top: int):
+    """Фоновая часть /profile: ждет конец сеанса и присылает отчет файлом"""
     try:
-        await context.bot.send_message(
-            chat_id=DEVELOPER_ID,
-            text=f"⚠️ <b>Ошибка в боте:</b>\n<code>{error}</code>",
-            parse_mode="HTML"
+        report = await profiler.run(kind, seconds, top, client=api_client)
+        await outbound.send_document(
+            DEVELOPER_ID,
+            report.encode("utf-8"),
+            filename=f"profile-{kind}-{datetime.now():%Y%m%d-%H%M%S}.txt",
+            caption=f"📊 Профилирование {kind}, процесс {os.getpid()}"
         )
-        logger.info("Уведомление отправлено разработчику")
     except Exception as e:
-        logger.error(f"Не удалось отправить уведомление разработчику: {e}")
+        logger.error(f"Профилирование {kind} не удалось: {e}")
+        await outbound.send(DEVELOPER_ID, f"❌ Профилирование {kind} не удалось: {e}", priority=NOTIFY)
+
+
+@metrics.timed
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Только для разработчика:
+    /profile [cpu|sample|mem] [секунд] [топ] — профилирование на N секунд, отчет придет файлом
+    /profile stop — завершить досрочно
+    """
+    user = update.effective_user
+    if user.id != DEVELOPER_ID:
+        logger.warning("User %s tried /profile", user.id)
+        return
+
+    args = context.args or []
+    if args and args[0] == "stop":
+        stopped = profiler.stop()
+        await outbound.reply(update, "⏹ Останавливаю, отчет сейчас придет." if stopped else "Профилирование не идет.")
+        return
+
+    kind = args[0] if args else "cpu"
+    try:
+        seconds = float(args[1]) if len(args) > 1 else 30
+        top = int(args[2]) if len(args) > 2 else 30
+    except ValueError:
+        kind = None
+    if kind not in KINDS:
+        await outbound.reply(update, f"Использование: /profile [{'|'.join(KINDS)}] [секунд] [топ] или /profile stop")
+        return
+    if profiler.busy():
+        await outbound.reply(update, f"Уже идет профилирование {profiler.kind}. Остановить: /profile stop")
+        return
+
+    # сеанс идет в фоне, чтобы не занимать обработку обновлений
+    context.application.create_task(_send_profile_report(context, kind, seconds, top))
+    await outbound.reply(update, f"▶️ Профилирование {kind} на {seconds:.0f} с. Остановить раньше: /profile stop")
+
+
+async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик ошибок"""
+    error = context.error
+
+    user_id = text = None
+    if isinstance(update, Update):
+        user_id = update.effective_user.id if update.effective_user else None
+        text = update.effective_message.text if update.effective_message else None
+
+    # разработчику уходит сводка (см. error_reports.py), а не сообщение на каждую ошибку;
+    # полная трассировка в логе — только у первой ошибки такого вида за окно
+    is_new = error_reports.record(error, user_id, text)
+    logger.error(f"Ошибка при обработке сообщения: {error}", exc_info=error if is_new else None)
 
     # Уведомляем пользователя
     if update and update.effective_message:
         try:
-            await update.effective_message.reply_text(
+            await outbound.reply(
+                update,
                 "❌ Произошла ошибка при обработке запроса.\n"
                 "Пожалуйста, попробуйте еще раз.",
                 reply_markup=get_beautiful_keyboard()
@@ -376,12 +535,13 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
 
 
+@metrics.timed
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     user = update.effective_user
     text = update.message.text
 
-    if context.user_data is not None and context.user_data.get('awaiting_group', False):
+    if user_groups.is_awaiting(user.id):
         await handle_group_input(update, context)
         return
 
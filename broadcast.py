@@ -0,0 +1,229 @@
+"""
+Ежедневная рассылка расписания на завтра подписчикам (/subscribe).
+Сообщение для группы формируется один раз, затем расходится всем ее
+подписчикам через очередь исходящих сообщений с ограниченным параллелизмом.
+Кому уже отправлено, записывается в SQLite: после перезапуска рассылка
+продолжается с того места, где остановилась
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from datetime import time as day_time
+from typing import Dict, List, Optional, Set, Tuple
+
+from telegram.error import Forbidden
+
+from message_packing import pack_messages
+from outbound import BROADCAST
+
+logger = logging.getLogger(__name__)
+
+# сколько прогонов рассылки хранить в журнале
+KEEP_RUNS = 7
+
+
+class BroadcastProgress:
+    """Журнал прогонов: когда начат, когда закончен и кому уже отправлено"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS broadcast_runs ("
+        " run_id TEXT PRIMARY KEY,"
+        " started_at REAL NOT NULL,"
+        " finished_at REAL);"
+        "CREATE TABLE IF NOT EXISTS broadcast_delivered ("
+        " run_id TEXT NOT NULL,"
+        " user_id INTEGER NOT NULL,"
+        " PRIMARY KEY (run_id, user_id)) WITHOUT ROWID;"
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def is_finished(self, run_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT finished_at FROM broadcast_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return row is not None and row[0] is not None
+
+    def start(self, run_id: str) -> Set[int]:
+        """Отмечает начало прогона и возвращает тех, кому уже отправлено"""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO broadcast_runs (run_id, started_at) VALUES (?, ?)",
+                (run_id, time.time())
+            )
+            old = [row[0] for row in self._conn.execute(
+                "SELECT run_id FROM broadcast_runs ORDER BY run_id DESC LIMIT -1 OFFSET ?", (KEEP_RUNS,)
+            )]
+            for old_id in old:
+                self._conn.execute("DELETE FROM broadcast_delivered WHERE run_id = ?", (old_id,))
+                self._conn.execute("DELETE FROM broadcast_runs WHERE run_id = ?", (old_id,))
+        rows = self._conn.execute("SELECT user_id FROM broadcast_delivered WHERE run_id = ?", (run_id,))
+        return {row[0] for row in rows}
+
+    def mark_delivered(self, run_id: str, user_ids: List[int]):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO broadcast_delivered (run_id, user_id) VALUES (?, ?)",
+                [(run_id, user_id) for user_id in user_ids]
+            )
+
+    def finish(self, run_id: str):
+        with self._conn:
+            self._conn.execute("UPDATE broadcast_runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def close(self):
+        self._conn.close()
+
+
+class DailyBroadcast:
+    """
+    Раз в день в send_at рассылает подписчикам расписание на завтра.
+    concurrency — сколько сообщений рассылки одновременно ждут отправки
+    """
+
+    def __init__(self, users, client, sender, progress: BroadcastProgress,
+                 send_at: day_time = day_time(20, 0), concurrency: int = 20, mark_batch: int = 100,
+                 retry_interval: float = 600):
+        self.users = users
+        self.client = client
+        self.sender = sender
+        self.progress = progress
+        self.send_at = send_at
+        self.concurrency = concurrency
+        self.mark_batch = mark_batch
+        self.retry_interval = retry_interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.progress.close()
+
+    async def _next_run(self) -> Tuple[str, float]:
+        """Ближайший прогон и сколько секунд до него"""
+        now = datetime.now()
+        today_at = datetime.combine(now.date(), self.send_at)
+        if now >= today_at:
+            # сегодняшний прогон уже должен был пройти: доделываем, если прервался
+            if not await asyncio.to_thread(self.progress.is_finished, now.date().isoformat()):
+                return now.date().isoformat(), 0
+            today_at += timedelta(days=1)
+        return today_at.date().isoformat(), (today_at - now).total_seconds()
+
+    async def _loop(self):
+        while True:
+            run_id, delay = await self._next_run()
+            if delay > 0:
+                logger.info(f"Следующая рассылка {run_id} в {self.send_at:%H:%M}")
+                await asyncio.sleep(delay)
+            try:
+                finished = await self.run(run_id)
+            except Exception as e:
+                logger.error(f"Рассылка {run_id} прервалась: {e}")
+                finished = False
+            if not finished:
+                # недоставленным попробуем отправить еще раз позже
+                await asyncio.sleep(self.retry_interval)
+
+    async def _render(self, group_number: str, day: date) -> Optional[List[str]]:
+        """Сообщения рассылки для группы на day; [] — пар нет, None — расписание не загрузилось"""
+        store = self.client.cached_week(day)
+        group_week = store.get(group_number) if store is not None else None
+        if group_week is None:
+            return None
+        if not group_week[day.weekday()]:
+            return []
+        text = await self.client.get_schedule_for_date(group_number, day)
+        if text is None:
+            return None
+        return pack_messages([f"🌙 <b>Расписание на завтра, {day:%d.%m}</b>", text])
+
+    async def run(self, run_id: str) -> bool:
+        """Один прогон рассылки; True — отправлено всем"""
+        delivered = await asyncio.to_thread(self.progress.start, run_id)
+        subscribers = await self.users.subscribers()
+
+        by_group: Dict[str, List[int]] = defaultdict(list)
+        for user_id, group_number in subscribers.items():
+            if user_id not in delivered:
+                by_group[group_number].append(user_id)
+        if delivered:
+            logger.info(f"Рассылка {run_id} продолжается: уже отправлено {len(delivered)}")
+
+        # дата берется из run_id, а не из текущего времени: повтор после полуночи рисует тот же день.
+        # В воскресенье завтра — уже следующая неделя со своей четностью
+        tomorrow = date.fromisoformat(run_id) + timedelta(days=1)
+        groups = list(by_group)
+        await self.client.fetch_week(tomorrow, groups)
+        # одно формирование на группу
+        rendered = await asyncio.gather(*(self._render(g, tomorrow) for g in groups))
+
+        queue = asyncio.Queue()
+        skipped = []
+        for group_number, messages in zip(groups, rendered):
+            if messages is None:
+                logger.warning(f"Рассылка {run_id}: нет расписания группы {group_number}")
+                continue
+            for user_id in by_group[group_number]:
+                if messages:
+                    queue.put_nowait((user_id, messages))
+                else:
+                    skipped.append(user_id)
+
+        total = queue.qsize()
+        logger.info(f"Рассылка {run_id}: {total} получателей, {len(groups)} групп")
+        marks = list(skipped)
+        failed = 0
+
+        marks_lock = asyncio.Lock()
+
+        async def flush_marks():
+            nonlocal marks
+            async with marks_lock:
+                if marks:
+                    batch, marks = marks, []
+                    await asyncio.to_thread(self.progress.mark_delivered, run_id, batch)
+
+        async def worker():
+            nonlocal failed
+            while not queue.empty():
+                user_id, messages = queue.get_nowait()
+                try:
+                    for message in messages:
+                        await self.sender.send(user_id, message, priority=BROADCAST, parse_mode="HTML")
+                except Forbidden:
+                    # бот заблокирован: больше не пишем
+                    await self.users.write_subscribed(user_id, False)
+                except Exception as e:
+                    failed += 1
+                    logger.warning(f"Рассылка {run_id}: не удалось отправить {user_id}: {e}")
+                    continue
+                marks.append(user_id)
+                if len(marks) >= self.mark_batch:
+                    await flush_marks()
+
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            await flush_marks()
+
+        logger.info(
+            f"Рассылка {run_id} завершена за {time.monotonic() - started:.1f} с: "
+            f"отправлено {total - failed}, ошибок {failed}"
+        )
+        finished = not failed and all(messages is not None for messages in rendered)
+        if finished:
+            await asyncio.to_thread(self.progress.finish, run_id)
+        return finished
@@ -0,0 +1,114 @@
+import unittest
+from datetime import date, timedelta
+from datetime import time as day_time
+
+from telegram.error import Forbidden
+
+from broadcast import BroadcastProgress, DailyBroadcast
+
+RUN_ID = "2024-03-04"
+
+
+class FakeUsers:
+    """Подписчики рассылки; отписанные ботом запоминаются"""
+
+    def __init__(self, subscribers):
+        self._subscribers = dict(subscribers)
+        self.unsubscribed = []
+
+    async def subscribers(self):
+        return dict(self._subscribers)
+
+    async def write_subscribed(self, user_id, value):
+        if not value:
+            self.unsubscribed.append(user_id)
+            self._subscribers.pop(user_id, None)
+
+
+class FakeClient:
+    """У каждой группы пары есть каждый день"""
+
+    def __init__(self):
+        self.rendered = []
+
+    async def fetch_week(self, day, groups):
+        pass
+
+    def cached_week(self, day):
+        return _AllGroups()
+
+    async def get_schedule_for_date(self, group_number, day):
+        self.rendered.append(group_number)
+        return f"пары группы {group_number}"
+
+
+class _AllGroups:
+
+    def get(self, group_number):
+        return [["пара"]] * 7
+
+
+class FakeSender:
+    """Запоминает получателей; errors — кому вместо отправки бросить исключение"""
+
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = dict(errors or {})
+
+    async def send(self, user_id, text, priority=None, **kwargs):
+        error = self.errors.get(user_id)
+        if error is not None:
+            raise error
+        self.sent.append(user_id)
+
+
+class DailyBroadcastTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.progress = BroadcastProgress(":memory:")
+        self.addCleanup(self.progress.close)
+        self.client = FakeClient()
+
+    def broadcast(self, users, sender) -> DailyBroadcast:
+        return DailyBroadcast(users, self.client, sender, self.progress, concurrency=3, mark_batch=2)
+
+    async def test_rerun_skips_delivered(self):
+        users = FakeUsers({1: "4353", 2: "4353", 3: "4354", 4: "4354"})
+        # пользователю 3 отправить не удалось — прогон не закончен
+        first = FakeSender({3: RuntimeError("сеть")})
+        self.assertFalse(await self.broadcast(users, first).run(RUN_ID))
+        self.assertEqual(sorted(first.sent), [1, 2, 4])
+        self.assertFalse(self.progress.is_finished(RUN_ID))
+
+        second = FakeSender()
+        self.assertTrue(await self.broadcast(users, second).run(RUN_ID))
+        self.assertEqual(second.sent, [3])
+        self.assertTrue(self.progress.is_finished(RUN_ID))
+
+    async def test_finish_stops_later_rerun(self):
+        users = FakeUsers({1: "4353", 2: "4354"})
+        run_id = date.today().isoformat()
+        # время рассылки уже прошло: незаконченный сегодняшний прогон доделывается сразу
+        broadcast = DailyBroadcast(users, self.client, FakeSender(), self.progress, send_at=day_time(0, 0))
+        self.assertEqual(await broadcast._next_run(), (run_id, 0))
+        self.assertTrue(await broadcast.run(run_id))
+
+        # после перезапуска в тот же день закончившийся прогон не повторяется
+        next_id, delay = await broadcast._next_run()
+        self.assertEqual(next_id, (date.today() + timedelta(days=1)).isoformat())
+        self.assertGreater(delay, 0)
+
+    async def test_forbidden_unsubscribes_and_run_continues(self):
+        users = FakeUsers({1: "4353", 2: "4353", 3: "4353"})
+        sender = FakeSender({2: Forbidden("bot was blocked by the user")})
+        self.assertTrue(await self.broadcast(users, sender).run(RUN_ID))
+        self.assertEqual(sorted(sender.sent), [1, 3])
+        self.assertEqual(users.unsubscribed, [2])
+        # заблокировавший бота тоже отмечен: при повторе ему не пишем
+        self.assertEqual(self.progress.start(RUN_ID), {1, 2, 3})
+        # сообщение формируется один раз на группу
+        self.assertEqual(self.client.rendered, ["4353"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Предохранитель для запросов к API ЛЭТИ: после серии ошибок подряд
+запросы какое-то время не отправляются вовсе (быстрый отказ вместо
+ожидания таймаута), затем пропускается одна пробная попытка.
+Здесь же — паузы между повторами с экспоненциальным ростом и случайным разбросом
+"""
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: предохранитель разомкнут"""
+
+
+class CircuitBreaker:
+    """
+    failure_threshold ошибок подряд размыкают цепь на reset_timeout секунд;
+    потом пропускается одна пробная попытка: удача замыкает цепь,
+    ошибка снова размыкает (с тем же reset_timeout)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probe_started = None
+        # сколько раз цепь размыкалась (для метрик)
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        now = time.monotonic()
+        # пробная попытка, которая так и не закончилась (например, ее отменили), не блокирует следующую
+        if state == HALF_OPEN and (self._probe_started is None or now - self._probe_started >= self.reset_timeout):
+            self._probe_started = now
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        """Через сколько секунд будет пробная попытка (0 — цепь замкнута или уже можно)"""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self._state = CLOSED
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == OPEN or self.failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.trips += 1
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    """
+    Пауза перед повтором номер attempt (с нуля): случайная в [0, base * 2^attempt],
+    не больше cap. Разброс не дает всем ожидающим повторить запрос одновременно
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,139 @@
+import unittest
+from unittest import mock
+
+import httpx
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, backoff_delay
+from etu_api import AsyncETUApiClient
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("circuit_breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def trip(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.trips, 1)
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.trip()
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.retry_in(), 0)
+        self.assertTrue(self.breaker.allow())
+        # пока пробная попытка идет, остальные запросы не пропускаются
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_again(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        # повторное размыкание из полуоткрытого состояния — не новое срабатывание
+        self.assertEqual(self.breaker.trips, 1)
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+    def test_lost_probe_does_not_block_forever(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        # пробную попытку отменили, и она ничего не записала
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+
+
+class BackoffDelayTest(unittest.TestCase):
+
+    def test_bounds(self):
+        for attempt in range(10):
+            for _ in range(50):
+                delay = backoff_delay(attempt, base=0.5, cap=10)
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, min(10, 0.5 * 2 ** attempt))
+
+
+class _BrokenBody(httpx.AsyncByteStream):
+    """Тело ответа 200, которое обрывается после первого куска"""
+
+    async def __aiter__(self):
+        yield b'{"4353": '
+        raise httpx.ReadError("connection reset")
+
+
+class DownloadFailuresTest(unittest.IsolatedAsyncioTestCase):
+    """Одна неудачная загрузка — столько сбоев предохранителя, сколько было попыток"""
+
+    def client(self, handler, stream_schedule: bool) -> AsyncETUApiClient:
+        client = AsyncETUApiClient(stream_schedule=stream_schedule)
+        client.serve_stale = False
+        client.retry_base_delay = 0
+        client.breaker = CircuitBreaker(failure_threshold=100)
+        client.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.addAsyncCleanup(client.close)
+        return client
+
+    async def download(self, client: AsyncETUApiClient):
+        cache_key, params = client._week_request()
+        return await client._download_schedule(cache_key, params)
+
+    async def test_network_error_counts_once_per_attempt(self):
+        def handler(request):
+            raise httpx.ConnectError("refused")
+
+        for stream_schedule in (True, False):
+            with self.subTest(stream_schedule=stream_schedule):
+                client = self.client(handler, stream_schedule)
+                self.assertIsNone(await self.download(client))
+                self.assertEqual(client.breaker.failures, client.max_attempts)
+
+    async def test_server_error_counts_once_per_attempt(self):
+        client = self.client(lambda request: httpx.Response(503), stream_schedule=True)
+        self.assertIsNone(await self.download(client))
+        self.assertEqual(client.breaker.failures, client.max_attempts)
+
+    async def test_broken_stream_body_counts_as_failure(self):
+        client = self.client(lambda request: httpx.Response(200, stream=_BrokenBody()), stream_schedule=True)
+        self.assertIsNone(await self.download(client))
+        # сам ответ 200 засчитан как успех, обрыв тела — один сбой
+        self.assertEqual(client.breaker.failures, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,25 +20,35 @@ def fetch_all_groups() -> Optional[List[Dict]]:
         return None
 
 
-def find_group_info(all_groups: List[Dict], group_number: str) -> Optional[Dict]:
-    """Находим полную информацию о группе"""
+def build_group_index(all_groups: List[Dict]) -> Dict[str, Dict]:
+    """Строим индекс номер группы -> полная информация о группе"""
+    index = {}
     if not all_groups:
-        return None
+        return index
 
     for faculty in all_groups:
         for department in faculty.get('departments', []):
             for group in department.get('groups', []):
-                if group.get('number') == group_number:
-                    return {
-                        'id': group['id'],
-                        'number': group['number'],
-                        'course': group['course'],
-                        'studyingType': group.get('studyingType', ''),
-                        'educationLevel': group.get('educationLevel', ''),
-                        'faculty': faculty['title'],
-                        'department': department['title']
-                    }
-    return None
+                number = group.get('number')
+                if number is None or number in index:
+                    continue
+                index[number] = {
+                    'id': group['id'],
+                    'number': group['number'],
+                    'course': group['course'],
+                    'studyingType': group.get('studyingType', ''),
+                    'educationLevel': group.get('educationLevel', ''),
+                    'faculty': faculty['title'],
+                    'department': department['title']
+                }
+    return index
+
+
+def find_group_info(group_index: Dict[str, Dict], group_number: str) -> Optional[Dict]:
+    """Находим полную информацию о группе по индексу из build_group_index"""
+    if not group_index:
+        return None
+    return group_index.get(group_number)
 
 
 def fetch_complete_schedule() -> Optional[Dict]:
@@ -321,7 +331,7 @@ def main():
             continue
 
         # 2. Ищем информацию о группе
-        group_info = find_group_info(all_groups, group_number)
+        group_info = find_group_info(build_group_index(all_groups), group_number)
 
         if not group_info:
             print(f"❌ Группа '{group_number}' не найдена")
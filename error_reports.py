@@ -0,0 +1,227 @@
+"""
+Сводка ошибок для разработчика: исключения группируются по отпечатку
+(тип + место в нашем коде), за окно считается число повторов, и вместо
+сообщения на каждую ошибку уходит одна сводка с примером трассировки.
+Полные подробности последних ошибок лежат в кольцевом буфере (см. /errors)
+"""
+import asyncio
+import hashlib
+import html
+import logging
+import os
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from message_packing import MESSAGE_LIMIT
+from outbound import NOTIFY
+
+logger = logging.getLogger(__name__)
+
+# свой код отличаем от библиотек по каталогу проекта
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# сводка — одно сообщение: длина считается уже после экранирования HTML
+DIGEST_LIMIT = MESSAGE_LIMIT
+# видов ошибок в сводке, остальные — одной строкой "и еще N"
+DIGEST_KINDS = 10
+# меньше этого места под трассировку — сводка уходит без нее
+MIN_TRACE = 300
+
+
+def _escape(text: str, limit: int, keep_end: bool = False) -> str:
+    """
+    html.escape, обрезанный до limit символов уже после экранирования,
+    так что сущности (&amp; и т.п.) не разрезаются. keep_end — оставить конец
+    """
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    if limit <= 0:
+        return ""
+    # место под многоточие; набираем символы с нужного конца, пока влезают
+    parts = []
+    room = limit - 1
+    for char in (reversed(text) if keep_end else text):
+        part = html.escape(char)
+        if len(part) > room:
+            break
+        parts.append(part)
+        room -= len(part)
+    if keep_end:
+        return "…" + "".join(reversed(parts))
+    return "".join(parts) + "…"
+
+
+def _location(error: BaseException) -> str:
+    """Самый глубокий кадр трассировки в коде проекта (или просто самый глубокий)"""
+    frames = traceback.extract_tb(error.__traceback__)
+    if not frames:
+        return "?"
+    own = [frame for frame in frames
+           if frame.filename.startswith(_PROJECT_DIR) and "site-packages" not in frame.filename]
+    frame = (own or frames)[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+
+
+def fingerprint(error: BaseException) -> str:
+    """Короткий отпечаток: тип исключения и место, где оно возникло"""
+    key = f"{type(error).__module__}.{type(error).__qualname__}|{_location(error)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+
+class ErrorRecord:
+    __slots__ = ('at', 'fingerprint', 'kind', 'location', 'message', 'traceback', 'user_id', 'text')
+
+    def __init__(self, error: BaseException, user_id: Optional[int], text: Optional[str]):
+        self.at = datetime.now()
+        self.fingerprint = fingerprint(error)
+        self.kind = type(error).__name__
+        self.location = _location(error)
+        self.message = str(error)
+        self.traceback = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        self.user_id = user_id
+        self.text = text
+
+    def details(self) -> str:
+        return (f"{self.at:%d.%m.%Y %H:%M:%S} [{self.fingerprint}] {self.kind} в {self.location}\n"
+                f"пользователь: {self.user_id}, сообщение: {self.text!r}\n{self.traceback}")
+
+
+class _WindowEntry:
+    __slots__ = ('count', 'sample')
+
+    def __init__(self, sample: ErrorRecord):
+        self.count = 0
+        self.sample = sample
+
+
+class ErrorAggregator:
+    """
+    record() вызывается из обработчика ошибок и ничего не отправляет сам;
+    раз в interval секунд, если были ошибки, разработчику уходит одна сводка
+    """
+
+    def __init__(self, sender, chat_id: int, interval: float = 300, ring_size: int = 200):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.interval = interval
+        self.recent = deque(maxlen=ring_size)
+        # отпечаток -> счетчик и первый пример за текущее окно
+        self._window: Dict[str, _WindowEntry] = {}
+        self._window_started = time.monotonic()
+        # отпечаток -> сколько всего с запуска
+        self.totals: Dict[str, int] = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # не теряем накопленное за последнее окно
+        await self.flush()
+
+    def record(self, error: BaseException, user_id: Optional[int] = None, text: Optional[str] = None) -> bool:
+        """Запоминает ошибку; True если такой отпечаток в этом окне первый"""
+        entry = ErrorRecord(error, user_id, text)
+        self.recent.append(entry)
+        self.totals[entry.fingerprint] = self.totals.get(entry.fingerprint, 0) + 1
+        window_entry = self._window.get(entry.fingerprint)
+        is_new = window_entry is None
+        if is_new:
+            window_entry = _WindowEntry(entry)
+            self._window[entry.fingerprint] = window_entry
+        window_entry.count += 1
+        return is_new
+
+    def find(self, prefix: str) -> Optional[ErrorRecord]:
+        """Последняя ошибка с отпечатком, начинающимся с prefix"""
+        for entry in reversed(self.recent):
+            if entry.fingerprint.startswith(prefix):
+                return entry
+        return None
+
+    def summary(self) -> List[str]:
+        """Ошибки из буфера по отпечаткам, начиная с самых частых"""
+        groups: Dict[str, List[ErrorRecord]] = {}
+        for entry in self.recent:
+            groups.setdefault(entry.fingerprint, []).append(entry)
+        lines = []
+        for fp, entries in sorted(groups.items(), key=lambda item: -len(item[1])):
+            last = entries[-1]
+            lines.append(
+                f"<code>{fp}</code> ×{len(entries)} (всего {self.totals.get(fp, 0)}), "
+                f"последняя {last.at:%d.%m %H:%M:%S}\n"
+                f"{_escape(last.kind, 80)} в {_escape(last.location, 120)}: {_escape(last.message, 300)}"
+            )
+        return lines
+
+    def _take_window(self) -> Tuple[Dict[str, _WindowEntry], float]:
+        """Забирает накопленное за окно и начинает новое; (ошибки, длительность окна в минутах)"""
+        window, self._window = self._window, {}
+        minutes = (time.monotonic() - self._window_started) / 60
+        self._window_started = time.monotonic()
+        return window, minutes
+
+    def _restore_window(self, window: Dict[str, _WindowEntry]):
+        """Сводка не ушла: возвращаем ее ошибки в текущее окно, чтобы они попали в следующую"""
+        for fp, entry in window.items():
+            current = self._window.get(fp)
+            if current is None:
+                self._window[fp] = entry
+            else:
+                current.count += entry.count
+
+    def render_digest(self, window: Dict[str, _WindowEntry], minutes: float) -> str:
+        """Текст сводки не длиннее DIGEST_LIMIT"""
+        ordered = sorted(window.items(), key=lambda item: -item[1].count)
+        total = sum(entry.count for _, entry in ordered)
+        header = f"⚠️ <b>Ошибки за {minutes:.0f} мин: {total}</b>"
+        footer = "\nПодробности: /errors"
+        lines = [
+            f"<code>{fp}</code> ×{entry.count} — {_escape(entry.sample.kind, 80)} "
+            f"в {_escape(entry.sample.location, 120)}: {_escape(entry.sample.message, 200)}"
+            for fp, entry in ordered[:DIGEST_KINDS]
+        ]
+        shown = len(lines)
+        while True:
+            rest = f"\n... и еще {len(ordered) - shown} видов" if len(ordered) > shown else ""
+            head = "\n".join([header] + lines[:shown]) + rest
+            if len(head) + len(footer) <= DIGEST_LIMIT or shown == 0:
+                break
+            shown -= 1
+
+        top = ordered[0][1].sample
+        trace_head = f"\n\nПример <code>{top.fingerprint}</code>:\n<pre>"
+        trace_tail = "</pre>"
+        budget = DIGEST_LIMIT - len(head) - len(footer) - len(trace_head) - len(trace_tail)
+        if budget < MIN_TRACE:
+            return head + footer
+        return head + trace_head + _escape(top.traceback, budget, keep_end=True) + trace_tail + footer
+
+    def digest(self) -> Optional[str]:
+        """Текст сводки за окно и сброс окна; None если ошибок не было"""
+        if not self._window:
+            return None
+        return self.render_digest(*self._take_window())
+
+    async def flush(self):
+        if not self._window:
+            return
+        window, minutes = self._take_window()
+        text = self.render_digest(window, minutes)
+        try:
+            await self.sender.send(self.chat_id, text, priority=NOTIFY, parse_mode="HTML")
+        except Exception as e:
+            self._restore_window(window)
+            logger.error(f"Не удалось отправить сводку ошибок: {e}")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
@@ -1,400 +1,1196 @@
-
+import asyncio
+import json
 import logging
+import os
+import time
+import httpx
 import requests
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError, backoff_delay
+from json_stream import ObjectItemsParser
+from render_cache import RenderCache
+from schedule_store import (
+    GroupWeek, Lesson, ScheduleStore, content_hash, content_hasher, format_minutes, pick_week_lessons
+)
+from snapshot import ScheduleSnapshot
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 # класс для работы с api
 class ETUApiClient:
     def __init__(self):
-        self.base_url = "https://digital.etu.ru/api/mobile"
+        # адрес API можно подменить (заглушка для нагрузочных тестов)
+        self.base_url = os.getenv("ETU_API_URL", "https://digital.etu.ru/api/mobile")
         self.groups_cache = None
-        self.schedule_cache = {}
+        # номер группы -> плоская запись (факультет, кафедра, курс, id)
+        self.groups_index = {}
+        # ключ — понедельник недели; через час запись считается устаревшей и
+        # обновляется, старые недели вытесняются
+        self.schedule_cache = TTLCache(
+            max_entries=3,
+            soft_ttl=timedelta(hours=1).total_seconds(),
+            hard_ttl=timedelta(days=14).total_seconds()
+        )
+        # готовые тексты: (группа, день, четность, версия расписания) -> сообщение
+        self.render_cache = RenderCache()
         self.cache_time = None
         self.cache_duration = timedelta(hours=24)
+        # дольше этого устаревший список групп не отдаем даже пока он обновляется
+        self.cache_max_age = timedelta(days=7)
+        # снимок на диске для быстрого старта (см. attach_snapshot)
+        self.snapshot = None
+        # версия содержимого снимка и время загрузки групп, последними прочитанные из него
+        self._snapshot_revision = None
+        self._snapshot_groups_at = None
+        # при недоступном API отвечаем последними удачно загруженными данными (см. stale_note)
+        self.serve_stale = os.getenv("ETU_SERVE_STALE", "1") == "1"
+        # расписание старше этого помечается как возможно устаревшее
+        self.stale_label_after = timedelta(hours=2)
+        # ETag/Last-Modified и хэш последнего ответа по ключу кэша
+        self.validators = {}
         self.day_names = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
-        self.session = requests.Session()
+        self.type_names = {
+            'Лек': 'Лекция',
+            'Пр': 'Практика',
+            'Лаб': 'Лабораторная',
+            'Сем': 'Семинар'
+        }
+        self.session = self._create_session()
+
+    def _create_session(self):
+        return requests.Session()
+
+    def _groups_cache_valid(self) -> bool:
+        """Проверяет, не устарел ли кэш групп"""
+        if self.groups_cache and self.cache_time:
+            return datetime.now() - self.cache_time < self.cache_duration
+        return False
+
+    def _groups_cache_usable(self) -> bool:
+        """Кэш групп устарел, но его еще можно отдать, пока идет обновление"""
+        if self.groups_cache and self.cache_time:
+            return datetime.now() - self.cache_time < self.cache_max_age
+        return False
+
+    def _store_groups(self, groups: List[Dict]) -> List[Dict]:
+        self.groups_index = self._build_group_index(groups)
+        self.groups_cache = groups
+        self.cache_time = datetime.now()
+        logger.info(f"Загружено групп: {len(self.groups_cache)}")
+        return self.groups_cache
+
+    def attach_snapshot(self, snapshot: ScheduleSnapshot):
+        """Подключает снимок на диске и сразу поднимает из него кэши"""
+        self.snapshot = snapshot
+        cache_key, _ = self._week_request()
+        try:
+            self._snapshot_revision = snapshot.revision()
+            self._apply_snapshot(cache_key, *self._read_snapshot(snapshot, cache_key))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать снимок {snapshot.path}: {e}")
+
+    def _read_snapshot(self, snapshot: ScheduleSnapshot, cache_key: str, groups_newer_than: float = None):
+        """
+        Читает из снимка группы (если они новее groups_newer_than) и неделю cache_key.
+        Кэши не трогает, поэтому можно вызывать в рабочем потоке
+        """
+        groups = snapshot.load_groups(groups_newer_than)
+        index = self._build_group_index(groups[0]) if groups else None
+        return groups, index, snapshot.load_schedule(cache_key)
+
+    def _apply_snapshot(self, cache_key: str, groups, index, store: Optional[ScheduleStore]):
+        if groups:
+            data, fetched_at = groups
+            self._snapshot_groups_at = fetched_at
+            self.groups_index = index
+            self.groups_cache = data
+            self.cache_time = datetime.fromtimestamp(fetched_at)
+            logger.info(f"Группы загружены из снимка ({len(data)}), получены {self.cache_time:%d.%m %H:%M}")
+        if store is not None:
+            self.schedule_cache.put(cache_key, store, stored_at=store.fetched_at)
+            self.render_cache.clear()
+            logger.info(f"Расписание {cache_key} загружено из снимка ({len(store)} групп)")
+
+    def _persist_groups(self, groups: List[Dict], fetched_at: datetime):
+        if self.snapshot is None:
+            return
+        try:
+            self.snapshot.save_groups(groups, fetched_at.timestamp())
+        except Exception as e:
+            logger.error(f"Не удалось сохранить снимок групп: {e}")
+
+    def _persist_schedule(self, store: ScheduleStore):
+        if self.snapshot is None:
+            return
+        try:
+            self.snapshot.save_schedule(store)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить снимок расписания: {e}")
+
+    def _persist_touch(self, store: ScheduleStore):
+        if self.snapshot is None:
+            return
+        try:
+            self.snapshot.touch_schedule(store.week_key, store.fetched_at)
+        except Exception as e:
+            logger.error(f"Не удалось обновить время снимка расписания: {e}")
+
+    def _find_fallback(self, cache_key: str) -> Optional[ScheduleStore]:
+        """
+        Неделя из последней удачной загрузки на случай, если текущую получить не удастся:
+        сначала с той же четностью (пары совпадут), среди них — самая свежая
+        """
+        if not self.serve_stale:
+            return None
+        is_even = self._is_even_week(cache_key)
+        candidates = [store for store in self.schedule_cache.values() if store.week_key != cache_key]
+        if self.snapshot is not None and not any(store.is_even_week == is_even for store in candidates):
+            try:
+                week_key = self.snapshot.latest_week_key(is_even, exclude=cache_key)
+                known = {store.week_key for store in candidates}
+                store = self.snapshot.load_schedule(week_key) if week_key and week_key not in known else None
+                if store is not None:
+                    self.schedule_cache.put(week_key, store, stored_at=store.fetched_at)
+                    candidates.append(store)
+            except Exception as e:
+                logger.error(f"Не удалось прочитать снимок {self.snapshot.path}: {e}")
+        if not candidates:
+            return None
+        return max(candidates, key=lambda store: (store.is_even_week == is_even, store.week_key))
+
+    def _stale_fallback(self, cache_key: str, store: Optional[ScheduleStore] = None) -> Optional[ScheduleStore]:
+        """Текущую неделю получить не удалось: отвечаем прошлой (store — уже найденная замена)"""
+        store = store or self._find_fallback(cache_key)
+        if store is not None:
+            metrics.CACHE_REQUESTS.inc(cache='schedule', result='fallback')
+            logger.warning("Отдаем расписание недели %s вместо %s", store.week_key, cache_key)
+        return store
+
+    def upstream_failing(self) -> bool:
+        """Известно ли, что API сейчас не отвечает (у синхронного клиента — не отслеживается)"""
+        return False
+
+    def stale_note(self, store: Optional[ScheduleStore], day=None) -> str:
+        """
+        Пометка для пользователя, если расписание не с нужной недели (по умолчанию текущей)
+        или давно не обновлялось. О недоступности сайта говорим, только если запросы
+        к нему действительно не проходят; иначе данные просто еще обновляются
+        """
+        if store is None:
+            return ""
+        cache_key, _ = self._week_request(day)
+        failing = self.upstream_failing()
+        if store.week_key != cache_key:
+            monday = date.fromisoformat(store.week_key)
+            reason = "Сайт ЛЭТИ недоступен" if failing else "Расписание этой недели еще загружается"
+            return f"⚠️ {reason}: показано расписание недели с {monday:%d.%m}, оно могло измениться."
+        age = time.time() - store.fetched_at
+        if age > self.stale_label_after.total_seconds():
+            if failing:
+                return (f"⚠️ Расписание не обновлялось {age / 3600:.0f} ч: сайт ЛЭТИ недоступен, "
+                        "данные могут быть устаревшими.")
+            return f"🔄 Расписание обновляется, показаны данные {age / 3600:.0f} ч назад."
+        return ""
+
+    def _with_stale_note(self, store: Optional[ScheduleStore], text: Optional[str], day=None) -> Optional[str]:
+        note = self.stale_note(store, day)
+        if text is None or not note:
+            return text
+        return f"{text}\n\n{note}"
+
+    def _week_request(self, day=None) -> Tuple[str, Dict]:
+        """Ключ кэша и параметры запроса для недели (по умолчанию текущей)"""
+        # Начинаем с понедельника недели
+        today = day or datetime.now().date()
+        monday = today - timedelta(days=today.weekday())
+        end_date = monday + timedelta(days=6)
+        params = {
+            'from': monday.strftime('%Y-%m-%d'),
+            'to': end_date.strftime('%Y-%m-%d')
+        }
+        return monday.strftime('%Y-%m-%d'), params
+
+    def _conditional_headers(self, key: str, have_cached: bool) -> Dict[str, str]:
+        """Заголовки условного запроса, если для ключа есть закэшированные данные"""
+        validator = self.validators.get(key)
+        if not have_cached or not validator:
+            return {}
+        headers = {}
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+        return headers
+
+    def _is_unchanged(self, key: str, response, digest: bytes, have_cached: bool) -> bool:
+        """304 или тот же хэш тела ответа — данные не изменились, разбирать нечего"""
+        if not have_cached:
+            return False
+        if response.status_code == 304:
+            return True
+        validator = self.validators.get(key)
+        return bool(validator) and validator.get('hash') == digest
+
+    def _remember_validators(self, key: str, response, digest: bytes, checkpoints: Optional[Dict] = None):
+        self.validators[key] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'hash': digest,
+            # смещение -> хэш тела до этого места (для потоковой загрузки)
+            'checkpoints': checkpoints or {}
+        }
+
+    def _touch_groups(self) -> List[Dict]:
+        logger.info("Список групп не изменился")
+        self.cache_time = datetime.now()
+        return self.groups_cache
+
+    def _touch_schedule(self, cache_key: str, store: ScheduleStore) -> ScheduleStore:
+        """Расписание не изменилось: продлеваем срок жизни без повторного разбора"""
+        logger.info(f"Расписание {cache_key} не изменилось")
+        store.fetched_at = time.time()
+        self.schedule_cache.put(cache_key, store, stored_at=store.fetched_at)
+        return store
+
+    def _lookup_complete(self, cache_key: str) -> Tuple[Optional[ScheduleStore], bool]:
+        """Как schedule_cache.lookup, но неделя только из части групп (выборочная загрузка) не считается"""
+        store, fresh = self.schedule_cache.lookup(cache_key)
+        if store is not None and store.partial:
+            return None, False
+        return store, fresh
+
+    def _is_even_week(self, cache_key: str) -> bool:
+        """Четность недели берется от ее понедельника"""
+        return datetime.strptime(cache_key, '%Y-%m-%d').isocalendar()[1] % 2 == 0
+
+    def _build_store(self, cache_key: str, schedule_data: Dict) -> ScheduleStore:
+        """Разбирает ответ /schedule в компактное хранилище"""
+        previous, _ = self.schedule_cache.lookup(cache_key)
+        return ScheduleStore.from_payload(cache_key, self._is_even_week(cache_key), schedule_data, previous)
+
+    def _store_schedule(self, cache_key: str, store: ScheduleStore) -> ScheduleStore:
+        self.schedule_cache.put(cache_key, store, stored_at=store.fetched_at)
+        self.render_cache.clear()
+        logger.info(f"Загружено расписание для {len(store)} групп")
+        return store
 
     def fetch_all_groups(self) -> Optional[List[Dict]]:
         try:
-            if self.groups_cache and self.cache_time:
-                if datetime.now() - self.cache_time < self.cache_duration:
-                    logger.info("Используем кэшированные данные групп")
-                    return self.groups_cache
+            if self._groups_cache_valid():
+                logger.info("Используем кэшированные данные групп")
+                return self.groups_cache
 
-            response = self.session.get(f"{self.base_url}/groups", timeout=15)
+            have_cached = bool(self.groups_cache)
+            response = self.session.get(
+                f"{self.base_url}/groups",
+                headers=self._conditional_headers('groups', have_cached),
+                timeout=15
+            )
+            digest = content_hash(response.content)
+            if self._is_unchanged('groups', response, digest, have_cached):
+                return self._touch_groups()
             response.raise_for_status()
-            self.groups_cache = response.json()
-            self.cache_time = datetime.now()
-            logger.info(f"Загружено групп: {len(self.groups_cache)}")
-            return self.groups_cache
+            groups = self._store_groups(response.json())
+            self._remember_validators('groups', response, digest)
+            self._persist_groups(groups, self.cache_time)
+            return groups
         except Exception as e:
             logger.error(f"Ошибка при загрузке списка групп: {e}")
             return None
 
-    def find_group_info(self, group_number: str) -> Optional[Dict]:
-        """Находим полную информацию о группе"""
-        all_groups = self.fetch_all_groups()
-        if not all_groups:
-            return None
-
+    def _build_group_index(self, all_groups: List[Dict]) -> Dict[str, Dict]:
+        """Строит индекс номер группы -> полная информация о группе (один раз на загрузку)"""
+        index = {}
         for faculty in all_groups:
             for department in faculty.get('departments', []):
                 for group in department.get('groups', []):
-                    if group.get('number') == group_number:
-                        return {
-                            'id': group['id'],
-                            'number': group['number'],
-                            'course': group['course'],
-                            'studyingType': group.get('studyingType', ''),
-                            'educationLevel': group.get('educationLevel', ''),
-                            'faculty': faculty['title'],
-                            'department': department['title']
-                        }
-        return None
+                    number = group.get('number')
+                    if number is None or number in index:
+                        continue
+                    index[number] = {
+                        'id': group['id'],
+                        'number': group['number'],
+                        'course': group['course'],
+                        'studyingType': group.get('studyingType', ''),
+                        'educationLevel': group.get('educationLevel', ''),
+                        'faculty': faculty['title'],
+                        'department': department['title']
+                    }
+        return index
+
+    def find_group_info(self, group_number: str) -> Optional[Dict]:
+        """Находим полную информацию о группе"""
+        if not self.fetch_all_groups():
+            return None
+        return self.groups_index.get(group_number)
 
-    def fetch_complete_schedule(self) -> Optional[Dict]:
+    def fetch_complete_schedule(self) -> Optional[ScheduleStore]:
         """Загружаем полное расписание для всех групп"""
-        # Начинаем с понедельника текущей недели
-        today = datetime.now().date()
-        monday = today - timedelta(days=today.weekday())
-        cache_key = monday.strftime('%Y-%m-%d')
+        cache_key, params = self._week_request()
 
-        if cache_key in self.schedule_cache:
-            logger.info(f"Используем кэшированное расписание для {cache_key}")
-            return self.schedule_cache[cache_key]
+        cached, fresh = self.schedule_cache.lookup(cache_key)
+        if fresh:
+            logger.info("Используем кэшированное расписание для %s", cache_key)
+            return cached
 
+        validator_key = f"schedule:{cache_key}"
         try:
-            end_date = monday + timedelta(days=6)  
-
-            params = {
-                'from': monday.strftime('%Y-%m-%d'),
-                'to': end_date.strftime('%Y-%m-%d')
-            }
-
             logger.info("Загружаю полное расписание...")
             response = self.session.get(
                 f"{self.base_url}/schedule",
                 params=params,
+                headers=self._conditional_headers(validator_key, cached is not None),
                 timeout=30
             )
 
+            digest = content_hash(response.content)
+            if self._is_unchanged(validator_key, response, digest, cached is not None):
+                return self._touch_schedule(cache_key, cached)
+
             if response.status_code != 200:
                 logger.error(f"Ошибка API: {response.status_code}")
                 return None
 
-            schedule_data = response.json()
-            self.schedule_cache[cache_key] = schedule_data
-            logger.info(f"Загружено расписание для {len(schedule_data)} групп")
-            return schedule_data
+            store = self._store_schedule(cache_key, self._build_store(cache_key, response.json()))
+            self._remember_validators(validator_key, response, digest)
+            self._persist_schedule(store)
+            return store
 
         except Exception as e:
             logger.error(f"Ошибка при загрузке расписания: {e}")
             return None
 
-    def extract_group_schedule(self, group_number: str) -> Optional[Dict]:
-        """Извлекаем расписание для конкретной группы"""
-        full_schedule = self.fetch_complete_schedule()
-        if not full_schedule or group_number not in full_schedule:
+    def _group_from(self, store: Optional[ScheduleStore], group_number: str) -> Optional[GroupWeek]:
+        group_week = store.get(group_number) if store else None
+        if group_week is None:
             logger.warning(f"Расписание для группы {group_number} не найдено")
-            return None
-        return full_schedule[group_number]
+        return group_week
+
+    def extract_group_schedule(self, group_number: str) -> Optional[GroupWeek]:
+        """Извлекаем расписание для конкретной группы"""
+        return self._group_from(self.fetch_complete_schedule(), group_number)
 
     def remove_duplicate_lessons(self, lessons: List[Dict]) -> List[Dict]:
         """Удаляет дублирующиеся пары из списка занятий, учитывая четность недели"""
-        if not lessons:
-            return []
-
         current_week = datetime.now().isocalendar()[1]
-        is_even_week = current_week % 2 == 0
-
-        time_groups = {}
-        for lesson in lessons:
-            time_start = lesson.get('start_time', '')
-            time_end = lesson.get('end_time', '')
-            time_key = f"{time_start}|{time_end}"
-            if time_key not in time_groups:
-                time_groups[time_key] = []
-            time_groups[time_key].append(lesson)
-
-        unique_lessons = []
-        for time_key, group in time_groups.items():
-            if len(group) == 1:
-                unique_lessons.append(group[0])
-            elif len(group) == 2:
-                
-                selected_lesson = group[0] if is_even_week else group[1]
-                unique_lessons.append(selected_lesson)
-            else:
-              
-                logger.warning(f"Больше двух пар в одно время {time_key}: {len(group)} пар")
-                selected_lesson = group[0] if is_even_week else group[1] if len(group) > 1 else group[0]
-                unique_lessons.append(selected_lesson)
-
-        return unique_lessons
+        return pick_week_lessons(lessons, current_week % 2 == 0)
+
+    def _render_day(self, store: ScheduleStore, group_number: str, weekday_index: int) -> str:
+        """Текст дня из кэша отрисовки; рисуется только при первом обращении"""
+        key = (group_number, weekday_index, store.is_even_week, store.version)
+        return self.render_cache.get_or_render(
+            key,
+            lambda: self.format_day_schedule(store.get(group_number)[weekday_index], self.day_names[weekday_index])
+        )
 
-    def get_today_schedule(self, group_number: str) -> Optional[str]:
-        """Получает расписание на сегодня"""
-        group_schedule = self.extract_group_schedule(group_number)
-        if not group_schedule:
+    def _day_schedule_text(self, store: Optional[ScheduleStore], group_number: str,
+                           weekday_index: int) -> Optional[str]:
+        """Расписание группы на день недели в готовом для отправки виде"""
+        group_week = self._group_from(store, group_number)
+        if group_week is None:
             return None
 
-        days_data = group_schedule.get('days', {})
-        today_key = str(datetime.now().weekday())  
-        if today_key not in days_data:
-            current_weekday = datetime.now().weekday()
-            day_name = self.day_names[current_weekday]
+        if not group_week[weekday_index]:
+            day_name = self.day_names[weekday_index]
             return f"На {day_name.lower()} пар нет 🎉"
 
-        day_data = days_data[today_key]
-        lessons = self.remove_duplicate_lessons(day_data.get('lessons', []))
+        return self._render_day(store, group_number, weekday_index)
 
-        if not lessons:
-            current_weekday = datetime.now().weekday()
-            day_name = self.day_names[current_weekday]
-            return f"На {day_name.lower()} пар нет 🎉"
+    def _week_schedule_texts(self, store: Optional[ScheduleStore], group_number: str) -> Optional[List[str]]:
+        group_week = self._group_from(store, group_number)
+        if group_week is None:
+            return None
 
-        current_weekday = datetime.now().weekday()
-        day_name = self.day_names[current_weekday]
-        return self.format_day_schedule(lessons, day_name)
+        result = [
+            self._render_day(store, group_number, i)
+            for i, lessons in enumerate(group_week) if lessons
+        ]
 
-    def get_tomorrow_schedule(self, group_number: str) -> Optional[str]:
-        """Получает расписание на завтра"""
-        group_schedule = self.extract_group_schedule(group_number)
-        if not group_schedule:
+        if not result:
+            return ["На эту неделю пар нет 🎉"]
+
+        return result
+
+    def cached_week(self, day) -> Optional[ScheduleStore]:
+        """Уже загруженная неделя, в которую входит day, без запроса к API"""
+        cache_key, _ = self._week_request(day)
+        store, _ = self.schedule_cache.lookup(cache_key)
+        return store
+
+    def _next_lesson_text(self, store: Optional[ScheduleStore], group_number: str) -> Optional[str]:
+        if self._group_from(store, group_number) is None:
             return None
 
-        days_data = group_schedule.get('days', {})
-        tomorrow_key = str((datetime.now().weekday() + 1) % 7) 
+        now = datetime.now()
+        now_minutes = now.hour * 60 + now.minute
+        found = store.next_lesson(group_number, now.weekday(), now_minutes)
 
-        if tomorrow_key not in days_data:
-            current_weekday = datetime.now().weekday()
-            tomorrow_weekday = (current_weekday + 1) % 7
-            day_name = self.day_names[tomorrow_weekday]
-            return f"На {day_name.lower()} пар нет 🎉"
+        if found is None:
+            # на этой неделе пар больше нет — смотрим следующую, если она уже загружена
+            next_store = self.cached_week(now.date() + timedelta(days=7 - now.weekday()))
+            if next_store is not None and group_number in next_store:
+                found = next_store.next_lesson(group_number, 0, -1)
+                if found is not None:
+                    found = (found[0] + 7 - now.weekday(), found[1])
 
-        day_data = days_data[tomorrow_key]
-        lessons = self.remove_duplicate_lessons(day_data.get('lessons', []))
+        if found is None:
+            return "На этой неделе пар больше нет 🎉"
 
-        if not lessons:
-            current_weekday = datetime.now().weekday()
-            tomorrow_weekday = (current_weekday + 1) % 7
-            day_name = self.day_names[tomorrow_weekday]
-            return f"На {day_name.lower()} пар нет 🎉"
+        days_ahead, lesson = found
+        return self.format_single_lesson(lesson, days_ahead)
+
+    def get_today_schedule(self, group_number: str) -> Optional[str]:
+        """Получает расписание на сегодня"""
+        store = self.fetch_complete_schedule()
+        return self._day_schedule_text(store, group_number, datetime.now().weekday())
 
-        current_weekday = datetime.now().weekday()
-        tomorrow_weekday = (current_weekday + 1) % 7
-        day_name = self.day_names[tomorrow_weekday]
-        return self.format_day_schedule(lessons, day_name)
+    def get_tomorrow_schedule(self, group_number: str) -> Optional[str]:
+        """Получает расписание на завтра"""
+        store = self.fetch_complete_schedule()
+        return self._day_schedule_text(store, group_number, (datetime.now().weekday() + 1) % 7)
 
     def get_week_schedule(self, group_number: str) -> Optional[List[str]]:
         """Получает расписание на неделю"""
-        group_schedule = self.extract_group_schedule(group_number)
-        if not group_schedule:
-            return None
+        return self._week_schedule_texts(self.fetch_complete_schedule(), group_number)
+
+    def get_next_lesson(self, group_number: str) -> Optional[str]:
+        """Получает ближайшую пару"""
+        return self._next_lesson_text(self.fetch_complete_schedule(), group_number)
 
-        days_data = group_schedule.get('days', {})
+    def format_day_schedule(self, lessons: List[Lesson], day_name: str) -> str:
+        """Форматирует расписание на один день (пары уже отсортированы)"""
+        parts = [f"📅 <b>{day_name}</b>\n", "─" * 30, "\n\n"]
 
-        if not days_data:
-            return ["На эту неделю пар нет 🎉"]
+        for i, lesson in enumerate(lessons, 1):
+            parts.append(f"<b>#{i} 🕐 {self._time_display(lesson)}</b>\n")
+            parts.append(f"   📚 {lesson.name}\n")
 
-        result = []
+            if lesson.subject_type:
+                parts.append(f"   📝 {self.type_names.get(lesson.subject_type, lesson.subject_type)}\n")
 
-        for i in range(7):
-            day_key = str(i)
-            if day_key in days_data:
-                day_data = days_data[day_key]
-                lessons = self.remove_duplicate_lessons(day_data.get('lessons', []))
+            if lesson.teacher:
+                parts.append(f"   👨‍🏫 {lesson.teacher}\n")
 
-                if lessons:
-                    day_name = self.day_names[i]
-                    day_schedule = self.format_day_schedule(lessons, day_name)
-                    result.append(day_schedule)
+            if lesson.room:
+                parts.append(f"   🏫 {lesson.room}\n\n")
+            else:
+                parts.append("   🏫 Аудитория не указана\n\n")
 
-        if not result:
-            return ["На эту неделю пар нет 🎉"]
+        return "".join(parts)
 
-        return result
+    def _time_display(self, lesson: Lesson) -> str:
+        if lesson.start is not None and lesson.end is not None:
+            return f"{format_minutes(lesson.start)}–{format_minutes(lesson.end)}"
+        return "Время не указано"
 
-    def get_next_lesson(self, group_number: str) -> Optional[str]:
-        """Получает ближайшую пару"""
-        group_schedule = self.extract_group_schedule(group_number)
-        if not group_schedule:
-            return None
+    def format_single_lesson(self, lesson: Lesson, days_ahead: int = 0) -> str:
+        """Форматирует одну пару (days_ahead — через сколько дней она будет)"""
+        now = datetime.now()
+        if days_ahead == 0:
+            title = "Ближайшая пара:"
+        elif days_ahead == 1:
+            title = "Ближайшая пара — завтра:"
+        else:
+            title = f"Ближайшая пара — {self.day_names[(now.weekday() + days_ahead) % 7].lower()}:"
 
-        days_data = group_schedule.get('days', {})
-        today_key = str(datetime.now().weekday())
+        parts = [f"⏱ <b>{title}</b>\n", "─" * 30, "\n\n"]
+        parts.append(f"🕐 <b>{self._time_display(lesson)}</b>\n")
+        parts.append(f"📚 {lesson.name}\n")
 
-        if today_key not in days_data:
-            current_weekday = datetime.now().weekday()
-            day_name = self.day_names[current_weekday]
-            return f"На {day_name.lower()} пар нет 🎉"
+        if lesson.subject_type:
+            parts.append(f"📝 {self.type_names.get(lesson.subject_type, lesson.subject_type)}\n")
 
-        day_data = days_data[today_key]
-        lessons = day_data.get('lessons', [])
+        if lesson.teacher:
+            parts.append(f"👨‍🏫 {lesson.teacher}\n")
 
-        if not lessons:
-            current_weekday = datetime.now().weekday()
-            day_name = self.day_names[current_weekday]
-            return f"На {day_name.lower()} пар нет 🎉"
+        if lesson.room:
+            parts.append(f"🏫 {lesson.room}\n")
+        else:
+            parts.append("🏫 Аудитория не указана\n")
 
-        now = datetime.now()
-        next_lesson = None
+        if lesson.start is not None:
+            # время начала уже в минутах, strptime не нужен
+            seconds_left = (days_ahead * 24 * 60 + lesson.start) * 60 - (now.hour * 3600 + now.minute * 60 + now.second)
+
+            if seconds_left > 0:
+                days = seconds_left // 86400
+                hours = (seconds_left % 86400) // 3600
+                minutes = (seconds_left % 3600) // 60
 
-        for lesson in lessons:
-            time_str = lesson.get('start_time', '')
-            if not time_str:
-                continue
+                if days > 0:
+                    parts.append(f"\n⏳ До пары: {days} д {hours} ч {minutes} мин")
+                elif hours > 0:
+                    parts.append(f"\n⏳ До пары: {hours} ч {minutes} мин")
+                else:
+                    parts.append(f"\n⏳ До пары: {minutes} мин")
 
+        return "".join(parts)
+
+    def get_schedule_for_weekday(self, group_number: str, weekday_index: int) -> Optional[str]:
+        """Получает расписание для конкретного дня недели (0=Пн, 1=Вт, и т.д.)"""
+        store = self.fetch_complete_schedule()
+        return self._day_schedule_text(store, group_number, weekday_index)
+
+
+# асинхронный клиент для бота, чтобы загрузка не блокировала event loop
+class AsyncETUApiClient(ETUApiClient):
+    """Те же методы, что и у ETUApiClient, но все обращения к API — корутины"""
+
+    # полное расписание разбирается по группам прямо во время загрузки
+    stream_chunk_size = 256 * 1024
+
+    # имя параметра /schedule со списком групп через запятую
+    group_filter_param = 'groupNumber'
+    # сколько групп в одном выборочном запросе (длина URL ограничена)
+    selected_batch_size = 100
+
+    def __init__(self, stream_schedule: bool = True, selective_fetch: bool = False):
+        super().__init__()
+        self.stream_schedule = stream_schedule
+        # выборочный режим: расписание только для групп, которые реально запрашивают
+        self.selective_fetch = selective_fetch
+        # запросы групп, пришедшие за batch_window, объединяются в один
+        self.batch_window = 0.05
+        self._pending_groups = {}
+        self._batch_task = None
+        # только чтение снимка: к API ходит отдельный процесс (см. workers.py)
+        self.read_only = False
+        self.snapshot_poll_interval = 5.0
+        self._snapshot_checked = 0.0
+        self._snapshot_version = None
+        # загрузки, которые сейчас выполняются: ключ кэша -> задача
+        self._in_flight = {}
+        # фоновые задачи (запись снимка, обновление), держим ссылки до завершения
+        self._background = set()
+        # серия ошибок подряд — и запросы к API какое-то время не отправляются (см. circuit_breaker.py)
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("ETU_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("ETU_BREAKER_RESET", "30"))
+        )
+        # сетевые ошибки и 5xx повторяются с растущей паузой
+        self.max_attempts = 3
+        self.retry_base_delay = 0.5
+        self.retry_max_delay = 5.0
+        # сколько пользователь ждет загрузки недели, если есть чем ответить вместо нее
+        self.stale_wait = 5.0
+
+    def _create_session(self):
+        # сессия создается лениво, уже внутри работающего event loop
+        return None
+
+    def _get_session(self) -> httpx.AsyncClient:
+        if self.session is None or self.session.is_closed:
+            self.session = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+        return self.session
+
+    async def close(self):
+        """Закрывает пул соединений"""
+        if self.session is not None and not self.session.is_closed:
+            await self.session.aclose()
+
+    async def _request(self, endpoint: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """
+        GET к API с повторами: сетевая ошибка или ответ 5xx повторяются через
+        backoff_delay, пока есть попытки и предохранитель пропускает запросы.
+        Ответы 4xx сбоем API не считаются и возвращаются сразу.
+        stream=True — тело не читается, ответ закрывает вызывающий (aclose)
+        """
+        session = self._get_session()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                metrics.UPSTREAM_REJECTED.inc(endpoint=endpoint)
+                raise CircuitOpenError(f"API ЛЭТИ недоступен, следующая попытка через {self.breaker.retry_in():.0f} с")
+            error = response = None
+            try:
+                response = await session.send(session.build_request('GET', url, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                error = e
+            if response is not None and response.status_code < 500:
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+
+            attempt += 1
+            if attempt >= self.max_attempts:
+                if error is not None:
+                    raise error
+                # последний ответ 5xx разбирает вызывающий
+                return response
+            if response is not None:
+                await response.aclose()
+            delay = backoff_delay(attempt - 1, self.retry_base_delay, self.retry_max_delay)
+            logger.warning(
+                f"Запрос {endpoint} не удался ({error or response.status_code}), "
+                f"повтор {attempt} через {delay:.1f} с"
+            )
+            metrics.UPSTREAM_RETRIES.inc(endpoint=endpoint)
+            await asyncio.sleep(delay)
+
+    def upstream_failing(self) -> bool:
+        # разомкнутый предохранитель или последний запрос завершился ошибкой
+        return self.breaker.state != CLOSED or self.breaker.failures > 0
+
+    async def _bounded_by_fallback(self, cache_key: str, download) -> Optional[ScheduleStore]:
+        """
+        Ждет загрузку недели (download — корутина). Если есть чем ответить вместо нее,
+        ждет не дольше stale_wait: загрузка продолжается в фоне, а пользователь
+        получает прошлую неделю с пометкой
+        """
+        fallback = self._find_fallback(cache_key)
+        if fallback is None:
+            return await download
+        try:
+            store = await asyncio.wait_for(download, self.stale_wait)
+        except asyncio.TimeoutError:
+            store = None
+        return store or self._stale_fallback(cache_key, fallback)
+
+    def _touch_schedule(self, cache_key: str, store: ScheduleStore) -> ScheduleStore:
+        store = super()._touch_schedule(cache_key, store)
+        # время загрузки в снимке нужно процессам только для чтения (пометка устаревших данных)
+        self._spawn(asyncio.to_thread(self._persist_touch, store))
+        return store
+
+    def _spawn(self, coro):
+        """Запускает корутину в фоне, не заставляя пользователя ждать"""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _revalidate(self, key: str, fetch):
+        """Фоновое обновление записи кэша, если оно еще не идет (fetch — без аргументов)"""
+        if key not in self._in_flight:
+            logger.info(f"Кэш {key} устарел, обновляем в фоне")
+            self._spawn(self._single_flight(key, fetch))
+
+    async def run_refresh_loop(self, interval: float = 300):
+        """
+        Периодически обновляет устаревшие записи и заранее загружает следующую
+        неделю, чтобы после прогрева ни один запрос пользователя не ждал API
+        """
+        while True:
+            await asyncio.sleep(interval)
             try:
-                lesson_time = datetime.strptime(time_str, '%H:%M').time()
-                lesson_datetime = datetime.combine(now.date(), lesson_time)
-
-                if lesson_datetime > now:
-                    if next_lesson is None or lesson_datetime < next_lesson['time']:
-                        next_lesson = {
-                            'time': lesson_datetime,
-                            'data': lesson
-                        }
-            except ValueError:
-                continue
-
-        if not next_lesson:
-            current_weekday = datetime.now().weekday()
-            day_name = self.day_names[current_weekday]
-            return f"На {day_name.lower()} больше пар нет 🎉"
-
-        return self.format_single_lesson(next_lesson['data'])
-
-    def format_day_schedule(self, lessons: List[Dict], day_name: str) -> str:
-        """Форматирует расписание на один день"""
-        lessons_sorted = sorted(
-            lessons,
-            key=lambda x: x.get('start_time', '') or '99:99'
+                if not self._groups_cache_valid():
+                    await self._single_flight('groups', self._download_groups)
+
+                today = datetime.now().date()
+                weeks = [today]
+                if today.weekday() == 6:
+                    weeks.append(today + timedelta(days=1))
+                for day in weeks:
+                    cache_key, _ = self._week_request(day)
+                    if self.selective_fetch:
+                        _, fresh = self.schedule_cache.lookup(cache_key)
+                    else:
+                        _, fresh = self._lookup_complete(cache_key)
+                    if not fresh:
+                        await self._refresh_week(day)
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления кэша: {e}")
+
+    async def refresh(self):
+        """Принудительно обновляет группы и расписание текущей недели (фоновая проверка снимка)"""
+        await asyncio.gather(
+            self._single_flight('groups', self._download_groups),
+            self._refresh_week()
         )
 
-        result = f"📅 <b>{day_name}</b>\n"
-        result += "─" * 30 + "\n\n"
+    def _week_flight_key(self, cache_key: str) -> str:
+        return f"selected:{cache_key}" if self.selective_fetch else f"schedule:{cache_key}"
+
+    def _known_groups(self) -> List[str]:
+        """Группы, которые уже есть хотя бы в одной закэшированной неделе"""
+        numbers = set()
+        for store in self.schedule_cache.values():
+            numbers.update(store.group_numbers())
+        return sorted(numbers)
+
+    async def _refresh_week(self, day=None) -> Optional[ScheduleStore]:
+        """Обновляет неделю целиком: полной выгрузкой или по известным группам"""
+        cache_key, params = self._week_request(day)
+        if not self.selective_fetch:
+            return await self._single_flight(
+                self._week_flight_key(cache_key),
+                lambda: self._download_schedule(cache_key, params)
+            )
+        numbers = self._known_groups()
+        if not numbers:
+            return None
+        return await self._single_flight(
+            self._week_flight_key(cache_key),
+            lambda: self._download_selected(cache_key, params, numbers)
+        )
 
-        for i, lesson in enumerate(lessons_sorted, 1):
-            time_start = lesson.get('start_time', '')
-            time_end = lesson.get('end_time', '')
-            subject = lesson.get('name', 'Неизвестный предмет')
-            lesson_type = lesson.get('subjectType', '')
-            teacher = lesson.get('teacher', '')
-            classroom = lesson.get('room', '')
+    async def fetch_week(self, day, group_numbers: Iterable[str] = ()) -> Optional[ScheduleStore]:
+        """
+        Неделя, в которую входит day (например, следующая для рассылки в воскресенье):
+        из кэша, из снимка в режиме только для чтения или загрузкой с API.
+        В выборочном режиме догружаются только группы из group_numbers, которых еще нет
+        """
+        cache_key, params = self._week_request(day)
+        store, _ = self.schedule_cache.lookup(cache_key)
+        if self.read_only:
+            if store is None and self.snapshot is not None:
+                store = await asyncio.to_thread(self.snapshot.load_schedule, cache_key)
+                if store is not None:
+                    self.schedule_cache.put(cache_key, store, stored_at=store.fetched_at)
+            return store
+        if not self.selective_fetch:
+            store, _ = self._lookup_complete(cache_key)
+            if store is not None:
+                return store
+            return await self._single_flight(
+                self._week_flight_key(cache_key),
+                lambda: self._download_schedule(cache_key, params)
+            )
+        missing = sorted({
+            number for number in group_numbers
+            if store is None or (number not in store and number not in store.absent)
+        })
+        if not missing:
+            return store
+        return await self._download_selected(cache_key, params, missing) or store
+
+    async def _single_flight(self, key: str, fetch):
+        """Один запрос к API на ключ: остальные ждут и получают тот же результат"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logger.info("Ожидаем уже идущую загрузку %s", key)
+        # shield: отмена одного ожидающего не должна отменять общую загрузку
+        return await asyncio.shield(task)
+
+    async def _sync_from_snapshot(self) -> Optional[ScheduleStore]:
+        """
+        Режим только для чтения: не чаще раза в snapshot_poll_interval проверяем,
+        не переписал ли снимок процесс обновления, и берем текущую неделю из него
+        """
+        cache_key, _ = self._week_request()
+        now = time.monotonic()
+        if self.snapshot is not None and now - self._snapshot_checked >= self.snapshot_poll_interval:
+            self._snapshot_checked = now
+            try:
+                version = self.snapshot.data_version()
+                # в файл писали или началась неделя, которой еще нет в кэше
+                if version != self._snapshot_version or cache_key not in self.schedule_cache:
+                    self._snapshot_version = version
+                    await self._reload_snapshot(cache_key)
+            except Exception as e:
+                logger.error(f"Не удалось проверить снимок: {e}")
+
+        store, _ = self.schedule_cache.lookup(cache_key)
+        # процесс обновления еще не загрузил новую неделю — отвечаем прошлой
+        return store or self._stale_fallback(cache_key)
+
+    async def _reload_snapshot(self, cache_key: str):
+        revision = self.snapshot.revision()
+        store, _ = self.schedule_cache.lookup(cache_key)
+        if revision == self._snapshot_revision and store is not None:
+            # содержимое то же (ответ 304): только продлеваем время загрузки
+            fetched_at = self.snapshot.week_fetched_at(cache_key)
+            if fetched_at is not None and fetched_at != store.fetched_at:
+                store.fetched_at = fetched_at
+                self.schedule_cache.put(cache_key, store, stored_at=fetched_at)
+            return
+        # разбор JSON групп и чтение недели — в рабочем потоке, кэши меняются уже в цикле
+        loaded = await asyncio.to_thread(self._read_snapshot, self.snapshot, cache_key, self._snapshot_groups_at)
+        self._apply_snapshot(cache_key, *loaded)
+        self._snapshot_revision = revision
+
+    async def fetch_all_groups(self) -> Optional[List[Dict]]:
+        if self.read_only:
+            await self._sync_from_snapshot()
+            return self.groups_cache
+        if self._groups_cache_valid():
+            metrics.CACHE_REQUESTS.inc(cache='groups', result='fresh')
+            logger.info("Используем кэшированные данные групп")
+            return self.groups_cache
+        if self._groups_cache_usable():
+            metrics.CACHE_REQUESTS.inc(cache='groups', result='stale')
+            # отдаем устаревший список сразу, обновляем в фоне
+            self._revalidate('groups', self._download_groups)
+            return self.groups_cache
+        metrics.CACHE_REQUESTS.inc(cache='groups', result='miss')
+        groups = await self._single_flight('groups', self._download_groups)
+        if groups is None and self.serve_stale and self.groups_cache:
+            # список групп меняется редко: старый лучше, чем никакого
+            metrics.CACHE_REQUESTS.inc(cache='groups', result='fallback')
+            logger.warning(f"API недоступен, отдаем список групп от {self.cache_time:%d.%m %H:%M}")
+            return self.groups_cache
+        return groups
+
+    async def _download_groups(self) -> Optional[List[Dict]]:
+        started = time.perf_counter()
+        response = None
+        try:
+            have_cached = bool(self.groups_cache)
+            response = await self._request(
+                'groups',
+                f"{self.base_url}/groups",
+                headers=self._conditional_headers('groups', have_cached),
+                timeout=15
+            )
+            metrics.observe_upstream('groups', started, response.status_code, len(response.content))
+            digest = await asyncio.to_thread(content_hash, response.content)
+            if self._is_unchanged('groups', response, digest, have_cached):
+                return self._touch_groups()
+            response.raise_for_status()
+            groups = self._store_groups(await asyncio.to_thread(json.loads, response.content))
+            self._remember_validators('groups', response, digest)
+            self._spawn(asyncio.to_thread(self._persist_groups, groups, self.cache_time))
+            return groups
+        except CircuitOpenError as e:
+            logger.warning(f"Пропускаем загрузку списка групп: {e}")
+            return None
+        except Exception as e:
+            if response is None:
+                metrics.observe_upstream('groups', started, 'error')
+            logger.error(f"Ошибка при загрузке списка групп: {e}")
+            return None
 
-            type_display = ""
-            if lesson_type:
-                type_map = {
-                    'Лек': 'Лекция',
-                    'Пр': 'Практика',
-                    'Лаб': 'Лабораторная',
-                    'Сем': 'Семинар'
-                }
-                type_display = type_map.get(lesson_type, lesson_type)
+    async def find_group_info(self, group_number: str) -> Optional[Dict]:
+        """Находим полную информацию о группе"""
+        if not await self.fetch_all_groups():
+            return None
+        return self.groups_index.get(group_number)
 
-            time_display = f"{time_start}–{time_end}" if time_start and time_end else "Время не указано"
+    async def fetch_complete_schedule(self) -> Optional[ScheduleStore]:
+        """Загружаем полное расписание для всех групп"""
+        if self.read_only:
+            return await self._sync_from_snapshot()
 
-            result += f"<b>#{i} 🕐 {time_display}</b>\n"
-            result += f"   📚 {subject}\n"
+        cache_key, params = self._week_request()
 
-            if type_display:
-                result += f"   📝 {type_display}\n"
+        # неделя после выборочного режима (часть групп) полной выгрузку не заменяет
+        cached, fresh = self._lookup_complete(cache_key)
+        metrics.CACHE_REQUESTS.inc(
+            cache='schedule', result='miss' if cached is None else 'fresh' if fresh else 'stale'
+        )
+        if cached is not None:
+            if not fresh:
+                # stale-while-revalidate: пользователь не ждет обновления
+                self._revalidate(
+                    f"schedule:{cache_key}",
+                    lambda: self._download_schedule(cache_key, params)
+                )
+            return cached
+
+        return await self._bounded_by_fallback(cache_key, self._single_flight(
+            f"schedule:{cache_key}",
+            lambda: self._download_schedule(cache_key, params)
+        ))
+
+    async def _download_schedule(self, cache_key: str, params: Dict) -> Optional[ScheduleStore]:
+        validator_key = f"schedule:{cache_key}"
+        cached, _ = self._lookup_complete(cache_key)
+        headers = self._conditional_headers(validator_key, cached is not None)
+        started = time.perf_counter()
+        response = None
+        try:
+            logger.info("Загружаю полное расписание...")
+            if self.stream_schedule:
+                return await self._stream_schedule(cache_key, params, headers, cached, started)
 
-            if teacher:
-                result += f"   👨‍🏫 {teacher}\n"
+            response = await self._request(
+                'schedule',
+                f"{self.base_url}/schedule",
+                params=params,
+                headers=headers,
+                timeout=30
+            )
+            metrics.observe_upstream('schedule', started, response.status_code, len(response.content))
 
-            if classroom:
-                result += f"   🏫 {classroom}\n"
-            else:
-                result += f"   🏫 Аудитория не указана\n"
+            digest = await asyncio.to_thread(content_hash, response.content)
+            if self._is_unchanged(validator_key, response, digest, cached is not None):
+                return self._touch_schedule(cache_key, cached)
 
-            result += "\n"
+            if response.status_code != 200:
+                logger.error(f"Ошибка API: {response.status_code}")
+                return None
 
-        return result
+            # разбор многомегабайтного json и сборку хранилища уводим из event loop
+            store = await asyncio.to_thread(self._parse_schedule, cache_key, response.content)
+            return self._accept_schedule(cache_key, store, response, digest)
 
-    def format_single_lesson(self, lesson: Dict) -> str:
-        """Форматирует одну пару"""
-        time_start = lesson.get('start_time', '')
-        time_end = lesson.get('end_time', '')
-        subject = lesson.get('name', 'Неизвестный предмет')
-        lesson_type = lesson.get('subjectType', '')
-        teacher = lesson.get('teacher', '')
-        classroom = lesson.get('room', '')
-
-        type_display = ""
-        if lesson_type:
-            type_map = {
-                'Лек': 'Лекция',
-                'Пр': 'Практика',
-                'Лаб': 'Лабораторная',
-                'Сем': 'Семинар'
-            }
-            type_display = type_map.get(lesson_type, lesson_type)
-
-        time_display = f"{time_start}–{time_end}" if time_start and time_end else "Время не указано"
-
-        result = "⏱ <b>Ближайшая пара:</b>\n"
-        result += "─" * 30 + "\n\n"
-        result += f"🕐 <b>{time_display}</b>\n"
-        result += f"📚 {subject}\n"
-
-        if type_display:
-            result += f"📝 {type_display}\n"
-
-        if teacher:
-            result += f"👨‍🏫 {teacher}\n"
-
-        if classroom:
-            result += f"🏫 {classroom}\n"
-        else:
-            result += f"🏫 Аудитория не указана\n"
+        except CircuitOpenError as e:
+            logger.warning(f"Пропускаем загрузку расписания: {e}")
+            return None
+        except Exception as e:
+            if response is None:
+                metrics.observe_upstream('schedule', started, 'error')
+            logger.error(f"Ошибка при загрузке расписания: {e}")
+            return None
+
+    async def _stream_schedule(self, cache_key: str, params: Dict, headers: Dict,
+                               cached: Optional[ScheduleStore], started: float) -> Optional[ScheduleStore]:
+        """
+        Потоковая загрузка: каждая группа разбирается и сжимается, как только
+        пришла, после чего ее исходный словарь сразу освобождается
+        """
+        response = await self._request(
+            'schedule',
+            f"{self.base_url}/schedule",
+            stream=True,
+            params=params,
+            headers=headers,
+            timeout=30
+        )
+        try:
+            if cached is not None and response.status_code == 304:
+                metrics.observe_upstream('schedule', started, 304, 0)
+                return self._touch_schedule(cache_key, cached)
 
-        if time_start:
+            if response.status_code != 200:
+                metrics.observe_upstream('schedule', started, response.status_code)
+                logger.error(f"Ошибка API: {response.status_code}")
+                return None
+
+            parser = ObjectItemsParser()
+            hasher = content_hasher()
+            store = ScheduleStore(cache_key, self._is_even_week(cache_key))
+            validator = self.validators.get(f"schedule:{cache_key}") if cached is not None else None
+            previous_checkpoints = validator.get('checkpoints') if validator else None
+            checkpoints = {}
+            # пока начало тела совпадает с прошлым ответом, куски только хэшируются
+            # и откладываются: неизмененный ответ так и не разбирается
+            deferred = [] if previous_checkpoints else None
+            size = 0
             try:
-                now = datetime.now()
-                lesson_time = datetime.strptime(time_start, '%H:%M').time()
-                lesson_datetime = datetime.combine(now.date(), lesson_time)
+                async for chunk in response.aiter_bytes(self.stream_chunk_size):
+                    size += len(chunk)
+                    hasher.update(chunk)
+                    checkpoints[size] = hasher.copy().digest()
+                    if deferred is not None:
+                        deferred.append(chunk)
+                        if previous_checkpoints.get(size) == checkpoints[size]:
+                            continue
+                        # тело разошлось с прошлым: разбираем отложенное и дальше по мере прихода
+                        await asyncio.to_thread(self._feed_schedule, parser, store, cached, deferred)
+                        deferred = None
+                        continue
+                    await asyncio.to_thread(self._feed_schedule, parser, store, cached, [chunk])
+            except httpx.TransportError:
+                # обрыв уже после ответа 200: _request его не видел, считаем сбоем здесь
+                self.breaker.record_failure()
+                raise
+            # при потоковой загрузке время включает разбор: он идет по мере прихода данных
+            metrics.observe_upstream('schedule', started, response.status_code, size)
+        finally:
+            await response.aclose()
+
+        digest = hasher.digest()
+        if self._is_unchanged(f"schedule:{cache_key}", response, digest, cached is not None):
+            return self._touch_schedule(cache_key, cached)
+        await asyncio.to_thread(self._feed_schedule, parser, store, cached, deferred or [], True)
+        return self._accept_schedule(cache_key, store, response, digest, checkpoints)
+
+    def _feed_schedule(self, parser: ObjectItemsParser, store: ScheduleStore,
+                       previous: Optional[ScheduleStore], chunks: List[bytes], final: bool = False):
+        for chunk in chunks + [b''] if final else chunks:
+            for group_number, group_schedule, raw in parser.feed(chunk, final and not chunk):
+                store.add_group(group_number, content_hash(raw.encode('utf-8')), lambda: group_schedule, previous)
+
+    def _accept_schedule(self, cache_key: str, store: ScheduleStore, response, digest: bytes,
+                         checkpoints: Optional[Dict] = None) -> ScheduleStore:
+        self._remember_validators(f"schedule:{cache_key}", response, digest, checkpoints)
+        self._spawn(asyncio.to_thread(self._persist_schedule, store))
+        return self._store_schedule(cache_key, store)
+
+    async def fetch_groups_schedule(self, group_numbers: Iterable[str]) -> Optional[ScheduleStore]:
+        """
+        Расписание недели только для указанных групп. Запросы, пришедшие за
+        batch_window, уходят к API одним запросом; уже загруженные группы
+        отдаются из кэша
+        """
+        cache_key, params = self._week_request()
+        store, fresh = self.schedule_cache.lookup(cache_key)
+        missing = [
+            number for number in group_numbers
+            if store is None or (number not in store and number not in store.absent)
+        ]
+        metrics.CACHE_REQUESTS.inc(
+            cache='schedule', result='miss' if missing else 'fresh' if fresh else 'stale'
+        )
 
-                if lesson_datetime > now:
-                    time_diff = lesson_datetime - now
-                    hours = time_diff.seconds // 3600
-                    minutes = (time_diff.seconds % 3600) // 60
+        if not missing:
+            if not fresh:
+                self._revalidate(
+                    self._week_flight_key(cache_key),
+                    lambda: self._download_selected(cache_key, params, self._known_groups())
+                )
+            return store
+
+        loop = asyncio.get_running_loop()
+        waiters = []
+        for number in missing:
+            future = self._pending_groups.get(number)
+            if future is None:
+                future = loop.create_future()
+                self._pending_groups[number] = future
+            waiters.append(asyncio.shield(future))
+        if self._batch_task is None:
+            self._batch_task = self._spawn(self._flush_group_batch())
+
+        async def batch_result():
+            # ожидания защищены shield: отказ ждать не отменяет общую загрузку
+            results = await asyncio.gather(*waiters)
+            return results[-1]
+        return await self._bounded_by_fallback(cache_key, batch_result())
+
+    async def _flush_group_batch(self):
+        await asyncio.sleep(self.batch_window)
+        batch, self._pending_groups = self._pending_groups, {}
+        self._batch_task = None
+
+        cache_key, params = self._week_request()
+        store = await self._download_selected(cache_key, params, sorted(batch))
+        if store is None and self.selective_fetch is False:
+            # API не поддерживает выборку — переходим на полную выгрузку
+            store = await self.fetch_complete_schedule()
+        for future in batch.values():
+            if not future.done():
+                future.set_result(store)
+
+    async def _download_selected(self, cache_key: str, params: Dict,
+                                 group_numbers: List[str]) -> Optional[ScheduleStore]:
+        """Загружает группы пачками по selected_batch_size и добавляет их к закэшированной неделе"""
+        payload = {}
+        for start in range(0, len(group_numbers), self.selected_batch_size):
+            batch = await self._download_selected_batch(
+                params, group_numbers[start:start + self.selected_batch_size]
+            )
+            if batch is None:
+                return None
+            payload.update(batch)
+        try:
+            previous, _ = self.schedule_cache.lookup(cache_key)
+            store = await asyncio.to_thread(self._merge_selected, cache_key, previous, payload, group_numbers)
+        except Exception as e:
+            logger.error(f"Ошибка при выборочной загрузке расписания: {e}")
+            return None
+        self._spawn(asyncio.to_thread(self._persist_schedule, store))
+        return self._store_schedule(cache_key, store)
 
-                    if hours > 0:
-                        result += f"\n⏳ До пары: {hours} ч {minutes} мин"
-                    else:
-                        result += f"\n⏳ До пары: {minutes} мин"
-            except:
-                pass
+    async def _download_selected_batch(self, params: Dict, group_numbers: List[str]) -> Optional[Dict]:
+        """Один запрос /schedule с фильтром по группам; None — не удалось"""
+        started = time.perf_counter()
+        response = None
+        try:
+            logger.info(f"Загружаю расписание {len(group_numbers)} групп: {', '.join(group_numbers[:10])}")
+            response = await self._request(
+                'schedule_selected',
+                f"{self.base_url}/schedule",
+                params={**params, self.group_filter_param: ','.join(group_numbers)},
+                timeout=30
+            )
+            metrics.observe_upstream('schedule_selected', started, response.status_code, len(response.content))
 
-        return result
+            if response.status_code >= 500:
+                logger.error(f"Ошибка API: {response.status_code}")
+                return None
+            if response.status_code != 200:
+                logger.warning(
+                    f"Выборочная загрузка не удалась ({response.status_code}), "
+                    "переключаемся на полную выгрузку расписания"
+                )
+                self.selective_fetch = False
+                return None
 
-    def get_schedule_for_weekday(self, group_number: str, weekday_index: int) -> Optional[str]:
-        """Получает расписание для конкретного дня недели (0=Пн, 1=Вт, и т.д.)"""
-        group_schedule = self.extract_group_schedule(group_number)
-        if not group_schedule:
+            return await asyncio.to_thread(json.loads, response.content)
+
+        except CircuitOpenError as e:
+            logger.warning(f"Пропускаем выборочную загрузку расписания: {e}")
+            return None
+        except Exception as e:
+            if response is None:
+                metrics.observe_upstream('schedule_selected', started, 'error')
+            logger.error(f"Ошибка при выборочной загрузке расписания: {e}")
             return None
 
-        days_data = group_schedule.get('days', {})
-        day_key = str(weekday_index)
+    def _merge_selected(self, cache_key: str, previous: Optional[ScheduleStore], payload: Dict,
+                        group_numbers: List[str]) -> ScheduleStore:
+        """Новая версия недели: прежние группы плюс только что загруженные"""
+        store = ScheduleStore(cache_key, self._is_even_week(cache_key))
+        # группы поверх полной выгрузки — неделя по-прежнему полная, иначе только часть групп
+        store.partial = True
+        if previous is not None and previous.is_even_week == store.is_even_week:
+            store.partial = previous.partial
+            for number in previous.group_numbers():
+                group_week = previous.get(number)
+                if group_week is not None:
+                    store.groups[number] = group_week
+                    store.group_hashes[number] = previous.group_hashes.get(number, b'')
+            store.absent = set(previous.absent)
+
+        for number, group_schedule in payload.items():
+            raw = json.dumps(group_schedule, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            store.add_group(number, content_hash(raw), lambda: group_schedule, previous)
+        store.absent.update(number for number in group_numbers if number not in payload)
+        return store
+
+    async def get_schedule_store(self, group_numbers: Iterable[str]) -> Optional[ScheduleStore]:
+        """Текущая неделя, в которой есть расписание указанных групп, в текущем режиме загрузки"""
+        if self.selective_fetch and not self.read_only:
+            return await self.fetch_groups_schedule(group_numbers)
+        return await self.fetch_complete_schedule()
+
+    async def _schedule_for(self, group_number: str) -> Optional[ScheduleStore]:
+        return await self.get_schedule_store([group_number])
+
+    def _parse_schedule(self, cache_key: str, content: bytes) -> ScheduleStore:
+        return self._build_store(cache_key, json.loads(content))
+
+    async def extract_group_schedule(self, group_number: str) -> Optional[GroupWeek]:
+        """Извлекаем расписание для конкретной группы"""
+        return self._group_from(await self._schedule_for(group_number), group_number)
 
-        if day_key not in days_data:
-            day_name = self.day_names[weekday_index]
-            return f"На {day_name.lower()} пар нет 🎉"
+    async def get_today_schedule(self, group_number: str) -> Optional[str]:
+        """Получает расписание на сегодня"""
+        store = await self._schedule_for(group_number)
+        return self._with_stale_note(store, self._day_schedule_text(store, group_number, datetime.now().weekday()))
 
-        day_data = days_data[day_key]
-        lessons = self.remove_duplicate_lessons(day_data.get('lessons', []))
+    async def get_tomorrow_schedule(self, group_number: str) -> Optional[str]:
+        """Получает расписание на завтра"""
+        store = await self._schedule_for(group_number)
+        return self._with_stale_note(
+            store, self._day_schedule_text(store, group_number, (datetime.now().weekday() + 1) % 7)
+        )
 
-        if not lessons:
-            day_name = self.day_names[weekday_index]
-            return f"На {day_name.lower()} пар нет 🎉"
+    async def get_week_schedule(self, group_number: str) -> Optional[List[str]]:
+        """Получает расписание на неделю"""
+        store = await self._schedule_for(group_number)
+        texts = self._week_schedule_texts(store, group_number)
+        note = self.stale_note(store)
+        if texts is not None and note:
+            texts = texts + [note]
+        return texts
+
+    async def get_next_lesson(self, group_number: str) -> Optional[str]:
+        """Получает ближайшую пару"""
+        store = await self._schedule_for(group_number)
+        return self._with_stale_note(store, self._next_lesson_text(store, group_number))
 
-        day_name = self.day_names[weekday_index]
-        return self.format_day_schedule(lessons, day_name)
+    async def get_schedule_for_date(self, group_number: str, day) -> Optional[str]:
+        """Расписание на конкретную дату: берется неделя этой даты, а не текущая"""
+        store = await self.fetch_week(day, [group_number])
+        return self._with_stale_note(store, self._day_schedule_text(store, group_number, day.weekday()), day)
+
+    async def get_schedule_for_weekday(self, group_number: str, weekday_index: int) -> Optional[str]:
+        """Получает расписание для конкретного дня недели (0=Пн, 1=Вт, и т.д.)"""
+        store = await self._schedule_for(group_number)
+        return self._with_stale_note(store, self._day_schedule_text(store, group_number, weekday_index))
 
 
-api_client = ETUApiClient()
\ No newline at end of file
+api_client = AsyncETUApiClient(selective_fetch=os.getenv("ETU_SELECTIVE_FETCH") == "1")
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Потоковый разбор JSON-объекта верхнего уровня по кускам ответа:
+{"4353": {...}, "4354": {...}} отдается по одной паре ключ-значение,
+не дожидаясь конца ответа и не держа в памяти все дерево целиком
+"""
+import codecs
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = ' \t\n\r'
+
+
+class ObjectItemsParser:
+    """Инкрементальный парсер: feed(кусок) -> готовые (ключ, значение, исходный текст)"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == 'done'
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Tuple[str, Any, str]]:
+        self._buf = self._buf[self._pos:] + self._decoder.decode(chunk, final)
+        self._pos = 0
+        items = []
+        buf = self._buf
+
+        while True:
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos >= len(buf) or self._state == 'done':
+                break
+
+            char = buf[pos]
+            if self._state == 'start':
+                if char != '{':
+                    raise ValueError(f"Ожидался JSON-объект, получено {char!r}")
+                self._pos = pos + 1
+                self._state = 'first_key'
+
+            elif self._state in ('first_key', 'key'):
+                if char == '}' and self._state == 'first_key':
+                    self._pos = pos + 1
+                    self._state = 'done'
+                    continue
+                try:
+                    self._key, end = self._json.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break  # ключ пришел не целиком
+                if not isinstance(self._key, str):
+                    raise ValueError("Ключ JSON-объекта должен быть строкой")
+                self._pos = end
+                self._state = 'colon'
+
+            elif self._state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Ожидалось ':', получено {char!r}")
+                self._pos = pos + 1
+                self._state = 'value'
+
+            elif self._state == 'value':
+                try:
+                    value, end = self._json.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break  # значение пришло не целиком
+                if end == len(buf) and not final:
+                    break  # число на границе куска могло оборваться
+                items.append((self._key, value, buf[pos:end]))
+                self._pos = end
+                self._state = 'comma'
+
+            elif self._state == 'comma':
+                if char == ',':
+                    self._state = 'key'
+                elif char == '}':
+                    self._state = 'done'
+                else:
+                    raise ValueError(f"Ожидалось ',' или '}}', получено {char!r}")
+                self._pos = pos + 1
+
+        if final and self._state != 'done':
+            raise ValueError("JSON-объект оборвался")
+        return items
@@ -0,0 +1,64 @@
+import json
+import unittest
+
+from json_stream import ObjectItemsParser
+
+PAYLOAD = {
+    "4353": {"days": {"0": {"lessons": [{"name": "Матан {лекция}", "room": "5\"427"}]}}},
+    "4354": [1, 2.5, -3e2, None, True],
+    "ключ": "значение с \\ и é",
+    "5": 123456789,
+}
+
+
+def feed_in_chunks(data: bytes, size: int):
+    parser = ObjectItemsParser()
+    items = []
+    for start in range(0, len(data), size):
+        items += parser.feed(data[start:start + size])
+    items += parser.feed(b'', True)
+    return parser, items
+
+
+class ObjectItemsParserTest(unittest.TestCase):
+
+    def test_any_chunk_boundary_gives_same_items(self):
+        data = json.dumps(PAYLOAD, ensure_ascii=False, indent=1).encode('utf-8')
+        # размер 1 режет и многобайтные символы UTF-8, и числа, и экранирование
+        for size in (1, 2, 3, 7, 64, len(data)):
+            with self.subTest(size=size):
+                parser, items = feed_in_chunks(data, size)
+                self.assertTrue(parser.done)
+                self.assertEqual({key: value for key, value, _ in items}, PAYLOAD)
+                self.assertEqual([key for key, _, _ in items], list(PAYLOAD))
+
+    def test_raw_text_decodes_to_value(self):
+        data = json.dumps(PAYLOAD, ensure_ascii=False).encode('utf-8')
+        _, items = feed_in_chunks(data, 5)
+        for key, value, raw in items:
+            self.assertEqual(json.loads(raw), value)
+
+    def test_number_at_chunk_end_waits_for_next_chunk(self):
+        parser = ObjectItemsParser()
+        self.assertEqual(parser.feed(b'{"a": 12'), [])
+        items = parser.feed(b'34}', True)
+        self.assertEqual([(key, value) for key, value, _ in items], [("a", 1234)])
+
+    def test_empty_object(self):
+        parser = ObjectItemsParser()
+        self.assertEqual(parser.feed(b' { } ', True), [])
+        self.assertTrue(parser.done)
+
+    def test_not_an_object(self):
+        with self.assertRaises(ValueError):
+            ObjectItemsParser().feed(b'[1, 2]', True)
+
+    def test_truncated_object(self):
+        parser = ObjectItemsParser()
+        parser.feed(b'{"a": 1, "b": ')
+        with self.assertRaises(ValueError):
+            parser.feed(b'', True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,382 @@
+"""
+Нагрузочный тест бота целиком: поднимает заглушки API ЛЭТИ и Telegram Bot API,
+запускает main.py отдельным процессом (адреса подменяются через ETU_API_URL и
+TELEGRAM_API_URL) и отдает ему обновления от тысяч "пользователей", нажимающих
+кнопки главного меню. Задержка — от выдачи обновления боту (getUpdates) до
+первого ответного sendMessage в тот же чат.
+Сценарий генерируется или читается из JSONL ({"t": сек, "user_id": id, "text": ...}).
+Примеры:
+    python loadtest.py --users 2000 --duration 60 --record session.jsonl
+    python loadtest.py --replay session.jsonl --etu-latency 0.2
+    UPDATE_WORKERS=16 ETU_SELECTIVE_FETCH=1 python loadtest.py --users 5000
+С --serve-only только поднимает заглушки на заданных портах (для ручного
+запуска бота, например в режиме вебхука — см. webhook_client.py)
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from synthetic_data import generate, group_numbers
+from webhook_client import BUTTONS, make_update
+
+DAY_BUTTONS = [f"📅 {day}" for day in ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота")]
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found"}
+
+
+class MiniHTTPServer:
+    """HTTP/1.1 с keep-alive на asyncio — ровно то, что нужно клиентам бота"""
+
+    def __init__(self, handler):
+        # handler(method, path, query, headers, body) -> (status, headers, body)
+        self.handler = handler
+        self.port = None
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = header.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                url = urlsplit(target)
+                status, extra, payload = await self.handler(method, url.path, parse_qs(url.query), headers, body)
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}", f"Content-Length: {len(payload)}"]
+                head.extend(f"{name}: {value}" for name, value in extra.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeETU:
+    """Заглушка /groups и /schedule с ETag, выборкой groupNumber и задержкой"""
+
+    def __init__(self, groups: List[Dict], schedule: Dict[str, Dict], latency: float = 0.0, jitter: float = 0.0):
+        self.schedule = schedule
+        self.groups_body = json.dumps(groups, ensure_ascii=False).encode("utf-8")
+        self.schedule_body = json.dumps(schedule, ensure_ascii=False).encode("utf-8")
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = Counter()
+        self.bytes_sent = 0
+
+    async def handle(self, method, path, query, headers, body):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if path.endswith("/groups"):
+            payload = self.groups_body
+        elif path.endswith("/schedule"):
+            numbers = query.get("groupNumber")
+            if numbers:
+                wanted = numbers[0].split(",")
+                payload = json.dumps(
+                    {n: self.schedule[n] for n in wanted if n in self.schedule}, ensure_ascii=False
+                ).encode("utf-8")
+            else:
+                payload = self.schedule_body
+        else:
+            return 404, {}, b""
+        self.requests[path.rsplit("/", 1)[-1]] += 1
+
+        etag = f'"{hashlib.md5(payload).hexdigest()}"'
+        if headers.get("if-none-match") == etag:
+            return 304, {"ETag": etag}, b""
+        self.bytes_sent += len(payload)
+        return 200, {"Content-Type": "application/json", "ETag": etag}, payload
+
+
+class FakeTelegram:
+    """
+    Заглушка Bot API: отдает поставленные в очередь обновления через getUpdates
+    и по ответам sendMessage считает задержку обработки
+    """
+
+    def __init__(self):
+        self.updates = deque()
+        self.ready = asyncio.Event()
+        self.calls = Counter()
+        self.latencies: List[float] = []
+        # чат -> времена выдачи еще не отвеченных обновлений
+        self.pending: Dict[int, deque] = defaultdict(deque)
+        self.delivered = 0
+        self.extra_messages = 0
+        # адрес, зарегистрированный ботом через setWebhook (None — режим polling)
+        self.webhook_url = None
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+
+    def push(self, user_id: int, text: str):
+        self.updates.append(make_update(next(self._update_ids), user_id, text))
+        self._new_updates.set()
+
+    def unanswered(self) -> int:
+        return sum(len(times) for times in self.pending.values())
+
+    @staticmethod
+    def _params(headers: Dict, body: bytes) -> Dict:
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        # python-telegram-bot шлет форму, значения-объекты закодированы в JSON
+        return {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+
+    async def handle(self, method, path, query, headers, body):
+        api_method = path.rsplit("/", 1)[-1]
+        params = self._params(headers, body)
+        self.calls[api_method] += 1
+
+        if api_method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot",
+                      "can_join_groups": False, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif api_method == "getUpdates":
+            result = await self._get_updates(params)
+        elif api_method == "sendMessage":
+            result = self._send_message(params)
+        elif api_method in ("setWebhook", "deleteWebhook"):
+            # настоящий Telegram не принял бы http://127.0.0.1, заглушке адрес не важен
+            self.webhook_url = params.get("url") or None
+            result = True
+        else:
+            result = True
+        return 200, {"Content-Type": "application/json"}, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        self.ready.set()
+        offset = int(params.get("offset") or 0)
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()  # подтверждены ботом
+
+        if not self.updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                return []
+
+        now = time.perf_counter()
+        batch = list(itertools.islice(self.updates, int(params.get("limit") or 100)))
+        for update in batch:
+            if "_delivered" not in update:
+                update["_delivered"] = now
+                self.pending[update["message"]["chat"]["id"]].append(now)
+                self.delivered += 1
+        return [{k: v for k, v in update.items() if k != "_delivered"} for update in batch]
+
+    def _send_message(self, params: Dict) -> Dict:
+        chat_id = int(params["chat_id"])
+        pending = self.pending.get(chat_id)
+        if pending:
+            self.latencies.append(time.perf_counter() - pending.popleft())
+        else:
+            self.extra_messages += 1  # второе и следующие сообщения одного ответа
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+
+def generate_workload(numbers: List[str], users: int, duration: float, think_time: float,
+                      seed: int = 0) -> List[Dict]:
+    """
+    Каждый пользователь приходит в случайный момент: /start, номер группы,
+    затем нажимает кнопки меню с паузами think_time (в среднем)
+    """
+    rnd = random.Random(seed)
+    buttons = [b for b in BUTTONS if b != "❓ Помощь"] * 3 + ["❓ Помощь"] + DAY_BUTTONS
+    events = []
+    for i in range(users):
+        user_id = 100000 + i
+        t = rnd.uniform(0, duration * 0.3)
+        events.append({"t": t, "user_id": user_id, "text": "/start"})
+        t += rnd.uniform(1, 3)
+        events.append({"t": t, "user_id": user_id, "text": rnd.choice(numbers)})
+        while True:
+            t += max(1.0, rnd.expovariate(1 / think_time))
+            if t >= duration:
+                break
+            events.append({"t": t, "user_id": user_id, "text": rnd.choice(buttons)})
+    events.sort(key=lambda event: event["t"])
+    return events
+
+
+def load_workload(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event["t"])
+    return events
+
+
+def save_workload(path: str, events: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def report(tg: FakeTelegram, etu: FakeETU, elapsed: float, sent: int):
+    latencies = sorted(tg.latencies)
+    print(f"\nОбновлений отправлено: {sent}, выдано боту: {tg.delivered}, без ответа: {tg.unanswered()}")
+    print(f"Время: {elapsed:.1f} с, пропускная способность: {len(latencies) / elapsed:.1f} ответов/с "
+          f"(+{tg.extra_messages} дополнительных сообщений)")
+    print(f"Задержка обработки: p50={percentile(latencies, 0.50) * 1000:.1f} мс, "
+          f"p95={percentile(latencies, 0.95) * 1000:.1f} мс, p99={percentile(latencies, 0.99) * 1000:.1f} мс, "
+          f"max={(latencies[-1] if latencies else float('nan')) * 1000:.1f} мс")
+    print(f"Вызовы Bot API: {dict(tg.calls)}")
+    print(f"Запросы к API ЛЭТИ: {dict(etu.requests)}, передано {etu.bytes_sent / 1024 / 1024:.1f} МБ")
+
+
+def load_etu_data(args):
+    if args.etu_data:
+        with open(os.path.join(args.etu_data, "groups.json"), encoding="utf-8") as f:
+            groups = json.load(f)
+        with open(os.path.join(args.etu_data, "schedule.json"), encoding="utf-8") as f:
+            schedule = json.load(f)
+        return groups, schedule
+    return generate(args.groups, args.seed)
+
+
+async def serve_only(args):
+    """Только заглушки на фиксированных портах, бот запускается вручную"""
+    groups, schedule = load_etu_data(args)
+    etu_server = MiniHTTPServer(FakeETU(groups, schedule, args.etu_latency, args.etu_jitter).handle)
+    tg_server = MiniHTTPServer(FakeTelegram().handle)
+    await etu_server.start(port=args.etu_port)
+    await tg_server.start(port=args.telegram_port)
+    print("Заглушки запущены, окружение для бота:")
+    print(f"  TELEGRAM_API_URL=http://127.0.0.1:{tg_server.port}")
+    print(f"  ETU_API_URL=http://127.0.0.1:{etu_server.port}/api/mobile")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await tg_server.close()
+        await etu_server.close()
+
+
+async def run(args):
+    groups, schedule = load_etu_data(args)
+
+    etu = FakeETU(groups, schedule, args.etu_latency, args.etu_jitter)
+    tg = FakeTelegram()
+    etu_server = MiniHTTPServer(etu.handle)
+    tg_server = MiniHTTPServer(tg.handle)
+    await etu_server.start()
+    await tg_server.start()
+
+    if args.replay:
+        events = load_workload(args.replay)
+    else:
+        events = generate_workload(group_numbers(groups), args.users, args.duration, args.think_time, args.seed)
+    if args.record:
+        save_workload(args.record, events)
+        print(f"Сценарий записан: {args.record}")
+
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123456:LOADTEST",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{tg_server.port}",
+        "ETU_API_URL": f"http://127.0.0.1:{etu_server.port}/api/mobile",
+    })
+    # по умолчанию — без файлов на диске, рассылок и лимитов Telegram; переопределяются окружением
+    for name, value in (("USER_STORE", "memory"), ("SNAPSHOT_PATH", ""), ("BROADCAST_TIME", ""),
+                        ("REMINDER_MINUTES", "0"), ("OUTBOUND_RATE", "100000")):
+        env.setdefault(name, value)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(args.bot_log, "w", encoding="utf-8") as log:
+        bot = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(here, "main.py"), cwd=here, env=env, stdout=log, stderr=log
+        )
+        try:
+            await asyncio.wait_for(tg.ready.wait(), timeout=60)
+            print(f"Бот запущен (pid {bot.pid}), событий в сценарии: {len(events)}")
+
+            started = time.perf_counter()
+            for sent, event in enumerate(events, 1):
+                delay = started + event["t"] / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tg.push(event["user_id"], event["text"])
+                if sent % 1000 == 0:
+                    print(f"  отправлено {sent}, ответов {len(tg.latencies)}, без ответа {tg.unanswered()}")
+
+            # ждем ответов на последние обновления
+            deadline = time.perf_counter() + args.drain
+            while (tg.delivered < len(events) or tg.unanswered()) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+            report(tg, etu, time.perf_counter() - started, len(events))
+        finally:
+            bot.terminate()
+            await bot.wait()
+            await tg_server.close()
+            await etu_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с заглушками Telegram и API ЛЭТИ")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60, help="длительность сценария, с")
+    parser.add_argument("--think-time", type=float, default=8, help="средняя пауза между нажатиями, с")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение воспроизведения")
+    parser.add_argument("--replay", help="JSONL со сценарием вместо генерации")
+    parser.add_argument("--record", help="сохранить сценарий в JSONL")
+    parser.add_argument("--groups", type=int, default=3000, help="число синтетических групп")
+    parser.add_argument("--etu-data", help="каталог с groups.json и schedule.json (записанные ответы)")
+    parser.add_argument("--etu-latency", type=float, default=0.05, help="задержка API ЛЭТИ, с")
+    parser.add_argument("--etu-jitter", type=float, default=0.02)
+    parser.add_argument("--drain", type=float, default=30, help="сколько ждать ответов в конце, с")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bot-log", default="loadtest_bot.log")
+    parser.add_argument("--serve-only", action="store_true", help="только поднять заглушки и ждать")
+    parser.add_argument("--telegram-port", type=int, default=8081, help="порт заглушки Bot API (--serve-only)")
+    parser.add_argument("--etu-port", type=int, default=8082, help="порт заглушки API ЛЭТИ (--serve-only)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_only(args) if args.serve_only else run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,24 @@
-
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+import atexit
 # это логгер конфиг
+# настройка через окружение:
+#   LOG_LEVEL       — уровень (INFO)
+#   LOG_FORMAT      — color (по умолчанию) или json (одна запись — одна строка)
+#   LOG_QUEUE       — 1 (по умолчанию): форматирование и вывод в фоновом потоке
+#   LOG_RATE_LIMIT  — записей INFO и ниже в секунду с одного места в коде (0 — без ограничения)
+#   LOG_SAMPLE      — доля записей INFO и ниже, которые попадают в лог (1.0 — все)
+
+_listener = None
+_atexit_registered = False
+
+
 # настройка цветов для логов
 class ColorFormatter(logging.Formatter):
     COLORS = {
@@ -15,22 +32,114 @@ class ColorFormatter(logging.Formatter):
 
     def format(self, record):
         s = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            s += f" (пропущено похожих записей: {suppressed})"
         color = self.COLORS.get(record.levelname, '')
         reset = self.COLORS.get('RESET', '')
         return f"{color}{s}{reset}"
 
+
+class JsonFormatter(logging.Formatter):
+    """Компактный JSON в одну строку: удобно для сборщиков логов"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.processName != 'MainProcess':
+            entry['process'] = record.processName
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class ThrottleFilter(logging.Filter):
+    """
+    Ограничивает частые записи уровня INFO и ниже: не больше rate в секунду
+    с одного места в коде (файл и строка — так работает и для f-строк),
+    плюс равномерная выборка доли sample. Предупреждения и ошибки проходят всегда.
+    Сколько записей пропущено, дописывается к следующей прошедшей
+    """
+
+    def __init__(self, rate: float = 0, sample: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sample = sample
+        # место в коде -> [токены, время обновления, пропущено]
+        self._sites = {}
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+
+        with self._lock:
+            site = (record.pathname, record.lineno)
+            state = self._sites.get(site)
+            now = time.monotonic()
+            if state is None:
+                state = [self.rate, now, 0]
+                self._sites[site] = state
+
+            if self.sample < 1.0:
+                # пропускаем каждую 1/sample-ю запись, без random на горячем пути
+                self._credit += self.sample
+                if self._credit < 1:
+                    state[2] += 1
+                    return False
+                self._credit -= 1
+
+            if self.rate:
+                state[0] = min(self.rate, state[0] + (now - state[1]) * self.rate)
+                state[1] = now
+                if state[0] < 1:
+                    state[2] += 1
+                    return False
+                state[0] -= 1
+
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладет запись в очередь как есть: сообщение собирается из аргументов
+    и форматируется уже в фоновом потоке, а не в обработчике запроса.
+    Поэтому в аргументы логов передаем неизменяемые значения (id, строки)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _make_formatter(kind: str) -> logging.Formatter:
+    if kind == 'json':
+        return JsonFormatter()
+    return ColorFormatter(
+        fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%H:%M:%S"
+    )
+
+
 def setup_logger():
+    global _listener, _atexit_registered
+    level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    root_logger.setLevel(level)
     root_logger.handlers.clear()
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_formatter = ColorFormatter(
-        fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%H:%M:%S"
-    )
-    console_handler.setFormatter(console_formatter)
-    root_logger.addHandler(console_handler)
+    console_handler.setLevel(level)
+    console_handler.setFormatter(_make_formatter(os.getenv("LOG_FORMAT", "color")))
     if sys.platform == "win32":
         try:
             import ctypes
@@ -38,7 +147,40 @@ def setup_logger():
             kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
         except:
             pass
+
+    throttle = ThrottleFilter(
+        rate=float(os.getenv("LOG_RATE_LIMIT", "0")),
+        sample=float(os.getenv("LOG_SAMPLE", "1.0"))
+    )
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    if os.getenv("LOG_QUEUE", "1") == "1":
+        log_queue = queue.SimpleQueue()
+        queue_handler = _DeferredQueueHandler(log_queue)
+        # фильтр до очереди: отброшенная запись ничего не стоит
+        queue_handler.addFilter(throttle)
+        root_logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+        _listener.start()
+        if not _atexit_registered:
+            # дописываем очередь при выходе
+            atexit.register(_stop_listener)
+            _atexit_registered = True
+    else:
+        console_handler.addFilter(throttle)
+        root_logger.addHandler(console_handler)
     return root_logger
 
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(name: str = None):
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
@@ -10,38 +10,204 @@ setup_logger()
 
 # импорты обработчиков
 from bot_handlers import (
-    BOT_NAME, DEVELOPER_ID,
+    BOT_NAME, DEVELOPER_ID, BROADCAST_TIME, REMINDER_MINUTES, user_groups, error_reports,
     start_command, handle_text, help_command,
-    menu_command, myid_command, error_handler
+    menu_command, myid_command, subscribe_command,
+    unsubscribe_command, remind_command, profile_command, errors_command, error_handler
 )
 
 import logging
+from datetime import datetime
 from telegram import Update
+import metrics
+from broadcast import BroadcastProgress, DailyBroadcast
+from reminders import ReminderScheduler
+from etu_api import api_client
+from outbound import outbound
+from snapshot import ScheduleSnapshot
 
 logger = logging.getLogger(__name__)
 
-
-def main():
+daily_broadcast = None
+reminder_scheduler = None
+metrics_server = None
+
+
+def collect_runtime_metrics():
+    """Счетчики, которые уже ведут кэши и очередь исходящих, в формате метрик"""
+    render = api_client.render_cache.stats()
+    yield ("render_cache_requests_total", "counter", "Обращения к кэшу отрисованных сообщений",
+           [({"result": "hit"}, render["hits"]), ({"result": "miss"}, render["misses"])])
+    yield ("render_cache_entries", "gauge", "Записей в кэше отрисовки", [({}, render["entries"])])
+    yield ("schedule_cache_weeks", "gauge", "Недель в кэше расписания", [({}, len(api_client.schedule_cache))])
+    yield ("outbound_messages_total", "counter", "Исходящие сообщения по результату",
+           [({"result": "sent"}, outbound.sent), ({"result": "failed"}, outbound.failed),
+            ({"result": "retried"}, outbound.retried)])
+    yield ("outbound_queue_pending", "gauge", "Сообщений в очереди на отправку", [({}, outbound.pending())])
+    yield ("bot_users", "gauge", "Пользователей с выбранной группой", [({}, len(user_groups))])
+    breaker = api_client.breaker
+    yield ("etu_circuit_state", "gauge", "Состояние предохранителя API ЛЭТИ (1 — текущее)",
+           [({"state": state}, int(breaker.state == state)) for state in ("closed", "open", "half_open")])
+    yield ("etu_circuit_trips_total", "counter", "Сколько раз предохранитель API ЛЭТИ размыкался",
+           [({}, breaker.trips)])
+    if reminder_scheduler is not None:
+        yield ("reminder_events_pending", "gauge", "Событий в куче напоминаний",
+               [({}, reminder_scheduler.pending())])
+
+
+async def start_metrics():
+    """HTTP-сервер метрик на METRICS_PORT (в режиме нескольких процессов — порт + номер рабочего)"""
+    global metrics_server
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    metrics.registry.register_collector(collect_runtime_metrics)
+    port = int(port) + int(os.getenv("WORKER_INDEX", "0"))
+    try:
+        metrics_server = await metrics.serve(port, os.getenv("METRICS_HOST", "0.0.0.0"))
+    except OSError as e:
+        logger.error(f"Не удалось запустить сервер метрик на порту {port}: {e}")
+
+
+def start_notifications():
+    """Рассылка и напоминания; в режиме нескольких процессов — только в первом рабочем"""
+    global daily_broadcast, reminder_scheduler
+    if os.getenv("WORKER_INDEX", "0") != "0":
+        return
+    if REMINDER_MINUTES:
+        reminder_scheduler = ReminderScheduler(user_groups, api_client, outbound, minutes_before=REMINDER_MINUTES)
+        reminder_scheduler.start()
+    if not BROADCAST_TIME:
+        return
+    progress_path = ":memory:" if os.getenv("USER_STORE") == "memory" else os.getenv("USERS_DB_PATH", "users.sqlite3")
+    daily_broadcast = DailyBroadcast(
+        user_groups, api_client, outbound, BroadcastProgress(progress_path),
+        send_at=datetime.strptime(BROADCAST_TIME, "%H:%M").time(),
+        concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+    )
+    daily_broadcast.start()
+
+
+async def on_startup(app):
+    await user_groups.start()
+    # все исходящие сообщения идут через очередь с учетом лимитов Telegram
+    outbound.start(app.bot)
+    error_reports.start()
+    await start_metrics()
+    # поднимаем кэши из снимка на диске и обновляем их в фоне
+    snapshot_path = os.getenv("SNAPSHOT_PATH", "etu_snapshot.sqlite3")
+    if snapshot_path:
+        api_client.attach_snapshot(ScheduleSnapshot(snapshot_path))
+    if os.getenv("BOT_ROLE") == "worker":
+        # в режиме нескольких процессов расписание обновляет только процесс-обновлятель
+        api_client.read_only = True
+        start_notifications()
+        return
+    start_notifications()
+    app.create_task(api_client.refresh())
+    app.create_task(api_client.run_refresh_loop())
+
+
+async def on_shutdown(app):
+    if metrics_server is not None:
+        metrics_server.close()
+    if daily_broadcast is not None:
+        await daily_broadcast.close()
+    if reminder_scheduler is not None:
+        await reminder_scheduler.close()
+    # последняя сводка ошибок уходит до закрытия очереди
+    await error_reports.close()
+    # дожидаемся отправки уже поставленных в очередь сообщений
+    await outbound.close()
+    # закрываем пул соединений к API ЛЭТИ
+    await api_client.close()
+    # дописываем на диск несохраненные изменения пользователей
+    await user_groups.close()
+
+
+def build_application(token: str):
+    """Собирает приложение со всеми обработчиками (без запуска)"""
     from telegram.ext import Application, CommandHandler, MessageHandler, filters
 
-    token = os.getenv("BOT_TOKEN")
-    if not token:
-        logger.error("BOT_TOKEN не найден в переменных окружения!")
-        sys.exit(1)
-
-    app = Application.builder().token(token).build()
+    builder = (
+        Application.builder()
+        .token(token)
+        # обновления разных пользователей обрабатываются параллельно: долгая загрузка
+        # расписания или ожидание очереди исходящих не задерживает остальных
+        .concurrent_updates(int(os.getenv("UPDATE_WORKERS", "64")))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    # адрес Bot API можно подменить (локальный сервер или заглушка для тестов)
+    api_url = os.getenv("TELEGRAM_API_URL")
+    if api_url:
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("menu", menu_command))
     app.add_handler(CommandHandler("myid", myid_command))
+    app.add_handler(CommandHandler("subscribe", subscribe_command))
+    app.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    app.add_handler(CommandHandler("remind", remind_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("errors", errors_command))
 
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
     app.add_error_handler(error_handler)
+    return app
+
+
+def run_webhook(app):
+    """
+    Режим вебхука: встроенный HTTP-сервер python-telegram-bot принимает
+    обновления от Telegram (или от обратного прокси) и проверяет секретный токен.
+    WEBHOOK_URL всегда регистрируется через setWebhook: для настоящего Telegram
+    это внешний https-адрес, для локальной проверки — см. webhook_client.py
+    """
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if not webhook_url:
+        logger.error("Для BOT_MODE=webhook нужен WEBHOOK_URL (внешний адрес бота)")
+        sys.exit(1)
+
+    secret = os.getenv("WEBHOOK_SECRET")
+    if not secret:
+        logger.warning("WEBHOOK_SECRET не задан: запросы к вебхуку не проверяются")
+
+    url_path = os.getenv("WEBHOOK_PATH", "telegram")
+    logger.info(f"🌐 Режим вебхука: {webhook_url.rstrip('/')}/{url_path}")
+
+    app.run_webhook(
+        listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        url_path=url_path,
+        webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+        secret_token=secret,
+        drop_pending_updates=True,
+        allowed_updates=Update.ALL_TYPES
+    )
+
+
+def main():
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        logger.error("BOT_TOKEN не найден в переменных окружения!")
+        sys.exit(1)
 
     logger.info("🤖 Бот запущен и готов к работе!")
 
+    mode = os.getenv("BOT_MODE", "polling")
+    if mode == "webhook":
+        run_webhook(build_application(token))
+        return
+    if mode == "workers":
+        from workers import run_workers
+        run_workers(token, int(os.getenv("WORKERS", str(os.cpu_count() or 2))))
+        return
+
+    app = build_application(token)
     app.run_polling(
         drop_pending_updates=True,
         allowed_updates=Update.ALL_TYPES
@@ -49,4 +215,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,76 @@
+"""
+Упаковка текста расписания в как можно меньшее число сообщений Telegram.
+Резать можно только между днями и между парами (по пустой строке):
+HTML-теги живут внутри строки, поэтому разметка не ломается
+"""
+from typing import Iterable, List
+
+# лимит Telegram — 4096 символов; HTML-теги в него не входят,
+# но эмодзи могут считаться за два символа, поэтому берем с запасом
+MESSAGE_LIMIT = 4000
+
+_BLOCK_SEPARATOR = "\n\n"
+
+
+def _split_oversized(block: str, limit: int) -> List[str]:
+    """Блок длиннее лимита режем по строкам, а строку — как получится"""
+    pieces = []
+    for line in block.splitlines(keepends=True):
+        while len(line) > limit:
+            pieces.append(line[:limit])
+            line = line[limit:]
+        pieces.append(line)
+    return pieces
+
+
+def split_blocks(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Делит текст на неразрывные блоки: заголовок дня, отдельные пары"""
+    blocks = []
+    start = 0
+    while start < len(text):
+        end = text.find(_BLOCK_SEPARATOR, start)
+        end = len(text) if end == -1 else end + len(_BLOCK_SEPARATOR)
+        block = text[start:end]
+        if len(block) > limit:
+            blocks.extend(_split_oversized(block, limit))
+        else:
+            blocks.append(block)
+        start = end
+    return blocks
+
+
+def _flush(messages: List[str], current: str):
+    current = current.rstrip()
+    if current:
+        messages.append(current)
+
+
+def pack_messages(texts: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Склеивает тексты (например, дни недели) в минимальное число сообщений.
+    День целиком переносится в следующее сообщение, если не влезает;
+    по парам режется только день, который сам длиннее лимита
+    """
+    messages = []
+    current = ""
+    for text in texts:
+        text = text.rstrip()
+        if not text:
+            continue
+        # между днями всегда пустая строка; в конце сообщения она срежется
+        text += _BLOCK_SEPARATOR
+        if len(current) + len(text) <= limit:
+            current += text
+            continue
+        _flush(messages, current)
+        current = ""
+        if len(text) <= limit:
+            current = text
+            continue
+        for block in split_blocks(text, limit):
+            if len(current) + len(block) > limit:
+                _flush(messages, current)
+                current = ""
+            current += block
+    _flush(messages, current)
+    return messages
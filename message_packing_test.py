@@ -0,0 +1,51 @@
+import unittest
+
+from message_packing import MESSAGE_LIMIT, pack_messages, split_blocks
+
+# лимит самого Telegram
+TELEGRAM_LIMIT = 4096
+
+
+def day(title: str, lessons: int, width: int = 60) -> str:
+    return "\n\n".join([f"<b>{title}</b>"] + [f"<i>{i}</i> " + "x" * width for i in range(lessons)])
+
+
+class PackMessagesTest(unittest.TestCase):
+
+    def test_limit_is_below_telegram_limit(self):
+        self.assertLess(MESSAGE_LIMIT, TELEGRAM_LIMIT)
+
+    def test_small_days_share_one_message(self):
+        days = [day(name, 3) for name in ("Пн", "Вт", "Ср")]
+        self.assertEqual(pack_messages(days), ["\n\n".join(days)])
+
+    def test_day_moves_whole_to_next_message(self):
+        days = [day("Пн", 40), day("Вт", 40)]
+        messages = pack_messages(days)
+        self.assertEqual(messages, days)
+
+    def test_oversized_day_is_cut_between_lessons(self):
+        text = day("Пн", 200)
+        messages = pack_messages([text])
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message), MESSAGE_LIMIT)
+            # теги не разрезаны: каждая пара целиком
+            self.assertEqual(message.count("<i>"), message.count("</i>"))
+        self.assertEqual("\n\n".join(messages), text)
+
+    def test_exactly_at_limit(self):
+        text = "a" * MESSAGE_LIMIT
+        self.assertEqual(pack_messages([text]), [text])
+        messages = pack_messages([text + "b"])
+        self.assertEqual([len(m) for m in messages], [MESSAGE_LIMIT, 1])
+
+    def test_empty_texts_are_skipped(self):
+        self.assertEqual(pack_messages(["", "  \n", "Пн"]), ["Пн"])
+
+    def test_split_blocks_keeps_separator_with_block(self):
+        self.assertEqual(split_blocks("a\n\nb\n\nc"), ["a\n\n", "b\n\n", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+"""
+Центральная очередь исходящих сообщений с учетом лимитов Telegram:
+общий и по-чатовый token bucket, приоритеты (ответы пользователям
+раньше рассылок) и автоматическое ожидание после 429 (RetryAfter).
+Кроме сообщений через очередь идут действия в чате ("печатает...") и файлы
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Dict
+
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+# полосы приоритета: чем меньше, тем раньше уходит сообщение
+INTERACTIVE = 0
+NOTIFY = 1
+BROADCAST = 2
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд можно будет взять токен (0 — уже можно)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        """Не выдавать токены seconds секунд (после RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class _Outgoing:
+    __slots__ = ('chat_id', 'method', 'priority', 'kwargs', 'future', 'attempts')
+
+    def __init__(self, chat_id: int, method: str, priority: int, kwargs: Dict, future: asyncio.Future):
+        self.chat_id = chat_id
+        # метод Bot: send_message, send_chat_action или send_document
+        self.method = method
+        self.priority = priority
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """
+    Все исходящие сообщения проходят здесь. В один чат одновременно
+    отправляется не больше одного сообщения, поэтому порядок сохраняется
+    """
+
+    def __init__(self, global_rate: float = 25, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.bot = None
+        self._lanes = [deque() for _ in (INTERACTIVE, NOTIFY, BROADCAST)]
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._busy_chats = set()
+        self._sending = set()
+        self._wakeup = None
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self, bot):
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10):
+        """Дожидается отправки оставшихся сообщений (не дольше timeout)"""
+        deadline = time.monotonic() + timeout
+        while (self.pending() or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+    def _enqueue(self, chat_id: int, method: str, priority: int, kwargs: Dict) -> asyncio.Future:
+        if self._task is None:
+            raise RuntimeError("Очередь исходящих сообщений не запущена")
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(_Outgoing(chat_id, method, priority, kwargs, future))
+        self._wakeup.set()
+        return future
+
+    async def send(self, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        """Ставит сообщение в очередь и ждет, пока оно будет отправлено"""
+        return await self._enqueue(chat_id, "send_message", priority, dict(kwargs, text=text))
+
+    async def reply(self, update, text: str, priority: int = INTERACTIVE, **kwargs):
+        """Ответ в чат, из которого пришло обновление"""
+        return await self.send(update.effective_chat.id, text, priority, **kwargs)
+
+    async def send_document(self, chat_id: int, document, priority: int = NOTIFY, **kwargs):
+        """Файл в чат (filename, caption и прочее — в kwargs); ждет отправки"""
+        return await self._enqueue(chat_id, "send_document", priority, dict(kwargs, document=document))
+
+    def chat_action(self, update, action: str = "typing", priority: int = INTERACTIVE):
+        """
+        "Печатает..." в чат обновления. Не ждет отправки: ответ встанет
+        в очередь следом и в этот чат все равно уйдет после действия
+        """
+        future = self._enqueue(update.effective_chat.id, "send_chat_action", priority, {"action": action})
+        # действие необязательное: его ошибка только в лог
+        future.add_done_callback(_log_action_failure)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _next_ready(self, now: float):
+        """Первое по приоритету сообщение, которое можно отправить сейчас, и время до следующего"""
+        wait = None
+        for lane in self._lanes:
+            for index, item in enumerate(lane):
+                if item.chat_id in self._busy_chats:
+                    continue
+                delay = self._chat_bucket(item.chat_id).delay(now)
+                if delay == 0:
+                    del lane[index]
+                    return item, 0
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            global_delay = self._global.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            item, wait = self._next_ready(now)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take(now)
+            self._chat_bucket(item.chat_id).take(now)
+            self._busy_chats.add(item.chat_id)
+            task = asyncio.create_task(self._deliver(item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+            self._forget_idle_chats()
+
+    def _forget_idle_chats(self):
+        # корзины полностью восстановившихся чатов не нужны
+        if len(self._chats) < 10000:
+            return
+        now = time.monotonic()
+        for chat_id in [c for c, b in self._chats.items() if b.delay(now) == 0 and b.tokens >= b.capacity]:
+            del self._chats[chat_id]
+
+    async def _deliver(self, item: _Outgoing):
+        try:
+            message = await getattr(self.bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning(f"Flood control для чата {item.chat_id}: ждем {retry_after} с")
+            self._chat_bucket(item.chat_id).block(retry_after)
+            self._requeue(item)
+        except (TimedOut, NetworkError) as e:
+            item.attempts += 1
+            if item.attempts > self.max_retries:
+                self._fail(item, e)
+            else:
+                self._chat_bucket(item.chat_id).block(min(2 ** item.attempts, 30))
+                self._requeue(item)
+        except Exception as e:
+            self._fail(item, e)
+        else:
+            self.sent += 1
+            if not item.future.done():
+                item.future.set_result(message)
+        finally:
+            self._busy_chats.discard(item.chat_id)
+            self._wakeup.set()
+
+    def _requeue(self, item: _Outgoing):
+        self.retried += 1
+        # в начало своей полосы: сообщение уже отстояло очередь
+        self._lanes[item.priority].appendleft(item)
+
+    def _fail(self, item: _Outgoing, error: Exception):
+        self.failed += 1
+        if not item.future.done():
+            item.future.set_exception(error)
+
+
+def _log_action_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug(f"Действие в чате не отправлено: {future.exception()}")
+
+
+# лимит Telegram общий на бота: в режиме workers каждый процесс берет свою долю.
+# Общий лимит можно поднять для нагрузочных тестов с заглушкой Bot API
+outbound = OutboundQueue(
+    global_rate=float(os.getenv("OUTBOUND_RATE", "25")) / int(os.getenv("WORKER_COUNT", "1"))
+)
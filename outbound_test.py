@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from telegram.error import RetryAfter, TimedOut
+
+from outbound import BROADCAST, INTERACTIVE, NOTIFY, OutboundQueue
+
+
+class FakeBot:
+    """Запоминает вызовы; failures — сколько первых вызовов метода завершить ошибкой"""
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = dict(failures or {})
+
+    async def _call(self, method, chat_id, payload):
+        self.calls.append((method, chat_id, payload))
+        error = self.failures.get(method)
+        if error is not None and error[1] > 0:
+            self.failures[method] = (error[0], error[1] - 1)
+            raise error[0]
+        return len(self.calls)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._call("send_message", chat_id, text)
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        return await self._call("send_chat_action", chat_id, action)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._call("send_document", chat_id, kwargs.get("filename"))
+
+
+def update_for(chat_id: int):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+class OutboundQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # лимиты не мешают: проверяем порядок и повторы, а не скорость
+        self.queue = OutboundQueue(global_rate=1000, chat_rate=1000, chat_burst=1000, max_retries=2)
+
+    async def asyncTearDown(self):
+        await self.queue.close(timeout=1)
+
+    def start(self, bot: FakeBot) -> FakeBot:
+        self.queue.start(bot)
+        return bot
+
+    async def test_send_requires_start(self):
+        with self.assertRaises(RuntimeError):
+            await self.queue.send(1, "текст")
+
+    async def test_messages_in_one_chat_keep_order(self):
+        bot = self.start(FakeBot())
+        await asyncio.gather(*(self.queue.send(1, str(i)) for i in range(20)))
+        self.assertEqual([text for _, _, text in bot.calls], [str(i) for i in range(20)])
+        self.assertEqual(self.queue.sent, 20)
+
+    async def test_interactive_goes_before_broadcast(self):
+        bot = self.start(FakeBot())
+        # все три встают в очередь раньше, чем она успевает что-то отправить
+        await asyncio.gather(
+            self.queue.send(1, "рассылка", BROADCAST),
+            self.queue.send(2, "уведомление", NOTIFY),
+            self.queue.send(3, "ответ", INTERACTIVE),
+        )
+        self.assertEqual([text for _, _, text in bot.calls], ["ответ", "уведомление", "рассылка"])
+
+    async def test_retry_after_is_retried(self):
+        bot = self.start(FakeBot({"send_message": (RetryAfter(0), 1)}))
+        await self.queue.send(1, "текст")
+        self.assertEqual(len(bot.calls), 2)
+        self.assertEqual(self.queue.retried, 1)
+
+    async def test_network_errors_give_up_after_max_retries(self):
+        self.queue.max_retries = 0
+        bot = self.start(FakeBot({"send_message": (TimedOut(), 5)}))
+        with self.assertRaises(TimedOut):
+            await self.queue.send(1, "текст")
+        self.assertEqual(len(bot.calls), 1)
+        self.assertEqual(self.queue.failed, 1)
+
+    async def test_chat_action_goes_before_reply_and_errors_are_ignored(self):
+        bot = self.start(FakeBot({"send_chat_action": (RuntimeError("нет прав"), 1)}))
+        self.queue.chat_action(update_for(5))
+        await self.queue.reply(update_for(5), "ответ")
+        self.assertEqual(
+            [(method, chat_id) for method, chat_id, _ in bot.calls],
+            [("send_chat_action", 5), ("send_message", 5)]
+        )
+
+    async def test_document_goes_through_queue(self):
+        bot = self.start(FakeBot())
+        await self.queue.send_document(7, b"data", filename="report.txt")
+        self.assertEqual(bot.calls, [("send_document", 7, "report.txt")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+Профилирование работающего бота по команде разработчика:
+cProfile или выборочный профилировщик потока цикла событий и снимки
+tracemalloc за заданное время. Отчет — текст с топ-N строками и
+размерами живых кэшей api_client
+"""
+import asyncio
+import cProfile
+import gc
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CPU = "cpu"
+SAMPLE = "sample"
+MEMORY = "mem"
+KINDS = (CPU, SAMPLE, MEMORY)
+
+MAX_SECONDS = 600
+
+# кадры самого asyncio есть в каждой выборке, в отчете "в стеке" они только мешают
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+# типы, по ссылкам из которых не идем при подсчете размера: они общие для всего процесса
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.CodeType)
+
+
+def deep_size(obj) -> int:
+    """Приблизительный размер объекта со всем, на что он ссылается (байты)"""
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return size
+
+
+def _format_size(size: float) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def cache_report(client) -> List[str]:
+    """Размеры кэшей клиента API ЛЭТИ; считается в потоке цикла, пока кэши не меняются"""
+    lines = ["== Кэши api_client =="]
+    groups = client.groups_cache or []
+    lines.append(f"groups_cache: {len(groups)} факультетов, {_format_size(deep_size(groups))}")
+    lines.append(f"groups_index: {len(client.groups_index)} групп, {_format_size(deep_size(client.groups_index))}")
+
+    lines.append(f"schedule_cache: недель {len(client.schedule_cache)} "
+                 f"(не больше {client.schedule_cache.max_entries})")
+    for key, store in client.schedule_cache.items():
+        age = client.schedule_cache.age(key) or 0
+        lines.append(f"  {key}: {len(store)} групп, возраст {age / 60:.0f} мин, {_format_size(deep_size(store))}")
+
+    render = client.render_cache.stats()
+    total = render['hits'] + render['misses']
+    hit_rate = render['hits'] / total * 100 if total else 0
+    lines.append(f"render_cache: {render['entries']} записей (не больше {client.render_cache.max_entries}), "
+                 f"попаданий {hit_rate:.1f}%, {_format_size(deep_size(client.render_cache.items()))}")
+    lines.append(f"validators: {len(client.validators)}")
+    for name in ("_in_flight", "_pending_groups", "_background"):
+        if hasattr(client, name):
+            lines.append(f"{name}: {len(getattr(client, name))}")
+    return lines
+
+
+class _StackSampler(threading.Thread):
+    """Раз в interval секунд снимает стек потока цикла событий"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        # (файл, строка, функция) -> сколько раз была наверху стека / где-то в стеке
+        self.own = Counter()
+        self.total = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            # наверху стека — с точностью до строки, в стеке — до функции
+            self.own[(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)] += 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                site = (code.co_filename, code.co_firstlineno, code.co_name)
+                if site not in seen and not code.co_filename.startswith(_ASYNCIO_DIR):
+                    seen.add(site)
+                    self.total[site] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Один сеанс профилирования за раз. Сеанс идет в фоне и заканчивается
+    по времени или по stop(); run возвращает готовый текст отчета
+    """
+
+    def __init__(self, sample_interval: float = 0.005):
+        self.sample_interval = sample_interval
+        self.kind: Optional[str] = None
+        self.started: Optional[float] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def busy(self) -> bool:
+        return self.kind is not None
+
+    def stop(self) -> bool:
+        """Досрочно завершает текущий сеанс; False если сеанса нет"""
+        if self._stop_event is None:
+            return False
+        self._stop_event.set()
+        return True
+
+    async def _wait(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, kind: str, seconds: float, top: int = 30, client=None) -> str:
+        if kind not in KINDS:
+            raise ValueError(f"неизвестный вид профилирования: {kind}")
+        if self.busy():
+            raise RuntimeError(f"уже идет профилирование ({self.kind})")
+
+        seconds = min(max(seconds, 1), MAX_SECONDS)
+        self.kind = kind
+        self.started = time.monotonic()
+        self._stop_event = asyncio.Event()
+        logger.info(f"Профилирование {kind} на {seconds:.0f} с")
+        try:
+            if kind == CPU:
+                body = await self._run_cprofile(seconds, top)
+            elif kind == SAMPLE:
+                body = await self._run_sampler(seconds, top)
+            else:
+                body = await self._run_tracemalloc(seconds, top)
+            elapsed = time.monotonic() - self.started
+        finally:
+            self.kind = None
+            self._stop_event = None
+
+        header = [
+            f"Профилирование {kind}: {elapsed:.1f} с, {datetime.now():%d.%m.%Y %H:%M:%S}",
+            f"Python {sys.version.split()[0]}",
+            "",
+        ]
+        if client is not None:
+            body += [""] + cache_report(client)
+        return "\n".join(header + body) + "\n"
+
+    async def _run_cprofile(self, seconds: float, top: int) -> List[str]:
+        # cProfile видит только текущий поток, то есть цикл событий; asyncio.to_thread не попадает
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self._wait(seconds)
+        finally:
+            profile.disable()
+
+        lines = []
+        for sort_key, title in (("tottime", "собственное время"), ("cumulative", "с вложенными вызовами")):
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(top)
+            lines += [f"== Топ-{top}: {title} ==", stream.getvalue().strip(), ""]
+        return lines
+
+    async def _run_sampler(self, seconds: float, top: int) -> List[str]:
+        sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        try:
+            await self._wait(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+
+        if not sampler.samples:
+            return ["Нет ни одной выборки"]
+        lines = [f"Выборок: {sampler.samples} (раз в {self.sample_interval * 1000:.0f} мс)", ""]
+        for counts, title in ((sampler.own, "наверху стека"), (sampler.total, "в стеке")):
+            lines.append(f"== Топ-{top}: {title} ==")
+            for (filename, lineno, name), count in counts.most_common(top):
+                lines.append(f"{count / sampler.samples * 100:6.1f}%  {name}  {filename}:{lineno}")
+            lines.append("")
+        return lines
+
+    async def _run_tracemalloc(self, seconds: float, top: int) -> List[str]:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(10)
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        try:
+            before = tracemalloc.take_snapshot().filter_traces(filters)
+            await self._wait(seconds)
+            after = tracemalloc.take_snapshot().filter_traces(filters)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+        lines = [f"Отслежено сейчас: {_format_size(current)}, пик: {_format_size(peak)}"]
+        if started_here:
+            lines.append("tracemalloc включен на время сеанса: видны только выделения за это время")
+        lines += ["", f"== Топ-{top}: прирост за сеанс =="]
+        lines += [str(stat) for stat in after.compare_to(before, "lineno")[:top]]
+        lines += ["", f"== Топ-{top}: занято сейчас =="]
+        lines += [str(stat) for stat in after.statistics("lineno")[:top]]
+        return lines
+
+
+profiler = Profiler()
@@ -0,0 +1,223 @@
+"""
+Напоминания за N минут до начала пары (/remind).
+Вместо опроса ближайшей пары для каждого пользователя строится куча
+событий "начало пары группы" из уже разобранного расписания: планировщик
+спит до ближайшего события и отправляет напоминание сразу всем
+подписчикам группы. При обновлении расписания пересчитываются только
+группы, у которых поменялось время начала пар
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import Forbidden
+
+from outbound import NOTIFY
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """
+    Куча (время срабатывания, группа, неделя, день, минута начала, поколение).
+    Устаревшие события из кучи не удаляются: у группы просто меняется
+    поколение, и старые события пропускаются при извлечении
+    """
+
+    def __init__(self, users, client, sender, minutes_before: int = 15,
+                 check_interval: float = 60, late_grace: float = 300):
+        self.users = users
+        self.client = client
+        self.sender = sender
+        self.minutes_before = minutes_before
+        # как часто проверять подписчиков и версию расписания
+        self.check_interval = check_interval
+        # насколько можно опоздать с напоминанием (например, после перезапуска)
+        self.late_grace = late_grace
+        self._heap: List[Tuple[float, str, str, int, int, int]] = []
+        # (неделя, группа) -> (минуты начала пар по дням, поколение)
+        self._scheduled: Dict[Tuple[str, str], Tuple[tuple, int]] = {}
+        self._generation = 0
+        # сколько событий в куче уже устарели (для периодической чистки)
+        self._stale = 0
+        self._subscribers: Dict[int, str] = {}
+        # по чему строились события в прошлый раз: версии недель и группы
+        self._synced = None
+        self._task = None
+        self._firing = set()
+        self.sent = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def _fire_at(self, week_key: str, weekday: int, start: int) -> float:
+        monday = date.fromisoformat(week_key)
+        lesson_start = datetime.combine(monday + timedelta(days=weekday), datetime.min.time()) \
+            + timedelta(minutes=start - self.minutes_before)
+        return lesson_start.timestamp()
+
+    def _schedule_group(self, store, group_number: str, now: float):
+        """Пересчитывает события группы на неделю, если поменялось время пар"""
+        starts = store.starts(group_number)
+        if starts is None:
+            return
+        key = (store.week_key, group_number)
+        scheduled = self._scheduled.get(key)
+        # опоздавшие события берем только при первом построении: иначе они уже отправлены
+        not_before = now - self.late_grace
+        if scheduled is not None:
+            if scheduled[0] == starts:
+                return
+            self._stale += self._event_count(scheduled[0])
+            not_before = now
+        self._generation += 1
+        self._scheduled[key] = (starts, self._generation)
+        for weekday, day_starts in enumerate(starts):
+            # у одной минуты начала может быть несколько пар (подгруппы): одно событие
+            for start in sorted(set(day_starts)):
+                fire_at = self._fire_at(store.week_key, weekday, start)
+                if fire_at > not_before:
+                    heapq.heappush(
+                        self._heap,
+                        (fire_at, group_number, store.week_key, weekday, start, self._generation)
+                    )
+
+    @staticmethod
+    def _event_count(starts: tuple) -> int:
+        return sum(len(set(day_starts)) for day_starts in starts)
+
+    async def sync(self):
+        """Подтягивает подписчиков и расписание, добавляет недостающие события"""
+        self._subscribers = await self.users.reminder_subscribers()
+        groups = set(self._subscribers.values())
+        if not groups:
+            self._scheduled.clear()
+            self._heap.clear()
+            self._stale = 0
+            self._synced = None
+            return
+
+        stores = []
+        store = await self.client.get_schedule_store(list(groups))
+        if store is not None:
+            stores.append(store)
+            # следующая неделя — если уже загружена (в воскресенье ее подгружает обновление)
+            next_store = self.client.cached_week(date.fromisoformat(store.week_key) + timedelta(days=7))
+            if next_store is not None:
+                stores.append(next_store)
+
+        synced = (tuple(store.version for store in stores), frozenset(groups))
+        if synced == self._synced:
+            return  # ни расписание, ни состав групп не поменялись
+        self._synced = synced
+
+        now = time.time()
+        weeks = {store.week_key for store in stores}
+        for store in stores:
+            for group_number in groups:
+                self._schedule_group(store, group_number, now)
+        # группы без подписчиков и ушедшие недели: их события станут устаревшими
+        for key in [k for k in self._scheduled if k[0] not in weeks or k[1] not in groups]:
+            self._stale += self._event_count(self._scheduled.pop(key)[0])
+        if self._stale > len(self._heap) // 2:
+            self._compact()
+
+    def _compact(self):
+        """Выбрасывает из кучи устаревшие события"""
+        self._heap = [event for event in self._heap if self._is_current(event)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _is_current(self, event) -> bool:
+        _, group_number, week_key, _, _, generation = event
+        scheduled = self._scheduled.get((week_key, group_number))
+        return scheduled is not None and scheduled[1] == generation
+
+    def _pop_due(self, now: float) -> Dict[str, List[Tuple[str, int, int]]]:
+        """Наступившие события, сгруппированные по группам"""
+        due = defaultdict(list)
+        while self._heap and self._heap[0][0] <= now:
+            event = heapq.heappop(self._heap)
+            fire_at, group_number, week_key, weekday, start, _ = event
+            if not self._is_current(event):
+                self._stale = max(0, self._stale - 1)
+                continue
+            if now - fire_at > self.late_grace:
+                logger.info(f"Пропущено устаревшее напоминание группы {group_number}")
+                continue
+            due[group_number].append((week_key, weekday, start))
+        return due
+
+    def _render(self, week_key: str, group_number: str, weekday: int, start: int) -> Optional[str]:
+        """Текст напоминания по текущему расписанию (аудитория могла поменяться)"""
+        store = self.client.cached_week(date.fromisoformat(week_key))
+        group_week = store.get(group_number) if store is not None else None
+        if group_week is None:
+            return None
+        lessons = [lesson for lesson in group_week[weekday] if lesson.start == start]
+        if not lessons:
+            return None
+        return "\n\n".join(self.client.format_single_lesson(lesson) for lesson in lessons)
+
+    async def _fire(self, due: Dict[str, List[Tuple[str, int, int]]]):
+        by_group: Dict[str, List[int]] = defaultdict(list)
+        for user_id, group_number in self._subscribers.items():
+            if group_number in due:
+                by_group[group_number].append(user_id)
+
+        recipients = []
+        sends = []
+        for group_number, events in due.items():
+            for week_key, weekday, start in events:
+                # одно формирование текста на группу и время начала
+                text = self._render(week_key, group_number, weekday, start)
+                if text is None:
+                    continue
+                text = f"⏰ <b>Скоро пара!</b>\n\n{text}"
+                for user_id in by_group.get(group_number, ()):
+                    recipients.append(user_id)
+                    sends.append(self.sender.send(user_id, text, priority=NOTIFY, parse_mode="HTML"))
+
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for user_id, result in zip(recipients, results):
+            if isinstance(result, Forbidden):
+                # бот заблокирован: больше не напоминаем
+                await self.users.write_reminded(user_id, False)
+        failed = sum(isinstance(result, Exception) for result in results)
+        self.sent += len(results) - failed
+        logger.info(f"Напоминания: групп {len(due)}, отправлено {len(results) - failed}, ошибок {failed}")
+
+    async def _loop(self):
+        next_sync = 0.0
+        while True:
+            now = time.time()
+            if now >= next_sync:
+                try:
+                    await self.sync()
+                except Exception as e:
+                    logger.error(f"Не удалось обновить напоминания: {e}")
+                next_sync = now + self.check_interval
+
+            due = self._pop_due(time.time())
+            if due:
+                # отправка не должна задерживать следующие события
+                task = asyncio.create_task(self._fire(due))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+
+            wake_at = next_sync
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            await asyncio.sleep(max(0.0, wake_at - time.time()))
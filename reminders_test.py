@@ -0,0 +1,194 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from telegram.error import Forbidden
+
+from reminders import ReminderScheduler
+from schedule_store import EMPTY_WEEK, Lesson, ScheduleStore
+
+MONDAY = date(2024, 3, 4)
+NEXT_MONDAY = MONDAY + timedelta(days=7)
+
+
+def at(day: date, hours: int, minutes: int = 0) -> float:
+    return datetime.combine(day, datetime.min.time()).timestamp() + hours * 3600 + minutes * 60
+
+
+def make_store(monday: date, groups) -> ScheduleStore:
+    """groups: группа -> {день недели: [минуты начала пар]}"""
+    store = ScheduleStore(monday.isoformat(), is_even_week=True)
+    for group_number, days in groups.items():
+        week = list(EMPTY_WEEK)
+        for weekday, starts in days.items():
+            week[weekday] = tuple(Lesson(start, start + 90, f"{group_number} {start}") for start in starts)
+        store.groups[group_number] = tuple(week)
+    return store
+
+
+class FakeUsers:
+
+    def __init__(self, subscribers):
+        self.subscribers = dict(subscribers)
+        self.unsubscribed = []
+
+    async def reminder_subscribers(self):
+        return dict(self.subscribers)
+
+    async def write_reminded(self, user_id, value):
+        if not value:
+            self.unsubscribed.append(user_id)
+
+
+class FakeClient:
+    """current — текущая неделя; weeks — загруженные недели по понедельнику"""
+
+    def __init__(self, *stores):
+        self.weeks = {}
+        self.current = None
+        for store in stores:
+            self.put(store)
+        self.current = stores[0]
+
+    def put(self, store: ScheduleStore):
+        self.weeks[store.week_key] = store
+
+    async def get_schedule_store(self, groups):
+        return self.current
+
+    def cached_week(self, day: date):
+        return self.weeks.get((day - timedelta(days=day.weekday())).isoformat())
+
+    def format_single_lesson(self, lesson: Lesson) -> str:
+        return lesson.name
+
+
+class FakeSender:
+    """errors — кому вместо отправки бросить исключение"""
+
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = dict(errors or {})
+
+    async def send(self, user_id, text, priority=None, **kwargs):
+        error = self.errors.get(user_id)
+        if error is not None:
+            raise error
+        self.sent.append((user_id, text))
+
+
+class ReminderSchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.now = at(MONDAY, 8)
+        patcher = mock.patch("reminders.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sender = FakeSender()
+
+    def scheduler(self, users, client) -> ReminderScheduler:
+        return ReminderScheduler(users, client, self.sender, minutes_before=15, late_grace=300)
+
+    def due(self, scheduler, now: float):
+        return {group: sorted(events) for group, events in scheduler._pop_due(now).items()}
+
+    async def test_sync_builds_events_once_per_start(self):
+        # две подгруппы в 9:00 — одно событие
+        store = make_store(MONDAY, {"4353": {0: [540, 540, 640], 1: [540]}})
+        scheduler = self.scheduler(FakeUsers({1: "4353"}), FakeClient(store))
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 3)
+        # ничего не поменялось — повторная синхронизация кучу не трогает
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 3)
+        self.assertEqual(self.due(scheduler, at(MONDAY, 8, 45)), {"4353": [(store.week_key, 0, 540)]})
+
+    async def test_sync_compacts_heap_after_group_leaves(self):
+        store = make_store(MONDAY, {"4353": {0: [540, 640], 1: [540]}, "4354": {2: [540]}})
+        users = FakeUsers({1: "4353", 2: "4354"})
+        scheduler = self.scheduler(users, FakeClient(store))
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 4)
+
+        # у группы 4353 не осталось подписчиков: больше половины кучи устарело
+        del users.subscribers[1]
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertEqual(scheduler._stale, 0)
+        self.assertEqual(self.due(scheduler, at(MONDAY + timedelta(days=2), 8, 45)),
+                         {"4354": [(store.week_key, 2, 540)]})
+
+    async def test_changed_schedule_invalidates_old_events(self):
+        client = FakeClient(make_store(MONDAY, {"4353": {0: [540, 640]}}))
+        scheduler = self.scheduler(FakeUsers({1: "4353"}), client)
+        await scheduler.sync()
+
+        # вторую пару перенесли с 10:40 на 11:00
+        client.current = make_store(MONDAY, {"4353": {0: [540, 660]}})
+        client.put(client.current)
+        await scheduler.sync()
+        # старые события остаются в куче до извлечения
+        self.assertEqual(scheduler.pending(), 4)
+        week_key = client.current.week_key
+        self.assertEqual(self.due(scheduler, at(MONDAY, 8, 45)), {"4353": [(week_key, 0, 540)]})
+        # событие для старого времени 10:40 устарело и пропускается
+        self.assertEqual(self.due(scheduler, at(MONDAY, 10, 30)), {})
+        self.assertEqual(self.due(scheduler, at(MONDAY, 10, 45)), {"4353": [(week_key, 0, 660)]})
+        self.assertEqual(scheduler.pending(), 0)
+
+    async def test_late_events_within_grace(self):
+        store = make_store(MONDAY, {"4353": {0: [540, 640, 760]}})
+        # запуск в 8:47: напоминание о паре в 9:00 опоздало на 2 минуты — еще отправляется
+        self.now = at(MONDAY, 8, 47)
+        scheduler = self.scheduler(FakeUsers({1: "4353"}), FakeClient(store))
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 3)
+        self.assertEqual(self.due(scheduler, self.now), {"4353": [(store.week_key, 0, 540)]})
+
+        # о паре в 10:40 вспомнили в 10:40 — опоздание больше late_grace, напоминание пропадает
+        self.assertEqual(self.due(scheduler, at(MONDAY, 10, 40)), {})
+        self.assertEqual(scheduler.pending(), 1)
+
+    async def test_events_older_than_grace_are_not_scheduled(self):
+        store = make_store(MONDAY, {"4353": {0: [540, 640]}})
+        self.now = at(MONDAY, 9)
+        scheduler = self.scheduler(FakeUsers({1: "4353"}), FakeClient(store))
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 1)
+
+    async def test_week_rollover(self):
+        current = make_store(MONDAY, {"4353": {0: [540]}})
+        following = make_store(NEXT_MONDAY, {"4353": {0: [540]}})
+        client = FakeClient(current, following)
+        self.now = at(MONDAY + timedelta(days=6), 22)
+        scheduler = self.scheduler(FakeUsers({1: "4353"}), client)
+        # в воскресенье следующая неделя уже загружена: ее события в куче
+        await scheduler.sync()
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertEqual(set(scheduler._scheduled), {
+            (current.week_key, "4353"), (following.week_key, "4353")
+        })
+
+        # наступила новая неделя: прошлая из расписанных уходит, события не дублируются
+        self.now = at(NEXT_MONDAY, 7)
+        client.current = following
+        await scheduler.sync()
+        self.assertEqual(set(scheduler._scheduled), {(following.week_key, "4353")})
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertEqual(self.due(scheduler, at(NEXT_MONDAY, 8, 45)), {"4353": [(following.week_key, 0, 540)]})
+
+    async def test_fire_sends_to_group_and_unsubscribes_blocked(self):
+        store = make_store(MONDAY, {"4353": {0: [540]}, "4354": {0: [540]}})
+        users = FakeUsers({1: "4353", 2: "4353", 3: "4354"})
+        self.sender.errors[2] = Forbidden("bot was blocked by the user")
+        scheduler = self.scheduler(users, FakeClient(store))
+        await scheduler.sync()
+        await scheduler._fire(scheduler._pop_due(at(MONDAY, 8, 45)))
+        self.assertEqual(sorted(user_id for user_id, _ in self.sender.sent), [1, 3])
+        self.assertIn("4353 540", dict(self.sender.sent)[1])
+        self.assertEqual(users.unsubscribed, [2])
+        self.assertEqual(scheduler.sent, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
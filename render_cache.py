@@ -0,0 +1,55 @@
+"""
+Кэш готовых сообщений с расписанием: одна отрисовка на группу и день
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class RenderCache:
+    """Ограниченный LRU-кэш отрисованного текста со счетчиками попаданий"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, key: Hashable, text: str):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        text = self.get(key)
+        if text is None:
+            text = render()
+            self.put(key, text)
+        return text
+
+    def items(self) -> List[Tuple[Hashable, str]]:
+        """Снимок записей (ключ, текст) без учета попаданий и без изменения порядка"""
+        return list(self._entries.items())
+
+    def clear(self):
+        """Сбрасывает все записи (например, после обновления расписания)"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,220 @@
+"""
+Компактное хранилище расписания: разбирается один раз на загрузку,
+дальше обработчики только читают готовые записи
+"""
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# пары без времени начала уходят в конец дня
+NO_TIME = 24 * 60
+
+# каждое новое хранилище получает свою версию, по ней сбрасываются кэши отрисовки
+_versions = itertools.count(1)
+
+
+def parse_minutes(time_str: str) -> Optional[int]:
+    """'09:50' -> 590, None если время не указано или не разбирается"""
+    if not time_str:
+        return None
+    try:
+        hours, minutes = time_str.split(':')
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def pick_week_lessons(lessons: List[Dict], is_even_week: bool) -> List[Dict]:
+    """Удаляет дублирующиеся пары из списка занятий, учитывая четность недели"""
+    if not lessons:
+        return []
+
+    time_groups = {}
+    for lesson in lessons:
+        time_start = lesson.get('start_time', '')
+        time_end = lesson.get('end_time', '')
+        time_key = f"{time_start}|{time_end}"
+        if time_key not in time_groups:
+            time_groups[time_key] = []
+        time_groups[time_key].append(lesson)
+
+    unique_lessons = []
+    for time_key, group in time_groups.items():
+        if len(group) == 1:
+            unique_lessons.append(group[0])
+        elif len(group) == 2:
+
+            selected_lesson = group[0] if is_even_week else group[1]
+            unique_lessons.append(selected_lesson)
+        else:
+
+            logger.warning(f"Больше двух пар в одно время {time_key}: {len(group)} пар")
+            selected_lesson = group[0] if is_even_week else group[1] if len(group) > 1 else group[0]
+            unique_lessons.append(selected_lesson)
+
+    return unique_lessons
+
+
+def content_hasher():
+    """Хэшер для потоковых данных, совместимый с content_hash"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_hash(data: bytes) -> bytes:
+    """Короткий хэш содержимого для обнаружения изменений"""
+    hasher = content_hasher()
+    hasher.update(data)
+    return hasher.digest()
+
+
+def _intern(value) -> str:
+    # преподаватели, аудитории и предметы повторяются тысячи раз
+    return sys.intern(value) if isinstance(value, str) and value else ''
+
+
+class Lesson:
+    """Одна пара; время хранится в минутах от начала суток"""
+    __slots__ = ('start', 'end', 'name', 'subject_type', 'teacher', 'room')
+
+    def __init__(self, start: Optional[int], end: Optional[int], name: str,
+                 subject_type: str = '', teacher: str = '', room: str = ''):
+        self.start = start
+        self.end = end
+        self.name = name
+        self.subject_type = subject_type
+        self.teacher = teacher
+        self.room = room
+
+    @classmethod
+    def from_api(cls, lesson: Dict) -> "Lesson":
+        return cls(
+            parse_minutes(lesson.get('start_time', '')),
+            parse_minutes(lesson.get('end_time', '')),
+            _intern(lesson.get('name', 'Неизвестный предмет')) or 'Неизвестный предмет',
+            _intern(lesson.get('subjectType', '')),
+            _intern(lesson.get('teacher', '')),
+            _intern(lesson.get('room', ''))
+        )
+
+    @property
+    def sort_key(self) -> int:
+        return self.start if self.start is not None else NO_TIME
+
+
+# расписание группы: 7 дней (0=Пн), в каждом отсортированный кортеж пар
+GroupWeek = Tuple[Tuple[Lesson, ...], ...]
+
+EMPTY_WEEK: GroupWeek = ((),) * 7
+
+
+def compact_group(group_schedule: Dict, is_even_week: bool) -> GroupWeek:
+    """Превращает расписание группы из ответа API в компактный вид"""
+    days_data = group_schedule.get('days', {}) if group_schedule else {}
+    week = []
+    for i in range(7):
+        day_data = days_data.get(str(i))
+        if not day_data:
+            week.append(())
+            continue
+        lessons = pick_week_lessons(day_data.get('lessons', []), is_even_week)
+        records = [Lesson.from_api(lesson) for lesson in lessons]
+        records.sort(key=lambda lesson: lesson.sort_key)
+        week.append(tuple(records))
+    return tuple(week)
+
+
+class ScheduleStore:
+    """Расписание всех групп на одну неделю с уже выбранной четностью"""
+
+    def __init__(self, week_key: str, is_even_week: bool):
+        self.week_key = week_key
+        self.is_even_week = is_even_week
+        self.version = next(_versions)
+        # когда данные получены с API (для снимка на диске и устаревания)
+        self.fetched_at = time.time()
+        self.groups: Dict[str, GroupWeek] = {}
+        # хэш исходных данных группы: неизменившиеся группы не разбираются повторно
+        self.group_hashes: Dict[str, bytes] = {}
+        # группы, которые запрашивали выборочно, но API их не вернул
+        self.absent = set()
+        # только часть групп (выборочная загрузка): полную выгрузку не заменяет
+        self.partial = False
+        # группа -> по дням отсортированные минуты начала пар (для бинарного поиска)
+        self._starts: Dict[str, Tuple[Tuple[int, ...], ...]] = {}
+
+    @classmethod
+    def from_payload(cls, week_key: str, is_even_week: bool, payload: Dict,
+                     previous: "ScheduleStore" = None) -> "ScheduleStore":
+        """Разбирает ответ /schedule целиком, переиспользуя группы из previous"""
+        store = cls(week_key, is_even_week)
+        for group_number, group_schedule in payload.items():
+            raw = json.dumps(group_schedule, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            store.add_group(group_number, content_hash(raw), lambda: group_schedule, previous)
+        return store
+
+    def add_group(self, group_number: str, digest: bytes, load_group, previous: "ScheduleStore" = None):
+        """Добавляет группу; load_group вызывается, только если данные изменились"""
+        if (previous is not None and previous.is_even_week == self.is_even_week
+                and previous.group_hashes.get(group_number) == digest):
+            group_week = previous.get(group_number)
+            if group_week is not None:
+                self.groups[group_number] = group_week
+                self.group_hashes[group_number] = digest
+                return
+        self.groups[group_number] = compact_group(load_group(), self.is_even_week)
+        self.group_hashes[group_number] = digest
+
+    def get(self, group_number: str) -> Optional[GroupWeek]:
+        return self.groups.get(group_number)
+
+    def group_numbers(self) -> List[str]:
+        return list(self.groups)
+
+    def starts(self, group_number: str) -> Optional[Tuple[Tuple[int, ...], ...]]:
+        """Минуты начала пар группы по дням; строятся один раз на версию расписания"""
+        starts = self._starts.get(group_number)
+        if starts is None:
+            group_week = self.get(group_number)
+            if group_week is None:
+                return None
+            # пары без времени стоят в конце дня, так что индексы совпадают с group_week
+            starts = tuple(
+                tuple(lesson.start for lesson in lessons if lesson.start is not None)
+                for lessons in group_week
+            )
+            self._starts[group_number] = starts
+        return starts
+
+    def next_lesson(self, group_number: str, weekday: int, minute: int,
+                    last_weekday: int = 6) -> Optional[Tuple[int, Lesson]]:
+        """
+        Ближайшая пара, начинающаяся строго после minute дня weekday:
+        (через сколько дней, пара). Ищет до last_weekday включительно
+        """
+        starts = self.starts(group_number)
+        if starts is None:
+            return None
+        group_week = self.get(group_number)
+        for day in range(weekday, last_weekday + 1):
+            day_starts = starts[day]
+            index = bisect.bisect_right(day_starts, minute) if day == weekday else 0
+            if index < len(day_starts):
+                return day - weekday, group_week[day][index]
+        return None
+
+    def __contains__(self, group_number: str) -> bool:
+        return group_number in self.groups
+
+    def __len__(self) -> int:
+        return len(self.groups)
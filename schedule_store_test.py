@@ -0,0 +1,56 @@
+import unittest
+
+from schedule_store import ScheduleStore, compact_group
+
+
+def lesson(start: str, name: str) -> dict:
+    return {"start_time": start, "end_time": "", "name": name}
+
+
+def make_store(days) -> ScheduleStore:
+    """days: день недели -> пары группы 4353 в формате API"""
+    store = ScheduleStore("2024-03-04", is_even_week=True)
+    payload = {"days": {str(day): {"lessons": lessons} for day, lessons in days.items()}}
+    store.groups["4353"] = compact_group(payload, store.is_even_week)
+    return store
+
+
+class NextLessonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = make_store({
+            # пара без времени стоит в конце дня
+            0: [lesson("", "Без времени"), lesson("10:40", "Вторая"), lesson("09:00", "Первая")],
+            3: [lesson("12:40", "Четверг")],
+            5: [lesson("09:00", "Суббота")],
+        })
+
+    def next_name(self, weekday: int, minute: int, last_weekday: int = 6):
+        found = self.store.next_lesson("4353", weekday, minute, last_weekday)
+        return None if found is None else (found[0], found[1].name)
+
+    def test_starts_skip_lessons_without_time(self):
+        self.assertEqual(self.store.starts("4353"), ((540, 640), (), (), (760,), (), (540,), ()))
+        self.assertIsNone(self.store.starts("9999"))
+
+    def test_lesson_starting_at_minute_is_skipped(self):
+        self.assertEqual(self.next_name(0, 539), (0, "Первая"))
+        self.assertEqual(self.next_name(0, 540), (0, "Вторая"))
+
+    def test_lesson_without_time_does_not_shift_indices(self):
+        # после последней пары с временем — следующий день с парами, а не пара без времени
+        self.assertEqual(self.next_name(0, 640), (3, "Четверг"))
+
+    def test_rollover_up_to_last_weekday(self):
+        self.assertEqual(self.next_name(1, 0), (2, "Четверг"))
+        self.assertEqual(self.next_name(3, 760), (2, "Суббота"))
+        self.assertEqual(self.next_name(3, 760, last_weekday=5), (2, "Суббота"))
+        self.assertIsNone(self.next_name(3, 760, last_weekday=4))
+        self.assertIsNone(self.next_name(5, 540))
+
+    def test_unknown_group(self):
+        self.assertIsNone(self.store.next_lesson("9999", 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+"""
+Снимок групп и расписания на диске (SQLite), чтобы после перезапуска
+бот сразу отвечал из него, а не ждал полной загрузки с API
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from schedule_store import GroupWeek, Lesson, ScheduleStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups_snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    fetched_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedule_weeks (
+    week_key TEXT PRIMARY KEY,
+    is_even_week INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    partial INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS snapshot_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedule_groups (
+    week_key TEXT NOT NULL,
+    group_number TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (week_key, group_number)
+);
+"""
+
+# сколько байт файла SQLite отображать в память при чтении
+MMAP_SIZE = 256 * 1024 * 1024
+
+# сколько последних недель расписания держать в снимке
+# (прошлые недели нужны, чтобы отвечать ими, пока API недоступен)
+KEEP_WEEKS = 4
+
+
+def encode_group_week(group_week: GroupWeek) -> bytes:
+    """Компактная запись недели группы: по дню список [start, end, name, type, teacher, room]"""
+    days = [
+        [[l.start, l.end, l.name, l.subject_type, l.teacher, l.room] for l in lessons]
+        for lessons in group_week
+    ]
+    return json.dumps(days, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_group_week(data: bytes) -> GroupWeek:
+    return tuple(
+        tuple(Lesson(*fields) for fields in lessons)
+        for lessons in json.loads(data)
+    )
+
+
+class LazyScheduleStore(ScheduleStore):
+    """Хранилище недели, которое читает группы из снимка только при обращении"""
+
+    def __init__(self, snapshot: "ScheduleSnapshot", week_key: str, is_even_week: bool,
+                 fetched_at: float, group_numbers: set, partial: bool = False):
+        super().__init__(week_key, is_even_week)
+        self.fetched_at = fetched_at
+        self.partial = partial
+        self._snapshot = snapshot
+        self._group_numbers = group_numbers
+
+    def get(self, group_number: str) -> Optional[GroupWeek]:
+        group_week = self.groups.get(group_number)
+        if group_week is None and group_number in self._group_numbers:
+            group_week = self._snapshot.load_group_week(self.week_key, group_number)
+            if group_week is not None:
+                self.groups[group_number] = group_week
+        return group_week
+
+    def group_numbers(self) -> List[str]:
+        return list(self._group_numbers)
+
+    def __contains__(self, group_number: str) -> bool:
+        return group_number in self._group_numbers
+
+    def __len__(self) -> int:
+        return len(self._group_numbers)
+
+
+class ScheduleSnapshot:
+    """Файл снимка: пишется после каждой успешной загрузки, читается при старте"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reader = None
+        with self._writer() as conn:
+            conn.executescript(SCHEMA)
+            # снимки, записанные до появления выборочной загрузки
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(schedule_weeks)")}
+            if "partial" not in columns:
+                conn.execute("ALTER TABLE schedule_weeks ADD COLUMN partial INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _writer(self):
+        """Отдельное соединение на запись: можно вызывать из рабочего потока"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+            self._reader.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return self._reader
+
+    def data_version(self) -> int:
+        """Меняется, когда снимок переписал другой процесс (PRAGMA data_version)"""
+        with self._lock:
+            return self._read_conn().execute("PRAGMA data_version").fetchone()[0]
+
+    def revision(self) -> int:
+        """
+        Номер версии содержимого: растет при записи групп или расписания,
+        но не при touch_schedule (в отличие от data_version)
+        """
+        with self._lock:
+            row = self._read_conn().execute("SELECT revision FROM snapshot_meta WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump_revision(conn: sqlite3.Connection):
+        conn.execute(
+            "INSERT INTO snapshot_meta (id, revision) VALUES (1, 1) "
+            "ON CONFLICT(id) DO UPDATE SET revision = revision + 1"
+        )
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def save_groups(self, groups: List[Dict], fetched_at: float = None):
+        data = json.dumps(groups, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with self._writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO groups_snapshot (id, fetched_at, data) VALUES (1, ?, ?)",
+                (fetched_at or time.time(), data)
+            )
+            self._bump_revision(conn)
+        logger.info(f"Снимок групп сохранен в {self.path}")
+
+    def load_groups(self, newer_than: float = None) -> Optional[Tuple[List[Dict], float]]:
+        """Список групп и время его загрузки с API; None — нет или не новее newer_than"""
+        with self._lock:
+            row = self._read_conn().execute(
+                "SELECT data, fetched_at FROM groups_snapshot WHERE id = 1 AND fetched_at > ?",
+                (newer_than or 0,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save_schedule(self, store: ScheduleStore):
+        rows = [
+            (store.week_key, group_number, encode_group_week(group_week))
+            for group_number, group_week in store.groups.items()
+        ]
+        with self._writer() as conn:
+            conn.execute("DELETE FROM schedule_groups WHERE week_key = ?", (store.week_key,))
+            conn.executemany(
+                "INSERT INTO schedule_groups (week_key, group_number, data) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO schedule_weeks (week_key, is_even_week, fetched_at, partial) "
+                "VALUES (?, ?, ?, ?)",
+                (store.week_key, int(store.is_even_week), store.fetched_at, int(store.partial))
+            )
+            old_weeks = [
+                row[0] for row in conn.execute(
+                    "SELECT week_key FROM schedule_weeks ORDER BY week_key DESC LIMIT -1 OFFSET ?",
+                    (KEEP_WEEKS,)
+                )
+            ]
+            for week_key in old_weeks:
+                conn.execute("DELETE FROM schedule_groups WHERE week_key = ?", (week_key,))
+                conn.execute("DELETE FROM schedule_weeks WHERE week_key = ?", (week_key,))
+            self._bump_revision(conn)
+        logger.info(f"Снимок расписания {store.week_key} сохранен: {len(rows)} групп")
+
+    def touch_schedule(self, week_key: str, fetched_at: float):
+        """Расписание не изменилось (304): только продлеваем время загрузки"""
+        with self._writer() as conn:
+            conn.execute("UPDATE schedule_weeks SET fetched_at = ? WHERE week_key = ?", (fetched_at, week_key))
+
+    def week_fetched_at(self, week_key: str) -> Optional[float]:
+        with self._lock:
+            row = self._read_conn().execute(
+                "SELECT fetched_at FROM schedule_weeks WHERE week_key = ?", (week_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def latest_week_key(self, is_even_week: bool, exclude: str = None) -> Optional[str]:
+        """Самая поздняя неделя в снимке; недели с нужной четностью — в первую очередь"""
+        with self._lock:
+            row = self._read_conn().execute(
+                "SELECT week_key FROM schedule_weeks WHERE week_key != ? "
+                "ORDER BY is_even_week = ? DESC, week_key DESC LIMIT 1",
+                (exclude or "", int(is_even_week))
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_schedule(self, week_key: str) -> Optional[LazyScheduleStore]:
+        """Неделя из снимка; сами пары читаются лениво по группам"""
+        with self._lock:
+            conn = self._read_conn()
+            week = conn.execute(
+                "SELECT is_even_week, fetched_at, partial FROM schedule_weeks WHERE week_key = ?",
+                (week_key,)
+            ).fetchone()
+            if week is None:
+                return None
+            numbers = {
+                row[0] for row in conn.execute(
+                    "SELECT group_number FROM schedule_groups WHERE week_key = ?", (week_key,)
+                )
+            }
+        return LazyScheduleStore(self, week_key, bool(week[0]), week[1], numbers, bool(week[2]))
+
+    def load_group_week(self, week_key: str, group_number: str) -> Optional[GroupWeek]:
+        with self._lock:
+            row = self._read_conn().execute(
+                "SELECT data FROM schedule_groups WHERE week_key = ? AND group_number = ?",
+                (week_key, group_number)
+            ).fetchone()
+        return decode_group_week(row[0]) if row else None
@@ -0,0 +1,158 @@
+"""
+Генератор синтетических ответов API ЛЭТИ (/groups и /schedule) для
+бенчмарков и нагрузочных тестов. Структура повторяет настоящий API:
+факультеты -> кафедры -> группы; расписание по номеру группы, дни "0".."6",
+пары четной и нечетной недели в одно время, точные дубликаты пар.
+Пример:
+    python synthetic_data.py --groups 3000 --out synthetic
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+# звонки ЛЭТИ
+LESSON_TIMES = [
+    ("08:00", "09:30"), ("09:50", "11:20"), ("11:40", "13:10"), ("13:40", "15:10"),
+    ("15:30", "17:00"), ("17:20", "18:50"), ("19:05", "20:35"),
+]
+
+SUBJECTS = [
+    "Математический анализ", "Линейная алгебра", "Физика", "Программирование",
+    "Алгоритмы и структуры данных", "Базы данных", "Операционные системы",
+    "Электротехника", "Теория вероятностей", "Иностранный язык", "Философия",
+    "Физическая культура", "Дискретная математика", "Схемотехника",
+    "Компьютерные сети", "Цифровая обработка сигналов", "Экономика", "История России",
+]
+SUBJECT_TYPES = ["Лек", "Пр", "Лаб", "Сем"]
+FORMS = ["standard", "offline", "online", "distant"]
+SURNAMES = [
+    "Иванов", "Петрова", "Сидоров", "Кузнецова", "Смирнов", "Попова", "Васильев",
+    "Соколова", "Михайлов", "Новикова", "Федоров", "Морозова", "Волков", "Лебедева",
+]
+FACULTIES = ["ФКТИ", "ФЭЛ", "ФРТ", "ФЭА", "ФИБС", "ГФ", "ФЭМ", "ИНПРОТЕХ"]
+
+
+def _teacher(rnd: random.Random) -> str:
+    return f"{rnd.choice(SURNAMES)} {rnd.choice('АБВГДЕИКЛМНОПС')}. {rnd.choice('АБВГДЕИКЛМНОПС')}."
+
+
+def _room(rnd: random.Random) -> str:
+    return f"{rnd.randint(1, 5)}{rnd.randint(1, 5)}{rnd.randint(1, 40):02d}"
+
+
+def generate_groups(group_count: int, seed: int = 0) -> List[Dict]:
+    """Ответ /groups: group_count групп с уникальными четырехзначными номерами"""
+    rnd = random.Random(seed)
+    numbers = rnd.sample(range(1000, 10000), group_count)
+    faculties = []
+    group_id = 1
+    departments_per_faculty = 6
+    chunk = max(1, -(-group_count // (len(FACULTIES) * departments_per_faculty)))
+
+    it = iter(numbers)
+    for f_index, title in enumerate(FACULTIES):
+        departments = []
+        for d_index in range(departments_per_faculty):
+            groups = []
+            for number in (next(it, None) for _ in range(chunk)):
+                if number is None:
+                    break
+                groups.append({
+                    'id': group_id,
+                    'number': str(number),
+                    'course': int(str(number)[1]) % 6 + 1,
+                    'studyingType': rnd.choice(["очная", "очная", "очно-заочная"]),
+                    'educationLevel': rnd.choice(["бакалавриат", "бакалавриат", "магистратура"]),
+                })
+                group_id += 1
+            departments.append({
+                'id': f_index * 100 + d_index,
+                'title': f"Кафедра {d_index + 1} {title}",
+                'groups': groups,
+            })
+        faculties.append({'id': f_index, 'title': title, 'departments': departments})
+    return faculties
+
+
+def _lesson(rnd: random.Random, slot: int, week: str) -> Dict:
+    start, end = LESSON_TIMES[slot]
+    return {
+        'start_time': start,
+        'end_time': end,
+        'name': rnd.choice(SUBJECTS),
+        'subjectType': rnd.choice(SUBJECT_TYPES),
+        'teacher': _teacher(rnd),
+        'second_teacher': _teacher(rnd) if rnd.random() < 0.05 else '',
+        'room': _room(rnd) if rnd.random() < 0.95 else '',
+        'week': week,
+        'form': rnd.choice(FORMS),
+        'subgroup': rnd.choice(['', '', '', '1', '2']),
+    }
+
+
+def generate_group_schedule(rnd: random.Random, parity_share: float = 0.4,
+                            duplicate_share: float = 0.1) -> Dict:
+    """
+    Расписание одной группы на неделю: 4-6 учебных дней по 2-5 пар.
+    parity_share — доля слотов с разными парами по четной и нечетной неделе,
+    duplicate_share — доля пар, которые API отдает дважды
+    """
+    days = {}
+    study_days = sorted(rnd.sample(range(6), rnd.randint(4, 6)))
+    for day in study_days:
+        first = rnd.randint(0, 2)
+        lessons = []
+        for slot in range(first, min(len(LESSON_TIMES), first + rnd.randint(2, 5))):
+            if rnd.random() < parity_share:
+                lessons.append(_lesson(rnd, slot, '1'))
+                lessons.append(_lesson(rnd, slot, '2'))
+            else:
+                lesson = _lesson(rnd, slot, '0')
+                lessons.append(lesson)
+                if rnd.random() < duplicate_share:
+                    lessons.append(dict(lesson))
+        days[str(day)] = {'lessons': lessons}
+    return {'days': days}
+
+
+def generate_schedule(group_numbers: List[str], seed: int = 0) -> Dict[str, Dict]:
+    """Ответ /schedule для указанных групп"""
+    rnd = random.Random(seed)
+    return {number: generate_group_schedule(rnd) for number in group_numbers}
+
+
+def group_numbers(groups: List[Dict]) -> List[str]:
+    return [
+        group['number']
+        for faculty in groups
+        for department in faculty['departments']
+        for group in department['groups']
+    ]
+
+
+def generate(group_count: int = 3000, seed: int = 0) -> Tuple[List[Dict], Dict[str, Dict]]:
+    """Согласованные ответы /groups и /schedule"""
+    groups = generate_groups(group_count, seed)
+    return groups, generate_schedule(group_numbers(groups), seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические ответы API ЛЭТИ")
+    parser.add_argument("--groups", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic", help="каталог для groups.json и schedule.json")
+    args = parser.parse_args()
+
+    groups, schedule = generate(args.groups, args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for name, data in (("groups.json", groups), ("schedule.json", schedule)):
+        path = os.path.join(args.out, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        print(f"{path}: {os.path.getsize(path) / 1024:.0f} КБ")
+
+
+if __name__ == "__main__":
+    main()
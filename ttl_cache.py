@@ -0,0 +1,62 @@
+"""
+Ограниченный кэш с мягким и жестким сроком жизни записей
+(stale-while-revalidate: устаревшую запись отдаем сразу, а обновляем в фоне)
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    soft_ttl — после него запись еще отдается, но ее пора обновить;
+    hard_ttl — после него запись удаляется и больше не отдается.
+    При переполнении вытесняются самые давние записи.
+    """
+
+    def __init__(self, max_entries: int, soft_ttl: float, hard_ttl: float):
+        self.max_entries = max_entries
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self._entries = OrderedDict()
+
+    def lookup(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        """(значение, свежее ли оно); (None, False) если записи нет или она просрочена"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age >= self.hard_ttl:
+            del self._entries[key]
+            return None, False
+        return value, age < self.soft_ttl
+
+    def put(self, key: Hashable, value: Any, stored_at: float = None):
+        self._entries[key] = (value, stored_at if stored_at is not None else time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def age(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return time.time() - entry[1] if entry else None
+
+    def values(self):
+        return [value for value, _ in self._entries.values()]
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Снимок записей (ключ, значение): срок не проверяется, порядок не меняется"""
+        return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.lookup(key)[0] is not None
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value, _ = self.lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
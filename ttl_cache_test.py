@@ -0,0 +1,65 @@
+import time
+import unittest
+
+from ttl_cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TTLCache(max_entries=3, soft_ttl=60, hard_ttl=600)
+
+    def test_fresh_entry(self):
+        self.cache.put("a", 1)
+        self.assertEqual(self.cache.lookup("a"), (1, True))
+        self.assertIn("a", self.cache)
+
+    def test_stale_entry_is_still_served(self):
+        # после soft_ttl запись отдается, но помечена как устаревшая (stale-while-revalidate)
+        self.cache.put("a", 1, stored_at=time.time() - 61)
+        self.assertEqual(self.cache.lookup("a"), (1, False))
+        self.assertEqual(self.cache["a"], 1)
+
+    def test_expired_entry_is_dropped(self):
+        self.cache.put("a", 1, stored_at=time.time() - 601)
+        self.assertEqual(self.cache.lookup("a"), (None, False))
+        self.assertNotIn("a", self.cache)
+        self.assertEqual(len(self.cache), 0)
+        with self.assertRaises(KeyError):
+            self.cache["a"]
+
+    def test_revalidated_entry_is_fresh_again(self):
+        self.cache.put("a", 1, stored_at=time.time() - 61)
+        self.cache.put("a", 2)
+        self.assertEqual(self.cache.lookup("a"), (2, True))
+
+    def test_oldest_entry_is_evicted(self):
+        for key in "abcd":
+            self.cache.put(key, key)
+        self.assertEqual(len(self.cache), 3)
+        self.assertNotIn("a", self.cache)
+        self.assertEqual(self.cache.values(), ["b", "c", "d"])
+
+    def test_put_refreshes_eviction_order(self):
+        for key in "abc":
+            self.cache.put(key, key)
+        self.cache.put("a", "a")
+        self.cache.put("d", "d")
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+
+    def test_age(self):
+        self.assertIsNone(self.cache.age("a"))
+        self.cache.put("a", 1, stored_at=time.time() - 30)
+        self.assertAlmostEqual(self.cache.age("a"), 30, delta=1)
+
+    def test_items_do_not_expire_or_reorder(self):
+        self.cache.put("a", 1, stored_at=time.time() - 601)
+        self.cache.put("b", 2)
+        self.assertEqual(self.cache.items(), [("a", 1), ("b", 2)])
+        # снимок для отчета ничего не удаляет
+        self.assertEqual(len(self.cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
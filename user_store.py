@@ -0,0 +1,292 @@
+"""
+Хранилище "пользователь -> группа", состояния ожидания ввода группы
+и подписок на ежедневную рассылку и напоминания о парах.
+Чтение идет из памяти, запись на диск — пачками в фоне
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import sqlite3
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UserStore:
+    """Хранилище в памяти; интерфейс как у словаря user_id -> номер группы"""
+
+    def __init__(self):
+        self._groups: Dict[int, str] = {}
+        self._awaiting = set()
+        self._subscribed = set()
+        self._reminded = set()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def _changed(self, user_id: int):
+        """Вызывается после каждого изменения записи пользователя"""
+        pass
+
+    def get(self, user_id: int, default: Optional[str] = None) -> Optional[str]:
+        return self._groups.get(user_id, default)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._groups
+
+    def __getitem__(self, user_id: int) -> str:
+        return self._groups[user_id]
+
+    def __setitem__(self, user_id: int, group_number: str):
+        if self._groups.get(user_id) != group_number:
+            self._groups[user_id] = group_number
+            self._changed(user_id)
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def items(self):
+        return self._groups.items()
+
+    def is_awaiting(self, user_id: int) -> bool:
+        """Ждем ли от пользователя номер группы"""
+        return user_id in self._awaiting
+
+    def set_awaiting(self, user_id: int, awaiting: bool):
+        if awaiting == (user_id in self._awaiting):
+            return
+        if awaiting:
+            self._awaiting.add(user_id)
+        else:
+            self._awaiting.discard(user_id)
+        self._changed(user_id)
+
+    def is_subscribed(self, user_id: int) -> bool:
+        """Подписан ли пользователь на ежедневную рассылку"""
+        return user_id in self._subscribed
+
+    def set_subscribed(self, user_id: int, subscribed: bool):
+        if subscribed == (user_id in self._subscribed):
+            return
+        if subscribed:
+            self._subscribed.add(user_id)
+        else:
+            self._subscribed.discard(user_id)
+        self._changed(user_id)
+
+    def is_reminded(self, user_id: int) -> bool:
+        """Включены ли напоминания перед парами"""
+        return user_id in self._reminded
+
+    def set_reminded(self, user_id: int, reminded: bool):
+        if reminded == (user_id in self._reminded):
+            return
+        if reminded:
+            self._reminded.add(user_id)
+        else:
+            self._reminded.discard(user_id)
+        self._changed(user_id)
+
+    async def write_subscribed(self, user_id: int, subscribed: bool):
+        """
+        Подписка из фоновой задачи (бот заблокирован): пишется сразу и только
+        это поле, без записи всей строки пользователя из памяти этого процесса
+        """
+        (self._subscribed.add if subscribed else self._subscribed.discard)(user_id)
+
+    async def write_reminded(self, user_id: int, reminded: bool):
+        """Напоминания из фоновой задачи; см. write_subscribed"""
+        (self._reminded.add if reminded else self._reminded.discard)(user_id)
+
+    async def subscribers(self) -> Dict[int, str]:
+        """Подписчики рассылки с выбранной группой: user_id -> номер группы"""
+        return {
+            user_id: self._groups[user_id]
+            for user_id in self._subscribed if user_id in self._groups
+        }
+
+    async def reminder_subscribers(self) -> Dict[int, str]:
+        """Пользователи с напоминаниями о парах: user_id -> номер группы"""
+        return {
+            user_id: self._groups[user_id]
+            for user_id in self._reminded if user_id in self._groups
+        }
+
+
+class SQLiteUserStore(UserStore):
+    """
+    SQLite в режиме WAL. При старте все записи читаются в память,
+    изменения копятся и сбрасываются на диск раз в flush_interval секунд
+    или сразу, как только набралось batch_size изменений
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, batch_size: int = 500):
+        super().__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._dirty = set()
+        self._conn = None
+        self._flush_task = None
+        self._wakeup = None
+        self._write_lock = None
+
+    async def start(self):
+        self._conn = await asyncio.to_thread(self._open)
+        rows = await asyncio.to_thread(self._load)
+        for user_id, group_number, awaiting, subscribed, reminded in rows:
+            if group_number:
+                self._groups[user_id] = group_number
+            if awaiting:
+                self._awaiting.add(user_id)
+            if subscribed:
+                self._subscribed.add(user_id)
+            if reminded:
+                self._reminded.add(user_id)
+        logger.info(f"Загружено пользователей: {len(self._groups)} ({self.path})")
+        self._wakeup = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _open(self) -> sqlite3.Connection:
+        # timeout: в режиме нескольких процессов файл пишут все рабочие процессы
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " user_id INTEGER PRIMARY KEY,"
+            " group_number TEXT,"
+            " awaiting_group INTEGER NOT NULL DEFAULT 0,"
+            " subscribed INTEGER NOT NULL DEFAULT 0,"
+            " reminded INTEGER NOT NULL DEFAULT 0)"
+        )
+        # файлы, созданные до появления рассылки и напоминаний
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        for column in ("subscribed", "reminded"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+        return conn
+
+    def _load(self):
+        return self._conn.execute(
+            "SELECT user_id, group_number, awaiting_group, subscribed, reminded FROM users"
+        ).fetchall()
+
+    def _changed(self, user_id: int):
+        self._dirty.add(user_id)
+        if self._wakeup is not None and len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Не удалось сохранить пользователей: {e}")
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        if not self._dirty or self._conn is None:
+            return
+        async with self._write_lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [
+                (user_id, self._groups.get(user_id), int(user_id in self._awaiting),
+                 int(user_id in self._subscribed), int(user_id in self._reminded))
+                for user_id in dirty
+            ]
+            write = asyncio.ensure_future(asyncio.to_thread(self._write, rows))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # отмена не останавливает поток с записью: соединение отпускаем только после него
+                await asyncio.wait([write])
+                raise
+            finally:
+                if not write.done() or write.cancelled() or write.exception() is not None:
+                    # не записалось — вернем в очередь, запишем в следующий раз
+                    self._dirty.update(dirty)
+        logger.debug(f"Сохранено изменений пользователей: {len(rows)}")
+
+    def _write(self, rows):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO users (user_id, group_number, awaiting_group, subscribed, reminded) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "group_number = excluded.group_number, awaiting_group = excluded.awaiting_group, "
+                "subscribed = excluded.subscribed, reminded = excluded.reminded",
+                rows
+            )
+
+    async def write_subscribed(self, user_id: int, subscribed: bool):
+        await super().write_subscribed(user_id, subscribed)
+        await self._write_flag("subscribed", user_id, subscribed)
+
+    async def write_reminded(self, user_id: int, reminded: bool):
+        await super().write_reminded(user_id, reminded)
+        await self._write_flag("reminded", user_id, reminded)
+
+    async def _write_flag(self, column: str, user_id: int, value: bool):
+        """
+        UPDATE одного поля: в режиме нескольких процессов строкой владеет тот
+        рабочий процесс, который обслуживает пользователя, и его данные в памяти
+        этого процесса могут быть устаревшими (или их нет вовсе)
+        """
+        async with self._write_lock:
+            await asyncio.to_thread(self._update_flag, column, user_id, int(value))
+
+    def _update_flag(self, column: str, user_id: int, value: int):
+        with self._conn:
+            self._conn.execute(f"UPDATE users SET {column} = ? WHERE user_id = ?", (value, user_id))
+
+    async def subscribers(self) -> Dict[int, str]:
+        """
+        Читает подписчиков с диска: в режиме нескольких процессов
+        подписки меняют и другие рабочие процессы
+        """
+        return await self._load_flagged("subscribed")
+
+    async def reminder_subscribers(self) -> Dict[int, str]:
+        return await self._load_flagged("reminded")
+
+    async def _load_flagged(self, column: str) -> Dict[int, str]:
+        await self.flush()
+        async with self._write_lock:
+            rows = await asyncio.to_thread(
+                lambda: self._conn.execute(
+                    f"SELECT user_id, group_number FROM users WHERE {column} = 1 AND group_number IS NOT NULL"
+                ).fetchall()
+            )
+        return dict(rows)
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            # дожидаемся прерванной записи, иначе последняя запись пойдет в то же соединение параллельно
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        if self._conn is not None:
+            await self.flush()
+            self._conn.close()
+            self._conn = None
+
+
+def create_user_store() -> UserStore:
+    """Хранилище по переменным окружения USER_STORE (sqlite|memory) и USERS_DB_PATH"""
+    kind = os.getenv("USER_STORE", "sqlite")
+    if kind == "memory":
+        return UserStore()
+    return SQLiteUserStore(os.getenv("USERS_DB_PATH", "users.sqlite3"))
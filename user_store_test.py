@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from user_store import SQLiteUserStore
+
+
+class SQLiteUserStoreTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "users.sqlite3")
+
+    async def open_store(self, **kwargs) -> SQLiteUserStore:
+        store = SQLiteUserStore(self.path, **kwargs)
+        await store.start()
+        self.addAsyncCleanup(store.close)
+        return store
+
+    def on_disk(self):
+        """user_id -> (группа, ждем ввода, подписка, напоминания), прочитанные в обход хранилища"""
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT user_id, group_number, awaiting_group, subscribed, reminded FROM users"
+            ).fetchall()
+        finally:
+            conn.close()
+        return {row[0]: row[1:] for row in rows}
+
+    async def test_changes_are_written_in_batches(self):
+        store = await self.open_store(flush_interval=60, batch_size=3)
+        store[1] = "4353"
+        store[2] = "4354"
+        await asyncio.sleep(0.05)
+        # меньше batch_size изменений — на диск еще ничего не ушло
+        self.assertEqual(self.on_disk(), {})
+
+        store.set_subscribed(1, True)
+        store[3] = "4355"
+        for _ in range(100):
+            if len(self.on_disk()) == 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.on_disk(), {
+            1: ("4353", 0, 1, 0),
+            2: ("4354", 0, 0, 0),
+            3: ("4355", 0, 0, 0),
+        })
+
+    async def test_flush_interval_writes_small_batches(self):
+        store = await self.open_store(flush_interval=0.05, batch_size=500)
+        store[1] = "4353"
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.on_disk(), {1: ("4353", 0, 0, 0)})
+
+    async def test_reload_after_close(self):
+        store = SQLiteUserStore(self.path, flush_interval=60)
+        await store.start()
+        store[1] = "4353"
+        store.set_awaiting(2, True)
+        store.set_subscribed(1, True)
+        store.set_reminded(1, True)
+        await store.close()
+
+        reopened = await self.open_store()
+        self.assertEqual(reopened.get(1), "4353")
+        self.assertTrue(reopened.is_awaiting(2))
+        self.assertTrue(reopened.is_subscribed(1))
+        self.assertTrue(reopened.is_reminded(1))
+        self.assertNotIn(2, reopened)
+
+    async def test_close_waits_for_interrupted_write(self):
+        store = SQLiteUserStore(self.path, flush_interval=0.01)
+        await store.start()
+        started = threading.Event()
+        active = []
+        overlaps = []
+        write = store._write
+
+        def slow_write(rows):
+            # первая запись долгая: ее прерывает close()
+            overlaps.append(len(active))
+            active.append(rows)
+            started.set()
+            if len(overlaps) == 1:
+                time.sleep(0.2)
+            write(rows)
+            active.remove(rows)
+
+        store._write = slow_write
+        store[1] = "4353"
+        await asyncio.to_thread(started.wait, 5)
+        store[2] = "4354"
+        await store.close()
+        # последняя запись не начинается, пока идет прерванная, и обе на диске
+        self.assertEqual(overlaps, [0, 0])
+        self.assertEqual(self.on_disk(), {1: ("4353", 0, 0, 0), 2: ("4354", 0, 0, 0)})
+
+    async def test_failed_interrupted_write_is_retried_on_close(self):
+        store = SQLiteUserStore(self.path, flush_interval=0.01)
+        await store.start()
+        started = threading.Event()
+        write = store._write
+        calls = []
+
+        def failing_write(rows):
+            calls.append(rows)
+            if len(calls) == 1:
+                started.set()
+                time.sleep(0.1)
+                raise sqlite3.OperationalError("database is locked")
+            write(rows)
+
+        store._write = failing_write
+        store[1] = "4353"
+        await asyncio.to_thread(started.wait, 5)
+        await store.close()
+        self.assertEqual(self.on_disk(), {1: ("4353", 0, 0, 0)})
+
+    async def test_write_flags_for_users_held_by_another_process(self):
+        owner = await self.open_store(flush_interval=60)
+        owner[1] = "4353"
+        owner.set_subscribed(1, True)
+        owner.set_reminded(1, True)
+        await owner.flush()
+
+        # второй процесс о пользователе 1 в памяти ничего не знает
+        other = await self.open_store(flush_interval=60)
+        other._groups.clear()
+        other._subscribed.clear()
+        other._reminded.clear()
+        await other.write_subscribed(1, False)
+        self.assertEqual(self.on_disk(), {1: ("4353", 0, 0, 1)})
+        await other.write_reminded(1, False)
+        self.assertEqual(self.on_disk(), {1: ("4353", 0, 0, 0)})
+        # строку целиком второй процесс не переписал и в очередь записи не поставил
+        self.assertEqual(other._dirty, set())
+        self.assertEqual(await other.subscribers(), {})
+        self.assertEqual(await owner.reminder_subscribers(), {})
+
+    async def test_subscribers_include_unflushed_changes(self):
+        store = await self.open_store(flush_interval=60)
+        store[1] = "4353"
+        store.set_subscribed(1, True)
+        store[2] = "4354"
+        self.assertEqual(await store.subscribers(), {1: "4353"})
+
+
+if __name__ == '__main__':
+    unittest.main()
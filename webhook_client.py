@@ -0,0 +1,84 @@
+"""
+Заглушка клиента Telegram: шлет обновления на вебхук бота так же,
+как это делает Telegram (JSON + заголовок с секретным токеном).
+При запуске бот всегда регистрирует WEBHOOK_URL через setWebhook, а настоящий
+Telegram принимает только https-адрес, доступный из интернета. Поэтому локально
+TELEGRAM_API_URL указывает на заглушку Bot API из loadtest.py. По шагам,
+каждая команда в своем терминале:
+    python loadtest.py --serve-only --telegram-port 8081 --etu-port 8082
+    BOT_TOKEN=123456:TEST BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8443 WEBHOOK_SECRET=s \
+        TELEGRAM_API_URL=http://127.0.0.1:8081 ETU_API_URL=http://127.0.0.1:8082/api/mobile python main.py
+    python webhook_client.py --url http://127.0.0.1:8443/telegram --secret s --users 50 --updates 500
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict
+
+import httpx
+
+# тексты кнопок из get_beautiful_keyboard
+BUTTONS = ["📅 Расписание", "📆 Выбрать день", "⏱ Ближайшая пара", "🌅 Завтра", "🗓 Неделя", "❓ Помощь"]
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_message_ids = itertools.count(1)
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Dict:
+    """Обновление с текстовым сообщением в личном чате, как его присылает Telegram"""
+    message = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+async def post_updates(url: str, secret: str, users: int, updates: int, concurrency: int):
+    headers = {SECRET_HEADER: secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def send(update_id: int):
+            user_id = 100000 + update_id % users
+            text = "/start" if update_id < users else random.choice(BUTTONS)
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, json=make_update(update_id, user_id, text), headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(updates)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Отправлено обновлений: {updates} за {elapsed:.2f} с ({updates / elapsed:.0f}/с)")
+    print(f"Коды ответов: {statuses}")
+    print(f"Задержка приема p50={latencies[len(latencies) // 2] * 1000:.1f} мс, "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка тестовых обновлений на вебхук бота")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(post_updates(args.url, args.secret, args.users, args.updates, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
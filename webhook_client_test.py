@@ -0,0 +1,36 @@
+import unittest
+
+from telegram import Update
+
+from webhook_client import make_update
+
+
+class MakeUpdateTest(unittest.TestCase):
+
+    def test_command_has_bot_command_entity(self):
+        update = make_update(1, 100, "/start now")
+        self.assertEqual(update["update_id"], 1)
+        self.assertEqual(
+            update["message"]["entities"],
+            [{"type": "bot_command", "offset": 0, "length": len("/start")}]
+        )
+
+    def test_button_text_has_no_entities(self):
+        update = make_update(2, 100, "🌅 Завтра")
+        self.assertNotIn("entities", update["message"])
+
+    def test_message_ids_are_unique(self):
+        first = make_update(3, 100, "a")["message"]["message_id"]
+        second = make_update(4, 100, "a")["message"]["message_id"]
+        self.assertNotEqual(first, second)
+
+    def test_parsed_as_telegram_update(self):
+        # бот разбирает тело вебхука так же, как обновление от Telegram
+        update = Update.de_json(make_update(5, 100, "/start"), None)
+        self.assertEqual(update.effective_chat.id, 100)
+        self.assertEqual(update.effective_user.id, 100)
+        self.assertEqual(update.message.text, "/start")
+
+
+if __name__ == '__main__':
+    unittest.main()
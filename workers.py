@@ -0,0 +1,126 @@
+"""
+Режим нескольких процессов (BOT_MODE=workers):
+- главный процесс получает обновления от Telegram и раздает их
+  рабочим процессам по chat id (все сообщения одного чата — в один процесс);
+- рабочие процессы обрабатывают обновления и читают расписание только
+  из общего снимка на диске (SQLite с mmap), сами к API ЛЭТИ не ходят;
+- один процесс-обновлятель загружает расписание и переписывает снимок.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from typing import List
+
+from telegram import Bot, Update
+from telegram.error import NetworkError
+
+logger = logging.getLogger(__name__)
+
+# сколько обновлений может ждать в очереди одного рабочего процесса
+QUEUE_SIZE = 10000
+
+
+def shard_for(update: Update, workers: int) -> int:
+    """Номер рабочего процесса для обновления"""
+    chat = update.effective_chat or update.effective_user
+    key = chat.id if chat else update.update_id
+    return key % workers
+
+
+def _worker_main(index: int, workers: int, token: str, queue):
+    os.environ["BOT_ROLE"] = "worker"
+    os.environ["WORKER_INDEX"] = str(index)
+    # общий лимит исходящих делится между процессами (см. outbound)
+    os.environ["WORKER_COUNT"] = str(workers)
+    # импорт main настраивает окружение и логирование в новом процессе
+    from main import build_application
+    asyncio.run(_run_worker(index, build_application(token), queue))
+
+
+async def _run_worker(index: int, app, queue):
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    logger.info(f"Рабочий процесс {index} запущен (pid {os.getpid()})")
+    try:
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(json.loads(data), app.bot))
+    finally:
+        await app.stop()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        await app.shutdown()
+        logger.info(f"Рабочий процесс {index} остановлен")
+
+
+def _refresher_main():
+    import main  # noqa: F401 — окружение и логирование
+    asyncio.run(_run_refresher())
+
+
+async def _run_refresher():
+    from etu_api import api_client
+    from snapshot import ScheduleSnapshot
+
+    # снимок должен содержать все группы: рабочие процессы читают только его
+    api_client.selective_fetch = False
+    api_client.attach_snapshot(ScheduleSnapshot(os.getenv("SNAPSHOT_PATH", "etu_snapshot.sqlite3")))
+    logger.info(f"Процесс обновления расписания запущен (pid {os.getpid()})")
+    try:
+        await api_client.refresh()
+        await api_client.run_refresh_loop()
+    finally:
+        await api_client.close()
+
+
+async def _dispatch(token: str, queues: List):
+    """Long polling в главном процессе: обновления сразу уходят в очереди рабочих"""
+    api_url = os.getenv("TELEGRAM_API_URL")
+    bot = Bot(token, base_url=f"{api_url}/bot") if api_url else Bot(token)
+    async with bot:
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+            except NetworkError as e:
+                logger.warning(f"Ошибка получения обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                queue = queues[shard_for(update, len(queues))]
+                await asyncio.to_thread(queue.put, update.to_json())
+
+
+def run_workers(token: str, workers: int):
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue(maxsize=QUEUE_SIZE) for _ in range(workers)]
+
+    refresher = ctx.Process(target=_refresher_main, name="etu-refresher", daemon=True)
+    refresher.start()
+    processes = [
+        ctx.Process(target=_worker_main, args=(i, workers, token, queue), name=f"bot-worker-{i}")
+        for i, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Запущено рабочих процессов: {workers}")
+
+    try:
+        asyncio.run(_dispatch(token, queues))
+    except KeyboardInterrupt:
+        logger.info("Останавливаем рабочие процессы...")
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+        refresher.terminate()